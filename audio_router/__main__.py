@@ -0,0 +1,11 @@
+# __main__.py
+# python -m audio_router [command]. The package is a folder of flat modules
+# ("from config import ..."), so its directory goes on the import path first.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cli import main
+
+sys.exit(main())
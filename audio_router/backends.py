@@ -0,0 +1,689 @@
+# backends.py
+import csv
+import importlib.util
+import io
+import locale
+import ntpath
+import os
+import subprocess
+import sys
+import threading
+import time
+from config import SOUND_VOLUME_VIEW, DEVICES_FILE, logger
+from executor import RouteCommand
+
+ROLES = ("0", "1", "2")  # console / multimedia / communications
+
+# -------------------- SNAPSHOT MODEL --------------------
+
+class DeviceRecord:
+    __slots__ = ("name", "device_id", "roles")
+
+    def __init__(self, name, device_id, roles=()):
+        self.name = name
+        self.device_id = device_id
+        self.roles = roles  # default roles ("0"/"1"/"2") this device currently holds
+
+class SessionRecord:
+    __slots__ = ("label", "exe", "pid", "device_id", "path")
+
+    def __init__(self, label, exe, pid, device_id=None, path=None):
+        self.label = label
+        self.exe = exe
+        self.pid = pid
+        self.device_id = device_id
+        self.path = path
+
+class AudioSnapshot:
+    """One backend pass: output devices, default roles and app sessions."""
+
+    __slots__ = ("devices", "defaults", "default_device", "sessions", "session_devices",
+                 "session_paths", "generation", "taken_at")
+
+    def __init__(self, devices, defaults, default_device, sessions, session_devices, generation,
+                 session_paths=None):
+        self.devices = devices                  # friendly name -> device id
+        self.defaults = defaults                # role ("0"/"1"/"2") -> friendly name
+        self.default_device = default_device    # first render device holding any default role
+        self.sessions = sessions                # "name (PID: n)" -> (exe name, pid)
+        self.session_devices = session_devices  # "name (PID: n)" -> device id the session plays on
+        self.session_paths = session_paths or {}  # "name (PID: n)" -> full process path (when known)
+        self.generation = generation
+        self.taken_at = time.monotonic()
+
+    @classmethod
+    def from_records(cls, device_records, session_records, generation):
+        devices = {}
+        defaults = {}
+        default_device = None
+        for rec in device_records:
+            devices[rec.name] = rec.device_id
+            for role in rec.roles:
+                defaults.setdefault(role, rec.name)
+                if default_device is None:
+                    default_device = rec.name
+        sessions = {}
+        session_devices = {}
+        session_paths = {}
+        for rec in session_records:
+            sessions[rec.label] = (rec.exe, rec.pid)
+            session_devices[rec.label] = rec.device_id
+            if rec.path:
+                session_paths[rec.label] = rec.path
+        return cls(devices, defaults, default_device, sessions, session_devices, generation, session_paths)
+
+    def to_dict(self):
+        """JSON-ready form for the last-known snapshot cache."""
+        return {
+            "devices": self.devices,
+            "defaults": self.defaults,
+            "default_device": self.default_device,
+            "sessions": {label: list(session) for label, session in self.sessions.items()},
+            "session_devices": self.session_devices,
+            "session_paths": self.session_paths,
+        }
+
+    @classmethod
+    def from_dict(cls, data, generation=0):
+        """Rebuilds a cached snapshot. It reports itself as infinitely old, so it
+        is only ever painted, never trusted in place of a scan."""
+        snapshot = cls(dict(data.get("devices", {})), dict(data.get("defaults", {})),
+                       data.get("default_device"),
+                       {label: tuple(session) for label, session in data.get("sessions", {}).items()},
+                       dict(data.get("session_devices", {})), generation, dict(data.get("session_paths", {})))
+        snapshot.taken_at = float("-inf")
+        return snapshot
+
+    def age_ms(self):
+        return (time.monotonic() - self.taken_at) * 1000.0
+
+    def devices_for_exe(self, exe_name):
+        """Device ids currently used by every session of exe_name (case-insensitive)."""
+        return set(self.sessions_for_exe(exe_name).values())
+
+    def sessions_for_exe(self, exe_name):
+        """{pid: device id} for every session of exe_name (case-insensitive)."""
+        wanted = exe_name.lower()
+        return {pid: self.session_devices.get(label) for label, (exe, pid) in self.sessions.items()
+                if exe.lower() == wanted}
+
+    def has_pid(self, pid):
+        """True while pid has a session, even one whose endpoint is unknown."""
+        pid = str(pid)
+        return any(session_pid == pid for _, session_pid in self.sessions.values())
+
+    def device_for_pid(self, pid):
+        pid = str(pid)
+        for label, (_, session_pid) in self.sessions.items():
+            if session_pid == pid:
+                return self.session_devices.get(label)
+        return None
+
+class SessionDelta:
+    """What changed in the session list between two snapshots."""
+
+    __slots__ = ("appeared", "disappeared", "changed", "initial", "generation")
+
+    def __init__(self, appeared, disappeared, changed, initial, generation):
+        self.appeared = appeared        # label -> (exe name, pid) for new sessions
+        self.disappeared = disappeared  # label -> (exe name, pid) for sessions that are gone
+        self.changed = changed          # label -> (old device id, new device id)
+        self.initial = initial          # True when there was no earlier snapshot to compare with
+        self.generation = generation
+
+    @property
+    def membership_changed(self):
+        return bool(self.appeared or self.disappeared)
+
+    def __bool__(self):
+        return bool(self.appeared or self.disappeared or self.changed)
+
+    def __repr__(self):
+        return (f"SessionDelta(+{len(self.appeared)} -{len(self.disappeared)} "
+                f"~{len(self.changed)}, generation={self.generation})")
+
+def diff_sessions(old, new):
+    """SessionDelta from snapshot old (may be None) to snapshot new."""
+    if old is None:
+        return SessionDelta(dict(new.sessions), {}, {}, True, new.generation)
+    appeared = {label: info for label, info in new.sessions.items() if label not in old.sessions}
+    disappeared = {label: info for label, info in old.sessions.items() if label not in new.sessions}
+    changed = {}
+    for label in new.sessions:
+        if label in old.sessions:
+            before, after = old.session_devices.get(label), new.session_devices.get(label)
+            if before != after:
+                changed[label] = (before, after)
+    return SessionDelta(appeared, disappeared, changed, False, new.generation)
+
+def _decode(data):
+    # UNIVERSAL FIX: utf-8-sig handles the BOM; ANSI exports fall back to the locale codepage
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode(locale.getpreferredencoding(False), errors="replace")
+
+def session_label(name, pid):
+    # Unique label to separate multiple instances (like Brave tabs)
+    return f"{name} (PID: {pid})"
+
+# -------------------- BACKEND PROTOCOL --------------------
+
+class AudioBackend:
+    """What the router needs from an audio stack.
+
+    Mutating operations are returned as RouteCommands so the routing executor
+    can fan them out and time them, whatever the backend does underneath.
+    """
+
+    name = "base"
+    # True when an exe-level app route sticks before the app runs (Windows' per-app default)
+    persists_app_routes = False
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def scan(self, generation):
+        """Enumerates devices, default roles and sessions into an AudioSnapshot."""
+        raise NotImplementedError
+
+    def set_default_command(self, device_id, role, priority=0):
+        raise NotImplementedError
+
+    def set_app_command(self, device_id, role, target, priority=0):
+        """target is an exe name or a PID (as int or digit string)."""
+        raise NotImplementedError
+
+    def mute_command(self):
+        """Toggles mute on the default render device."""
+        raise NotImplementedError
+
+# -------------------- SOUNDVOLUMEVIEW (PROCESS) --------------------
+
+_DEFAULT_ROLE_COLUMNS = (
+    ("0", "Default"),
+    ("1", "Default Multimedia"),
+    ("2", "Default Communications"),
+)
+
+# The only columns the snapshot needs; everything else SoundVolumeView emits is skipped
+_SVV_COLUMNS = ("Name", "Type", "Direction", "Device Name", "Default", "Default Multimedia",
+                "Default Communications", "Item ID", "Process ID", "Process Path")
+
+def parse_svv_csv(text):
+    """Parses SoundVolumeView /scomma output into (DeviceRecords, SessionRecords).
+
+    Column positions are resolved once from the header, so each row is a list
+    lookup rather than a dict of every column; repeated strings are interned.
+    """
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None)
+    if not header:
+        return [], []
+    position = {name: i for i, name in enumerate(header)}
+    col = {name: position.get(name) for name in _SVV_COLUMNS}
+    width = len(header)
+
+    def field(row, name):
+        i = col[name]
+        return row[i] if i is not None and i < len(row) else ""
+
+    intern = sys.intern
+    role_columns = [(role, col[column]) for role, column in _DEFAULT_ROLE_COLUMNS]
+    device_records = []
+    session_records = []
+    device_ids = {}
+    for row in reader:
+        if len(row) < width // 2:
+            continue  # blank or truncated line
+        row_type = field(row, "Type")
+        if row_type == "Device":
+            if field(row, "Direction") != "Render":
+                continue
+            friendly_name = field(row, "Device Name") or field(row, "Name")
+            device_id = field(row, "Item ID")
+            if not (friendly_name and device_id):
+                continue
+            roles = tuple(role for role, i in role_columns
+                          if i is not None and i < len(row) and row[i] == "Render")
+            friendly_name, device_id = intern(friendly_name), intern(device_id)
+            device_ids[friendly_name] = device_id
+            device_records.append(DeviceRecord(friendly_name, device_id, roles))
+        elif row_type == "Application":
+            friendly_name = field(row, "Name")
+            process_id = field(row, "Process ID")
+            if not friendly_name or not process_id or process_id == "0":
+                continue
+            process_path = field(row, "Process Path")
+            exe_name = ntpath.basename(process_path) if process_path else friendly_name
+            # Session Item IDs are "<endpoint id>|<process path>..."
+            item_id = field(row, "Item ID")
+            endpoint_id = item_id.split("|", 1)[0] if "|" in item_id else None
+            device_id = endpoint_id or device_ids.get(field(row, "Device Name"))
+            session_records.append(SessionRecord(
+                session_label(friendly_name, process_id), intern(exe_name), process_id,
+                intern(device_id) if device_id else None, process_path or None))
+    return device_records, session_records
+
+class SoundVolumeViewBackend(AudioBackend):
+    """Spawns SoundVolumeView.exe for every operation and parses its CSV export."""
+
+    name = "soundvolumeview"
+    persists_app_routes = True  # /SetAppDefault by exe name is stored by Windows
+
+    def __init__(self, exe_path=SOUND_VOLUME_VIEW, csv_path=DEVICES_FILE):
+        self.exe_path = exe_path
+        self.csv_path = csv_path  # only used if the stdout export comes back empty
+
+    @classmethod
+    def available(cls):
+        return os.path.exists(SOUND_VOLUME_VIEW)
+
+    def _read_stdout(self):
+        """'/scomma ""' makes SoundVolumeView write the CSV to stdout: no temp file."""
+        try:
+            proc = subprocess.run(
+                [self.exe_path, "/scomma", ""],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=False
+            )
+        except Exception as e:
+            logger.error(f"Failed to run SoundVolumeView scan: {e}")
+            return ""
+        return _decode(proc.stdout)
+
+    def _read_file(self):
+        """Legacy path: export to devices.csv and read it back."""
+        try:
+            os.makedirs(os.path.dirname(self.csv_path), exist_ok=True)
+            subprocess.run(
+                [self.exe_path, "/scomma", self.csv_path],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=False
+            )
+            with open(self.csv_path, "rb") as f:
+                return _decode(f.read())
+        except Exception as e:
+            logger.error(f"Failed to generate CSV: {e}")
+            return ""
+
+    def scan(self, generation):
+        text = self._read_stdout()
+        if not text.strip():
+            text = self._read_file()
+        try:
+            device_records, session_records = parse_svv_csv(text)
+        except Exception as e:
+            logger.error(f"Snapshot parse error: {e}")
+            device_records, session_records = [], []
+        return AudioSnapshot.from_records(device_records, session_records, generation)
+
+    def set_default_command(self, device_id, role, priority=0):
+        return RouteCommand([self.exe_path, "/SetDefault", device_id, role],
+                            label=f"/SetDefault {device_id} role={role}", priority=priority, op="set_default")
+
+    def set_app_command(self, device_id, role, target, priority=0):
+        return RouteCommand([self.exe_path, "/SetAppDefault", device_id, role, str(target)],
+                            label=f"/SetAppDefault {target} role={role}", priority=priority, op="set_app_default")
+
+    def mute_command(self):
+        return RouteCommand([self.exe_path, "/Mute", "Toggle"], label="/Mute Toggle", op="mute")
+
+# -------------------- CORE AUDIO (IN-PROCESS COM) --------------------
+
+# Undocumented but stable interfaces used by the Windows volume mixer itself
+_CLSID_POLICY_CONFIG = "{870af99c-171d-4f9e-af0d-e63df40c2bc9}"
+_IID_POLICY_CONFIG = "{f8679f50-850a-41cf-9c72-430f290290c8}"
+_POLICY_CONFIG_SET_DEFAULT_ENDPOINT = 13          # vtable slot of IPolicyConfig::SetDefaultEndpoint
+_AUDIO_POLICY_CLASS = "Windows.Media.Internal.AudioPolicyConfig"
+_IID_AUDIO_POLICY_FACTORY = (
+    "{ab3d4648-e242-459f-b02f-541c70306324}",     # Windows 10 21H2 and later
+    "{2a59116d-6c4f-45e0-a74f-707e3fef9258}",     # Windows 10 before 21H2
+)
+_AUDIO_POLICY_SET_PERSISTED_ENDPOINT = 25         # vtable slot of SetPersistedDefaultAudioEndpoint
+_MMDEVAPI_PREFIX = "\\\\?\\SWD#MMDEVAPI#"
+_RENDER_INTERFACE_SUFFIX = "#{e6327cad-dcec-4949-ae8a-991e976a79d2}"
+
+class CoreAudioBackend(AudioBackend):
+    """Talks to the Windows audio endpoint APIs in-process (no child processes).
+
+    Enumeration uses pycaw/comtypes; default and per-app endpoints go through
+    IPolicyConfig and the AudioPolicyConfig activation factory via raw vtable
+    calls. Both libraries are optional: available() is False without them.
+    """
+
+    name = "coreaudio"
+    persists_app_routes = False  # per-PID only: routes for apps not running are left to the controller
+
+    def __init__(self):
+        self._local = threading.local()
+        self._last_sessions = {}  # exe name (lower) -> [pid, ...] from the latest scan
+        self._lock = threading.Lock()
+
+    @classmethod
+    def available(cls):
+        try:
+            return (os.name == "nt" and importlib.util.find_spec("comtypes") is not None
+                    and importlib.util.find_spec("pycaw") is not None)
+        except (ImportError, ValueError):
+            return False
+
+    def _ensure_com(self):
+        """COM must be initialised once per thread (executor workers included)."""
+        if not getattr(self._local, "ready", False):
+            import comtypes
+            try:
+                comtypes.CoInitializeEx(comtypes.COINIT_MULTITHREADED)
+            except OSError:
+                pass  # Thread already joined an apartment
+            self._local.ready = True
+
+    def scan(self, generation):
+        self._ensure_com()
+        from ctypes import POINTER, cast
+        from comtypes import CLSCTX_ALL
+        from pycaw.pycaw import AudioUtilities, IAudioSessionManager2, IAudioSessionControl2
+        import psutil
+
+        devices = {}
+        defaults = {}
+        default_device = None
+        sessions = {}
+        session_devices = {}
+        by_exe = {}
+        try:
+            enumerator = AudioUtilities.GetDeviceEnumerator()
+            names_by_id = {}
+            collection = enumerator.EnumAudioEndpoints(0, 1)  # eRender, DEVICE_STATE_ACTIVE
+            for i in range(collection.GetCount()):
+                imm = collection.Item(i)
+                device = AudioUtilities.CreateDevice(imm)
+                devices[device.FriendlyName] = device.id
+                names_by_id[device.id] = device.FriendlyName
+
+                manager = imm.Activate(IAudioSessionManager2._iid_, CLSCTX_ALL, None)
+                manager = cast(manager, POINTER(IAudioSessionManager2))
+                session_enum = manager.GetSessionEnumerator()
+                for j in range(session_enum.GetCount()):
+                    control = session_enum.GetSession(j).QueryInterface(IAudioSessionControl2)
+                    pid = control.GetProcessId()
+                    if not pid:
+                        continue
+                    try:
+                        exe_name = psutil.Process(pid).name()
+                    except Exception:
+                        continue
+                    label = session_label(os.path.splitext(exe_name)[0], pid)
+                    sessions[label] = (exe_name, str(pid))
+                    session_devices[label] = device.id
+                    by_exe.setdefault(exe_name.lower(), []).append(pid)
+
+            for role in ROLES:
+                try:
+                    dev_id = enumerator.GetDefaultAudioEndpoint(0, int(role)).GetId()
+                except Exception:
+                    continue
+                name = names_by_id.get(dev_id)
+                if name:
+                    defaults[role] = name
+                    if default_device is None:
+                        default_device = name
+        except Exception as e:
+            logger.error(f"Core Audio scan error: {e}")
+        with self._lock:
+            self._last_sessions = by_exe
+        return AudioSnapshot(devices, defaults, default_device, sessions, session_devices, generation)
+
+    # ---------- raw vtable helpers ----------
+    @staticmethod
+    def _vtable_call(ptr, slot, restype, argtypes, *args):
+        import ctypes
+        vtable = ctypes.cast(ctypes.cast(ptr, ctypes.POINTER(ctypes.c_void_p))[0],
+                             ctypes.POINTER(ctypes.c_void_p))
+        proto = ctypes.WINFUNCTYPE(restype, ctypes.c_void_p, *argtypes)
+        return proto(vtable[slot])(ptr, *args)
+
+    def _policy_config(self):
+        import ctypes
+        from comtypes import GUID
+        if getattr(self._local, "policy", None) is None:
+            ptr = ctypes.c_void_p()
+            hr = ctypes.oledll.ole32.CoCreateInstance(
+                ctypes.byref(GUID(_CLSID_POLICY_CONFIG)), None, 1,  # CLSCTX_INPROC_SERVER
+                ctypes.byref(GUID(_IID_POLICY_CONFIG)), ctypes.byref(ptr))
+            if hr:
+                raise OSError(hr, "IPolicyConfig unavailable")
+            self._local.policy = ptr
+        return self._local.policy
+
+    def _policy_factory(self):
+        import ctypes
+        from comtypes import GUID
+        if getattr(self._local, "factory", None) is None:
+            combase = ctypes.windll.combase
+            hstring = ctypes.c_void_p()
+            combase.WindowsCreateString(_AUDIO_POLICY_CLASS, len(_AUDIO_POLICY_CLASS), ctypes.byref(hstring))
+            try:
+                for iid in _IID_AUDIO_POLICY_FACTORY:
+                    ptr = ctypes.c_void_p()
+                    if combase.RoGetActivationFactory(hstring, ctypes.byref(GUID(iid)), ctypes.byref(ptr)) == 0:
+                        self._local.factory = ptr
+                        break
+                else:
+                    raise OSError("AudioPolicyConfig factory unavailable")
+            finally:
+                combase.WindowsDeleteString(hstring)
+        return self._local.factory
+
+    def _set_default(self, device_id, role):
+        import ctypes
+        self._ensure_com()
+        return self._vtable_call(self._policy_config(), _POLICY_CONFIG_SET_DEFAULT_ENDPOINT,
+                                 ctypes.c_long, (ctypes.c_wchar_p, ctypes.c_int),
+                                 device_id, int(role))
+
+    def _set_app(self, device_id, role, target):
+        import ctypes
+        self._ensure_com()
+        if str(target).isdigit():
+            pids = [int(target)]
+        else:
+            with self._lock:
+                pids = list(self._last_sessions.get(str(target).lower(), []))
+        if not pids:
+            # Deferred, not failed: the exe route stays desired and the controller
+            # re-issues it when the app's session appears
+            logger.debug(f"Core Audio: no session for {target} yet; route deferred.")
+            return 0
+        combase = ctypes.windll.combase
+        full_id = f"{_MMDEVAPI_PREFIX}{device_id}{_RENDER_INTERFACE_SUFFIX}"
+        hstring = ctypes.c_void_p()
+        combase.WindowsCreateString(full_id, len(full_id), ctypes.byref(hstring))
+        try:
+            worst = 0
+            for pid in pids:
+                hr = self._vtable_call(self._policy_factory(), _AUDIO_POLICY_SET_PERSISTED_ENDPOINT,
+                                       ctypes.c_long, (ctypes.c_uint, ctypes.c_int, ctypes.c_int, ctypes.c_void_p),
+                                       pid, 0, int(role), hstring)  # eRender
+                worst = worst or hr
+            return worst
+        finally:
+            combase.WindowsDeleteString(hstring)
+
+    def _toggle_mute(self):
+        self._ensure_com()
+        from ctypes import POINTER, cast
+        from comtypes import CLSCTX_ALL
+        from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
+        speakers = AudioUtilities.GetSpeakers()
+        volume = cast(speakers.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None),
+                      POINTER(IAudioEndpointVolume))
+        volume.SetMute(not volume.GetMute(), None)
+        return 0
+
+    def set_default_command(self, device_id, role, priority=0):
+        return RouteCommand(action=lambda: self._set_default(device_id, role),
+                            label=f"SetDefaultEndpoint {device_id} role={role}", priority=priority, op="set_default")
+
+    def set_app_command(self, device_id, role, target, priority=0):
+        return RouteCommand(action=lambda: self._set_app(device_id, role, target),
+                            label=f"SetPersistedDefaultAudioEndpoint {target} role={role}", priority=priority, op="set_app_default")
+
+    def mute_command(self):
+        return RouteCommand(action=self._toggle_mute, label="SetMute toggle", op="mute")
+
+# -------------------- FAKE (TESTS / BENCHMARKS) --------------------
+
+class FakeBackend(AudioBackend):
+    """Deterministic in-memory audio stack for Linux tests and benchmarks.
+
+    Starts with device_count render devices and session_count sessions (all on
+    the first device); every mutation updates the model, is recorded in
+    self.calls, and can be slowed down with latency_ms to mimic real hardware.
+    Commands that leave the model unchanged are counted in self.redundant.
+    """
+
+    name = "fake"
+    persists_app_routes = True
+
+    def __init__(self, device_count=3, session_count=6, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.calls = []
+        self.redundant = 0
+        self._app_roles = {}  # (pid, role) -> device id, once an app command touches the session
+        self.app_defaults = {}  # (exe name lower, role) -> device id from exe-level app commands
+        self.muted = False
+        self._lock = threading.Lock()
+        self.devices = {f"Fake Output {i + 1}": f"{{0.0.0.00000000}}.{{fake-{i + 1:04d}}}"
+                        for i in range(device_count)}
+        first = next(iter(self.devices.values()), None)
+        self.defaults = {role: first for role in ROLES}
+        # pid -> [exe name, device id]
+        self.sessions = {str(1000 + i): [f"app{i + 1}.exe", first] for i in range(session_count)}
+
+    def add_session(self, exe_name, pid, device_id=None):
+        """A new session starts on device_id, else the exe's stored app default, else the default."""
+        with self._lock:
+            stored = self.app_defaults.get((exe_name.lower(), "0"))
+            self.sessions[str(pid)] = [exe_name, device_id or stored or self.defaults.get("0")]
+
+    def remove_session(self, pid):
+        with self._lock:
+            self.sessions.pop(str(pid), None)
+
+    def sync_world(self, devices, defaults, sessions, initial=False):
+        """Mirrors a recorded snapshot (trace replay): its devices and which sessions exist.
+
+        defaults maps role -> device name; sessions maps label -> [exe, pid, device id].
+        Unless initial, sessions that already exist keep their device and the
+        defaults stay put while their device is present, so routing outcomes
+        remain the replay's own.
+        """
+        with self._lock:
+            self.devices = dict(devices)
+            ids = set(self.devices.values())
+            for role, name in defaults.items():
+                if name in self.devices and (initial or self.defaults.get(role) not in ids):
+                    self.defaults[role] = self.devices[name]
+            live = {str(pid): (exe, device_id) for exe, pid, device_id in sessions.values()}
+            for pid in [pid for pid in self.sessions if pid not in live]:
+                del self.sessions[pid]
+            for pid, (exe, device_id) in live.items():
+                if initial or pid not in self.sessions:
+                    self.sessions[pid] = [exe, device_id]
+
+    def _sleep(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+    def scan(self, generation):
+        self._sleep()
+        with self._lock:
+            self.calls.append(("scan",))
+            names_by_id = {dev_id: name for name, dev_id in self.devices.items()}
+            defaults = {role: names_by_id.get(dev_id) for role, dev_id in self.defaults.items()
+                        if dev_id in names_by_id}
+            default_device = next((defaults[r] for r in ROLES if r in defaults), None)
+            sessions = {}
+            session_devices = {}
+            for pid, (exe_name, dev_id) in self.sessions.items():
+                label = session_label(os.path.splitext(exe_name)[0], pid)
+                sessions[label] = (exe_name, pid)
+                session_devices[label] = dev_id
+            return AudioSnapshot(dict(self.devices), defaults, default_device, sessions, session_devices, generation)
+
+    def _set_default(self, device_id, role):
+        self._sleep()
+        with self._lock:
+            self.calls.append(("set_default", device_id, role))
+            if device_id not in self.devices.values():
+                return 1
+            if self.defaults.get(role) == device_id:
+                self.redundant += 1
+            self.defaults[role] = device_id
+            return 0
+
+    def _set_app(self, device_id, role, target):
+        self._sleep()
+        with self._lock:
+            self.calls.append(("set_app", device_id, role, str(target)))
+            if device_id not in self.devices.values():
+                return 1
+            target = str(target)
+            hits = [(pid, s) for pid, s in self.sessions.items()
+                    if pid == target or s[0].lower() == target.lower()]
+            for pid, session in hits:
+                for r in ROLES:
+                    self._app_roles.setdefault((pid, r), session[1])
+            unchanged = all(self._app_roles[(pid, role)] == device_id for pid, _ in hits)
+            if not target.isdigit():
+                # Exe-level routes are remembered for sessions that start later
+                key = (target.lower(), role)
+                unchanged = unchanged and self.app_defaults.get(key) == device_id
+                self.app_defaults[key] = device_id
+            if unchanged:
+                self.redundant += 1  # also when no session matches a PID
+            for pid, session in hits:
+                self._app_roles[(pid, role)] = device_id
+                session[1] = device_id
+            return 0
+
+    def _toggle_mute(self):
+        self._sleep()
+        with self._lock:
+            self.calls.append(("mute",))
+            self.muted = not self.muted
+            return 0
+
+    def set_default_command(self, device_id, role, priority=0):
+        return RouteCommand(action=lambda: self._set_default(device_id, role),
+                            label=f"fake set_default {device_id} role={role}", priority=priority, op="set_default")
+
+    def set_app_command(self, device_id, role, target, priority=0):
+        return RouteCommand(action=lambda: self._set_app(device_id, role, target),
+                            label=f"fake set_app {target} role={role}", priority=priority, op="set_app_default")
+
+    def mute_command(self):
+        return RouteCommand(action=self._toggle_mute, label="fake mute toggle", op="mute")
+
+# -------------------- SELECTION --------------------
+
+BACKENDS = {
+    SoundVolumeViewBackend.name: SoundVolumeViewBackend,
+    CoreAudioBackend.name: CoreAudioBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+def create_backend(name):
+    """Builds the named backend, falling back to SoundVolumeView if it can't run here."""
+    cls = BACKENDS.get((name or "").lower())
+    if cls is None:
+        logger.warning(f"Unknown audio backend '{name}'. Using SoundVolumeView.")
+        cls = SoundVolumeViewBackend
+    elif not cls.available():
+        logger.warning(f"Audio backend '{cls.name}' unavailable on this machine. Using SoundVolumeView.")
+        cls = SoundVolumeViewBackend
+    return cls()
@@ -0,0 +1,96 @@
+# brain.py
+import threading
+import time
+from rules import rulebook
+from reconcile import get_controller
+from config import logger
+from metrics import metrics
+from recorder import record
+
+class SmartBrain:
+    """Routes the focused app to its saved device as soon as focus changes.
+
+    Foreground sources call on_foreground() from their own thread; the Brain
+    hands the latest event to a single worker so a burst of alt-tabs collapses
+    into one routing decision for wherever focus ended up.
+    """
+
+    def __init__(self, controller=None, lookup=None, on_route=None, on_decision=None):
+        self.controller = controller or get_controller()
+        self.lookup = lookup or rulebook.lookup  # ProcessInfo -> device id (or None)
+        self.on_route = on_route      # called with (ProcessInfo, device_id) after routing
+        # called with (ProcessInfo, outcome, device_id, latency_ms) for every event the worker
+        # reaches; outcome is "routed", "no_rule" or "unchanged" (trace replay uses this)
+        self.on_decision = on_decision
+        self.enabled = threading.Event()
+        self.last_info = None         # most recent foreground process, routed or not
+        self.last_decided = None      # exe of the last focus change the Brain acted on
+        self.last_latency_ms = None
+        self._pending = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._worker, name="pebx-brain", daemon=True)
+        self._thread.start()
+
+    @property
+    def last_exe(self):
+        info = self.last_info
+        return info.name if info else None
+
+    def set_enabled(self, enabled):
+        if enabled:
+            self.enabled.set()
+            # Route whatever is focused right now instead of waiting for the next switch
+            if self.last_info is not None:
+                self.on_foreground(self.last_info, force=True)
+        else:
+            self.enabled.clear()
+
+    def on_foreground(self, info, force=False):
+        record("foreground", pid=str(info.pid), name=info.name, path=info.path, title=info.title)
+        self.last_info = info
+        if not self.enabled.is_set():
+            return
+        with self._lock:
+            self._pending = (info, force)
+        self._wake.set()
+
+    def _worker(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self._wake.clear()
+            if pending is None:
+                continue
+            info, force = pending
+            try:
+                self._decide(info, force)
+            except Exception as e:
+                logger.debug(f"Brain loop error: {e}")
+
+    def _decide(self, info, force=False):
+        if not force and self.last_decided == info.name:
+            self._decided(info, "unchanged")
+            return None
+        self.last_decided = info.name
+        target_device_id = self.lookup(info)
+        if not target_device_id:
+            self._decided(info, "no_rule")
+            return None
+        logger.info(f"[BRAIN] Target locked: '{info.name}'. Applying auto-route.")
+        # A one-off command on the cached snapshot: no scan on the focus path, no lasting desired state
+        self.controller.route_transient(info.name, target_device_id, priority_app=info.name)
+        self.last_latency_ms = (time.perf_counter() - info.timestamp) * 1000.0
+        metrics.observe("brain_focus_to_route", self.last_latency_ms)
+        logger.debug(f"[BRAIN] Focus-to-route latency: {self.last_latency_ms:.1f} ms")
+        if self.on_route:
+            self.on_route(info, target_device_id)
+        self._decided(info, "routed", target_device_id, self.last_latency_ms)
+        return target_device_id
+
+    def _decided(self, info, outcome, device_id=None, latency_ms=None):
+        if self.on_decision:
+            if latency_ms is None:
+                latency_ms = (time.perf_counter() - info.timestamp) * 1000.0
+            self.on_decision(info, outcome, device_id, latency_ms)
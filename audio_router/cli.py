@@ -0,0 +1,410 @@
+# cli.py
+# Command line and headless entry points. Commands go to the running instance
+# over IPC when there is one; otherwise they run here, importing only what they
+# need, so a scripted profile switch never loads the GUI, tray or keyboard hook.
+import argparse
+import json
+import os
+import sys
+import time
+from config import APP_NAME, setup_logging, logger
+
+def _out(text):
+    if sys.stdout is not None:  # --noconsole builds have no stdout
+        print(text)
+
+def _emit(args, data, text):
+    _out(json.dumps(data, indent=2) if args.json else text)
+
+def resolve_device(name_or_id, devices, aliases=None):
+    """Device id for an exact id, an alias, a friendly name (any case) or a unique name fragment."""
+    if name_or_id in devices.values():
+        return name_or_id
+    for alias, device_id in (aliases or {}).items():
+        if alias.lower() == name_or_id.lower():
+            return device_id
+    if name_or_id in devices:
+        return devices[name_or_id]
+    wanted = name_or_id.lower()
+    exact = [dev_id for name, dev_id in devices.items() if name.lower() == wanted]
+    if exact:
+        return exact[0]
+    partial = [dev_id for name, dev_id in devices.items() if wanted in name.lower()]
+    return partial[0] if len(partial) == 1 else None
+
+class CommandError(Exception):
+    """A command that cannot run as asked (unknown profile, unknown device...)."""
+
+def _report_dict(report):
+    if report is None:
+        return {"commands": 0, "failed": 0, "elapsed_ms": 0.0, "ok": True}
+    return {"commands": len(report.results), "failed": len(report.failed),
+            "elapsed_ms": round(report.elapsed_ms, 1), "ok": report.ok}
+
+def _report_text(result):
+    if not result["commands"]:
+        return "nothing routed" if result.get("pending") else "already in place, nothing to do"
+    return f"{result['commands']} commands in {result['elapsed_ms']:.0f} ms ({result['failed']} failed)"
+
+# -------------------- OPERATIONS --------------------
+# Plain functions returning JSON-ready dicts: the CLI runs them locally, and a
+# running instance runs them for forwarded commands (ipc.serve(OPERATIONS)).
+
+def op_scan(max_age_ms=None):
+    from router import get_snapshot
+    snapshot = get_snapshot(max_age_ms)
+    return {
+        "devices": snapshot.devices,
+        "defaults": snapshot.defaults,
+        "default_device": snapshot.default_device,
+        "sessions": [{"label": label, "exe": exe, "pid": pid, "device": snapshot.session_devices.get(label),
+                      "path": snapshot.session_paths.get(label)}
+                     for label, (exe, pid) in snapshot.sessions.items()],
+        "generation": snapshot.generation,
+        "age_ms": round(snapshot.age_ms(), 1),
+    }
+
+def op_apply(profile):
+    from router import get_snapshot
+    from reconcile import get_controller, pending_routes
+    from profiles import store
+    data = store.get(profile)
+    if data is None:
+        raise CommandError(f"Unknown profile: {profile}")
+    snapshot = get_snapshot()
+    report = get_controller().apply_profile(profile)
+    desired = data if isinstance(data, dict) else {profile: data}
+    return dict(profile=profile, pending=pending_routes(desired, snapshot), **_report_dict(report))
+
+def op_route(target, device):
+    from router import get_snapshot
+    from reconcile import get_controller, pending_routes
+    from profiles import store
+    snapshot = get_snapshot()
+    device_id = resolve_device(device, snapshot.devices, store.aliases())
+    if device_id is None:
+        raise CommandError(f"Unknown or ambiguous device: {device}")
+    report = get_controller().route(target, device_id)
+    return dict(target=target, device=device_id, pending=pending_routes({target: device_id}, snapshot),
+                **_report_dict(report))
+
+def op_default(device):
+    from router import get_snapshot, set_default_device
+    from reconcile import get_controller
+    from profiles import store
+    device_id = resolve_device(device, get_snapshot().devices, store.aliases())
+    if device_id is None:
+        raise CommandError(f"Unknown or ambiguous device: {device}")
+    get_controller().set_default(device_id)
+    report = set_default_device(device_id)
+    if report is None:
+        raise CommandError(f"Could not switch the default device to {device}")
+    return dict(device=device_id, **_report_dict(report))
+
+def op_mute():
+    from router import toggle_mute
+    toggle_mute()
+    return {"muted": "toggled"}
+
+def op_sync(source=None):
+    from sync import SyncClient, get_client
+    client = SyncClient(source) if source else get_client()
+    if client is None:
+        raise CommandError("No fleet sync source configured (set PEBX_SYNC_SOURCE or pass --source).")
+    return client.sync_now()
+
+def op_alias(alias, device=None):
+    from router import get_snapshot
+    from profiles import store
+    if device is None:
+        return {"aliases": store.aliases()}
+    device_id = resolve_device(device, get_snapshot().devices)
+    if device_id is None:
+        raise CommandError(f"Unknown or ambiguous device: {device}")
+    if not store.set_alias(alias, device_id):
+        raise CommandError("Device aliases need the SQLite profile store (PEBX_PROFILE_STORE=sqlite).")
+    return {"alias": alias, "device": device_id}
+
+def op_history(target=None, limit=20):
+    from profiles import store
+    return {"history": store.history(target, limit)}
+
+def op_export_profiles(path):
+    from profiles import export_profiles
+    return {"path": export_profiles(path)}
+
+def op_import_profiles(path):
+    from profiles import import_profiles
+    return {"path": path, "profiles": import_profiles(path)}
+
+OPERATIONS = {
+    "scan": op_scan,
+    "apply": op_apply,
+    "route": op_route,
+    "default": op_default,
+    "mute": op_mute,
+    "sync": op_sync,
+    "alias": op_alias,
+    "history": op_history,
+    "export-profiles": op_export_profiles,
+    "import-profiles": op_import_profiles,
+}
+
+def run_operation(args, command, **kwargs):
+    """Forwards to the running instance when there is one, otherwise runs here.
+
+    Sets args.forwarded to say which happened.
+    """
+    args.forwarded = False
+    if not args.local:
+        import ipc
+        try:
+            result = ipc.send_command(command, kwargs)
+            args.forwarded = True
+            return result
+        except ipc.NoInstance:
+            pass
+        except ipc.RemoteError as e:
+            raise CommandError(str(e))
+    return OPERATIONS[command](**kwargs)
+
+def _settle_pending(args, result):
+    """(text, exit code) for routes that no command could reach yet (result["pending"]).
+
+    A running instance keeps exe routes and applies them when the app's
+    session appears. Run locally, nothing outlives this process, so exe routes
+    are saved to state.json for the next instance. A PID without a session is
+    an error either way.
+    """
+    pending = result.get("pending") or {}
+    dead = sorted(target for target in pending if target.isdigit())
+    waiting = {target: device_id for target, device_id in pending.items() if not target.isdigit()}
+    lines = [f"No audio session for PID {pid}; nothing routed." for pid in dead]
+    if waiting and args.forwarded:
+        lines.append(f"Not playing yet, routed when they start: {', '.join(sorted(waiting))}")
+    elif waiting:
+        from router import get_snapshot
+        from state import store as state_store
+        names = {dev_id: name for name, dev_id in get_snapshot().devices.items()}
+        routes = dict(state_store.get("app_routes", {}))
+        routes.update({target: names[device_id] for target, device_id in waiting.items() if device_id in names})
+        # An exe-wide route covers the app's sessions, as it does in a running instance
+        sessions = {exe: entry for exe, entry in state_store.get("session_routes", {}).items()
+                    if exe.lower() not in {target.lower() for target in waiting}}
+        state_store.update(app_routes=routes, session_routes=sessions)
+        result["saved"] = sorted(waiting)
+        lines.append(f"{APP_NAME} is not running; saved for its next start: {', '.join(sorted(waiting))}")
+    return "\n".join(lines), 1 if dead else 0
+
+# -------------------- COMMANDS --------------------
+
+def cmd_scan(args):
+    # A forwarded scan is answered from the instance's warm snapshot cache
+    data = run_operation(args, "scan", max_age_ms=0 if args.local else None)
+    names = {dev_id: name for name, dev_id in data["devices"].items()}
+    lines = ["Output devices:"]
+    for name, dev_id in data["devices"].items():
+        marker = "*" if name == data["default_device"] else " "
+        lines.append(f" {marker} {name}  {dev_id}")
+    lines.append("Audio sessions:")
+    for session in data["sessions"]:
+        lines.append(f"   {session['label']}  ->  {names.get(session['device'], session['device'])}")
+    _emit(args, data, "\n".join(lines))
+    return 0
+
+def cmd_apply(args):
+    result = run_operation(args, "apply", profile=args.profile)
+    note, rc = _settle_pending(args, result)
+    _emit(args, result, "\n".join(filter(None, [f"Profile {args.profile}: {_report_text(result)}", note])))
+    return rc if result["ok"] else 1
+
+def cmd_route(args):
+    result = run_operation(args, "route", target=args.target, device=args.device)
+    note, rc = _settle_pending(args, result)
+    _emit(args, result, "\n".join(filter(None, [f"{args.target} -> {args.device}: {_report_text(result)}", note])))
+    return rc if result["ok"] else 1
+
+def cmd_default(args):
+    result = run_operation(args, "default", device=args.device)
+    _emit(args, result, f"Default -> {args.device}: {_report_text(result)}")
+    return 0 if result["ok"] else 1
+
+def cmd_mute(args):
+    result = run_operation(args, "mute")
+    _emit(args, result, "Mute toggled.")
+    return 0
+
+def cmd_sync(args):
+    kwargs = {"source": args.source} if args.source else {}
+    result = run_operation(args, "sync", **kwargs)
+    text = f"Fleet bundle {result['version'] or '—'}: {result['status']}"
+    if result["changed"]:
+        text += f" ({', '.join(result['changed'])})"
+    if result["error"]:
+        text += f"\n{result['error']}"
+    _emit(args, result, text)
+    return 0 if result["error"] is None else 1
+
+def cmd_alias(args):
+    result = run_operation(args, "alias", alias=args.alias, device=args.device)
+    if args.device is not None:
+        text = f"{args.alias} -> {result['device']}"
+    else:
+        aliases = {a: d for a, d in result["aliases"].items() if args.alias in (None, a)}
+        text = "\n".join(f"{a}  ->  {d}" for a, d in aliases.items()) or "No device aliases."
+    _emit(args, result, text)
+    return 0
+
+def cmd_history(args):
+    result = run_operation(args, "history", target=args.target, limit=args.limit)
+    lines = [f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(h['at']))}  {h['target']}  ->  {h['device_id']}"
+             f"{'' if h['ok'] else '  (failed)'}" for h in result["history"]]
+    _emit(args, result, "\n".join(lines) or "No route history (it needs PEBX_PROFILE_STORE=sqlite).")
+    return 0
+
+def cmd_export_profiles(args):
+    # Paths are resolved here: a forwarded command runs in another working directory
+    result = run_operation(args, "export-profiles", path=os.path.abspath(args.path))
+    _emit(args, result, f"Profiles exported to {result['path']}")
+    return 0
+
+def cmd_import_profiles(args):
+    result = run_operation(args, "import-profiles", path=os.path.abspath(args.path))
+    _emit(args, result, f"Imported {result['profiles']} profiles from {result['path']}")
+    return 0
+
+def restore_state(controller, state, snapshot):
+    """Loads state.json's global device, exe routes and per-session routes into the controller."""
+    devices = snapshot.devices
+    restored = 0
+    global_dev = state.get("global_device")
+    if global_dev in devices:
+        controller.set_default(devices[global_dev])
+        restored += 1
+    for app_key, dev_name in state.get("app_routes", {}).items():
+        # "name (PID: n)" keys predate exe-keyed routes; their processes are long gone
+        if dev_name in devices and "(PID: " not in app_key:
+            controller.set_route(app_key, devices[dev_name])
+            restored += 1
+    # After the exe routes: those drop an app's pins, and pinned sessions are exempt from them
+    return restored + controller.restore_session_routes(state.get("session_routes", {}), snapshot)
+
+def cmd_daemon(args):
+    """Headless mode: drift correction, Brain, hotkeys and metrics, without any UI."""
+    import threading
+    import ipc
+    from router import get_snapshot
+    from reconcile import get_controller
+    from state import store as state_store
+    from metrics import start_export as start_metrics_export
+    from sync import start_sync
+
+    server = ipc.serve(OPERATIONS)
+    if server is None:
+        _out(f"{APP_NAME} is already running.")
+        return 1
+    if args.trace:
+        from recorder import start_recording
+        start_recording(None if args.trace == "-" else args.trace)
+    else:
+        from recorder import start_from_config
+        start_from_config()
+    controller = get_controller()
+    restored = restore_state(controller, state_store.load(), get_snapshot())
+    controller.reconcile()
+    controller.start()
+    start_metrics_export()
+    start_sync()
+
+    if args.brain:
+        from brain import SmartBrain
+        from foreground import start_foreground_source
+        brain = SmartBrain()
+        brain.set_enabled(True)
+        start_foreground_source(brain.on_foreground)
+    if not args.no_hotkeys:
+        try:
+            from main import run_hotkey_listener
+            threading.Thread(target=run_hotkey_listener, name="pebx-hotkeys", daemon=True).start()
+        except Exception as e:
+            logger.warning(f"Hotkeys unavailable in headless mode: {e}")
+
+    logger.info(f"{APP_NAME} running headless ({restored} saved routes, Brain {'on' if args.brain else 'off'}).")
+    _out(f"{APP_NAME} running headless. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        controller.stop()
+        server.close()
+    return 0
+
+# -------------------- PARSER --------------------
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="audio_router", description=f"{APP_NAME} command line.")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--local", action="store_true", help="run here even if an instance is already running")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("scan", help="list output devices and audio sessions")
+    p.set_defaults(func=cmd_scan)
+    p = sub.add_parser("apply", help="apply a saved profile")
+    p.add_argument("profile")
+    p.set_defaults(func=cmd_apply)
+    p = sub.add_parser("route", help="route an app (exe name or PID) to a device")
+    p.add_argument("target")
+    p.add_argument("device", help="device name, name fragment or id")
+    p.set_defaults(func=cmd_route)
+    p = sub.add_parser("default", help="set the global default output device")
+    p.add_argument("device")
+    p.set_defaults(func=cmd_default)
+    p = sub.add_parser("mute", help="toggle system mute")
+    p.set_defaults(func=cmd_mute)
+    p = sub.add_parser("sync", help="pull the fleet profile/rule bundle now")
+    p.add_argument("--source", help="file path or http(s) URL (default: PEBX_SYNC_SOURCE)")
+    p.set_defaults(func=cmd_sync)
+    p = sub.add_parser("alias", help="list device aliases, or point one at a device (SQLite store)")
+    p.add_argument("alias", nargs="?")
+    p.add_argument("device", nargs="?", help="device name, name fragment or id")
+    p.set_defaults(func=cmd_alias)
+    p = sub.add_parser("history", help="recent route changes (SQLite store)")
+    p.add_argument("target", nargs="?", help="exe name or PID")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(func=cmd_history)
+    p = sub.add_parser("export-profiles", help="write all profiles as profiles.json")
+    p.add_argument("path")
+    p.set_defaults(func=cmd_export_profiles)
+    p = sub.add_parser("import-profiles", help="replace all profiles from a profiles.json file")
+    p.add_argument("path")
+    p.set_defaults(func=cmd_import_profiles)
+    p = sub.add_parser("daemon", help="run headless: drift correction, hotkeys, metrics")
+    p.add_argument("--brain", action="store_true", help="enable Smart Brain auto-switching")
+    p.add_argument("--no-hotkeys", action="store_true")
+    p.add_argument("--trace", nargs="?", const="-", metavar="PATH",
+                   help="record a replayable session trace (default path under the user data dir)")
+    p.set_defaults(func=cmd_daemon)
+    for p in sub.choices.values():
+        p.add_argument("--json", action="store_true", default=argparse.SUPPRESS, help="machine-readable output")
+        p.add_argument("--local", action="store_true", default=argparse.SUPPRESS,
+                       help="run here even if an instance is already running")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        from main import run_gui
+        run_gui()
+        return 0
+    # File log only: stdout belongs to the command's output
+    setup_logging(console=args.command == "daemon")
+    try:
+        return args.func(args)
+    except CommandError as e:
+        _out(str(e))
+        return 1
+    except Exception as e:
+        logger.error(f"CLI command '{args.command}' failed: {e}")
+        _out(f"Error: {e}")
+        return 1
@@ -2,8 +2,14 @@
 import os
 import sys
 import logging
+import logging.handlers
+import atexit
+import queue
+import threading
+import time
 import base64
-import ctypes
+import collections
+from logstore import LogStore, SegmentedLogHandler
 
 APP_NAME = "PebX Signal Matrix"
 
@@ -26,8 +32,6 @@ if not appdata_base:
 # Create a dedicated folder for your brand
 USER_DATA_DIR = os.path.join(appdata_base, APP_NAME)
 
-# ESSENTIAL ACID: Force Windows to create the folder if it doesn't exist yet
-os.makedirs(USER_DATA_DIR, exist_ok=True)
 
 # Core 'Vitamins' (Using the Path Finder so the App sees them!)
 SOUND_VOLUME_VIEW = get_asset_path("SoundVolumeView.exe")
@@ -37,46 +41,287 @@ LOGO_TRAY = get_asset_path("logo2.ico")
 # Data Matrix Paths (Saved securely in the new AppData Vault)
 DEVICES_FILE = os.path.join(USER_DATA_DIR, "devices.csv")
 PROFILES_FILE = os.path.join(USER_DATA_DIR, "profiles.json")
+PROFILES_DB_FILE = os.path.join(USER_DATA_DIR, "profiles.db")  # used when PROFILE_STORE is "sqlite"
 STATE_FILE = os.path.join(USER_DATA_DIR, "state.json")
-LOG_FILE = os.path.join(USER_DATA_DIR, "sound_matrix_activity.log")
+SNAPSHOT_CACHE_FILE = os.path.join(USER_DATA_DIR, "snapshot.json")  # last-known devices/sessions, painted at startup
+RULES_FILE = os.path.join(USER_DATA_DIR, "rules.json")
+SYNC_CACHE_FILE = os.path.join(USER_DATA_DIR, "fleet_cache.json")  # last good fleet bundle + ETag, for offline starts
+LOG_FILE = os.path.join(USER_DATA_DIR, "sound_matrix_activity.log")  # legacy single-file log (read-only now)
+LOG_DIR = os.path.join(USER_DATA_DIR, "logs")
+TRACE_DIR = os.path.join(USER_DATA_DIR, "traces")  # session traces for benchmarks/replay_trace.py
+METRICS_FILE = os.path.join(USER_DATA_DIR, "metrics.prom")  # OpenMetrics text; a .json name exports JSON
 
-class ObfuscatedHiddenFileHandler(logging.FileHandler):
-    def __init__(self, filename, mode='a', encoding='utf-8', delay=False):
-        super().__init__(filename, mode, encoding, delay)
-        self._hide_file(filename)
+# Audio Backend: "soundvolumeview" (default), "coreaudio" (in-process COM) or "fake"
+AUDIO_BACKEND = os.getenv("PEBX_AUDIO_BACKEND", "soundvolumeview")
 
-    def _hide_file(self, filepath):
-        """Applies the Windows 'Hidden' attribute to the file (Acid/Security)."""
-        try:
-            ctypes.windll.kernel32.SetFileAttributesW(filepath, 0x02)
-        except Exception:
-            pass
+# Snapshot Cache: how long one SoundVolumeView pass may be reused (milliseconds)
+SNAPSHOT_TTL_MS = 1500
+
+# Routing Executor: how many SoundVolumeView processes may run at once
+ROUTING_CONCURRENCY = 6
+
+# Reconciler: how often desired routes are re-checked for drift (0 disables)
+DRIFT_CHECK_INTERVAL_MS = 15000
+# How often the drift thread looks for new audio sessions that match a saved route (0 disables)
+SESSION_WATCH_INTERVAL_MS = 3000
+
+# Status bar: how often it refreshes, and how old a snapshot it may show instead of rescanning
+# (device-change rescans, the session watch and reconciles keep it fresher than that)
+STATUS_POLL_INTERVAL_MS = 2000
+STATUS_MAX_AGE_MS = 10000
+
+# Background I/O: worker threads and how often the GUI drains finished jobs
+IO_WORKERS = 2
+IO_DRAIN_INTERVAL_MS = 50
+
+# Device Watchdog: a burst of hardware messages becomes one rescan after a quiet period (capped)
+DEVICE_CHANGE_QUIET_MS = 750
+DEVICE_CHANGE_MAX_DELAY_MS = 3000
+
+# Metrics: how often routing counters/latencies are rewritten to METRICS_FILE (0 disables)
+METRICS_EXPORT_INTERVAL_MS = 30000
+
+# Fleet Sync: profile/rule bundle source, a file share path or http(s) URL (empty disables)
+SYNC_SOURCE = os.getenv("PEBX_SYNC_SOURCE", "")
+SYNC_INTERVAL_MS = 300000
+SYNC_TIMEOUT_MS = 5000
+
+# Session Trace: "1" records to TRACE_DIR, any other value is the trace file path (empty disables)
+TRACE = os.getenv("PEBX_TRACE", "")
+
+# Single Instance: how long a forwarded command may take in the running instance
+IPC_TIMEOUT_MS = 30000
+
+# Hotkey Dispatcher: how long a press that closely follows another waits for a superseding press
+HOTKEY_SETTLE_MS = 150
+
+# Smart Brain rules: how often rules.json is checked for edits (focus changes in between reuse the compiled rules)
+RULES_CHECK_INTERVAL_MS = 2000
+
+# Profile Store: "json" (profiles.json, default) or "sqlite" (profiles.db: indexed, with aliases and route history)
+PROFILE_STORE = os.getenv("PEBX_PROFILE_STORE", "json")
+# Quiet period before in-memory edits to profiles.json are written to disk
+PROFILES_WRITE_DELAY_MS = 500
+# Route history rows kept by the SQLite store (oldest are pruned)
+ROUTE_HISTORY_MAX_ROWS = 50000
+
+# App State: quiet period before route/device changes are written to state.json
+STATE_WRITE_DELAY_MS = 1000
+
+# Logging Pipeline: records are written in batches by a background listener
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 256
+LOG_FLUSH_INTERVAL_MS = 250
+
+# Activity Log Segments: rotation thresholds and retention limits
+LOG_SEGMENT_BYTES = 2 * 1024 * 1024
+LOG_SEGMENT_SECONDS = 24 * 3600
+LOG_MAX_SEGMENTS = 30
+LOG_MAX_TOTAL_BYTES = 50 * 1024 * 1024
+LOG_RETENTION_DAYS = 30
+
+# Live Reports: how many recent events the Reports tab shows
+LIVE_REPORT_LINES = 15
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the most recent formatted records in memory for the Live Reports tab."""
+
+    def __init__(self, capacity=LIVE_REPORT_LINES):
+        super().__init__()
+        self._lines = collections.deque(maxlen=capacity)
+        self._seq = 0
 
     def emit(self, record):
-        """Intercepts the log, encodes it to unreadable Base64, and writes it."""
         try:
             msg = self.format(record)
-            encoded_bytes = base64.b64encode(msg.encode('utf-8'))
-            encoded_msg = encoded_bytes.decode('utf-8')
-            
-            stream = self.stream
-            stream.write(encoded_msg + self.terminator)
-            self.flush()
+            with self.lock:
+                self._seq += 1
+                self._lines.append((self._seq, msg))
         except Exception:
             self.handleError(record)
 
-# Configure essential tracking
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        ObfuscatedHiddenFileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
+    def since(self, seq):
+        """Returns (lines newer than seq, latest seq, whether older lines were missed)."""
+        with self.lock:
+            fresh = [line for n, line in self._lines if n > seq]
+            oldest = self._lines[0][0] if self._lines else self._seq + 1
+            return fresh, self._seq, oldest > seq + 1
 
+def tail_log_lines(path=LOG_FILE, count=LIVE_REPORT_LINES, block_size=8192):
+    """Decodes the last count records of the Base64 log by seeking back from the end."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            data = b""
+            while pos > 0 and data.count(b"\n") <= count:
+                step = min(block_size, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+    except OSError:
+        return []
+    lines = []
+    for raw in data.splitlines()[-count:]:
+        raw = raw.strip()
+        if raw:
+            try:
+                lines.append(base64.b64decode(raw).decode('utf-8'))
+            except Exception:
+                pass  # Partial first line of the window, or a corrupted record
+    return lines
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the log listener without ever blocking the caller."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1  # Better to lose a log line than stall a hotkey
+
+class BatchingQueueListener:
+    """Drains the log queue on one thread and writes in batches.
+
+    A batch is flushed once it reaches batch_size records or flush_interval_ms
+    after its first record, whichever comes first, and on stop().
+    """
+
+    def __init__(self, q, handlers, batch_size=LOG_BATCH_SIZE, flush_interval_ms=LOG_FLUSH_INTERVAL_MS):
+        self.queue = q
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.written = 0
+        self.batches = 0
+        self._stop = object()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="pebx-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self.queue.put(self._stop)
+            self._thread.join(5.0)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is self._stop:
+                return
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if record is self._stop:
+                    stopping = True
+                    break
+                batch.append(record)
+            self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch):
+        for handler in self.handlers:
+            try:
+                if hasattr(handler, "emit_batch"):
+                    handler.emit_batch([r for r in batch if r.levelno >= handler.level])
+                else:
+                    for record in batch:
+                        if record.levelno >= handler.level:
+                            handler.handle(record)
+                    handler.flush()
+            except Exception:
+                pass
+        self.written += len(batch)
+        self.batches += 1
+
+def read_recent_log(count=LIVE_REPORT_LINES):
+    """Last count formatted records from the segment store (legacy log as fallback)."""
+    lines = [text for _, _, text in log_store.read_last(count)]
+    if len(lines) < count and os.path.exists(LOG_FILE):
+        lines = tail_log_lines(LOG_FILE, count - len(lines)) + lines
+    return lines
+
+live_log = RingBufferHandler()
+log_store = LogStore(LOG_DIR)  # reader side; needs no setup
 logger = logging.getLogger(APP_NAME)
 
+# -------------------- STARTUP --------------------
+# Nothing below runs at import: the CLI and headless modes only pay for what they use.
+
+def ensure_user_data_dir():
+    # ESSENTIAL ACID: Force Windows to create the folder if it doesn't exist yet
+    os.makedirs(USER_DATA_DIR, exist_ok=True)
+
+_log_queue = None
+_queue_handler = None
+log_listener = None
+_logging_lock = threading.Lock()
+
+def setup_logging(console=True):
+    """Starts the logging pipeline once per process (later calls are no-ops).
+
+    File and console writes happen on the listener thread; the in-memory ring
+    stays synchronous so the Live Reports tab sees records immediately.
+    """
+    global _log_queue, _queue_handler, log_listener
+    with _logging_lock:
+        if log_listener is not None:
+            return
+        ensure_user_data_dir()
+        _log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        log_formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+        file_handler = SegmentedLogHandler(
+            LOG_DIR, LOG_SEGMENT_BYTES, LOG_SEGMENT_SECONDS, LOG_MAX_SEGMENTS,
+            LOG_MAX_TOTAL_BYTES, LOG_RETENTION_DAYS
+        )
+        handlers = [file_handler]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for h in handlers:
+            h.setFormatter(log_formatter)
+        _queue_handler = DroppingQueueHandler(_log_queue)
+        _queue_handler.setFormatter(logging.Formatter('%(message)s'))  # timestamps are added by the writers
+        log_listener = BatchingQueueListener(_log_queue, handlers)
+        log_listener.start()
+        atexit.register(log_listener.stop)
+
+        # Configure essential tracking
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s [%(levelname)s] %(message)s',
+            handlers=[
+                _queue_handler,
+                live_log,
+            ]
+        )
+
+def log_pipeline_stats():
+    """Queue depth, drops and throughput of the background log writer."""
+    if log_listener is None:
+        return {"queue_depth": 0, "dropped": 0, "written": 0, "batches": 0}
+    return {
+        "queue_depth": _log_queue.qsize(),
+        "dropped": _queue_handler.dropped,
+        "written": log_listener.written,
+        "batches": log_listener.batches,
+    }
+
 def check_dependencies():
     """Validates that essential routing components are present."""
     if not os.path.exists(SOUND_VOLUME_VIEW):
@@ -0,0 +1,185 @@
+# diagnostics.py
+import base64
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from config import (
+    APP_NAME, LOG_FILE, STATE_FILE, PROFILES_FILE, RULES_FILE, SYNC_CACHE_FILE,
+    log_store, log_pipeline_stats, logger
+)
+
+REPORT_HEADER = "--- PEBX DIAGNOSTIC REPORT ---\n\n"
+
+TIME_RANGES = {
+    "Last hour": 3600,
+    "Last 24 hours": 24 * 3600,
+    "Last 7 days": 7 * 24 * 3600,
+    "Everything": None,
+}
+
+LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+}
+
+def recorded_levels():
+    """The LEVELS the log handlers actually record (lower ones would always come back empty)."""
+    floor = logger.getEffectiveLevel()
+    return {name: level for name, level in LEVELS.items() if level >= floor}
+
+class ExportCancelled(Exception):
+    pass
+
+def _legacy_records(start, end, min_level):
+    """Decodes the pre-segment single-file log, applying the same filters."""
+    if not os.path.exists(LOG_FILE):
+        return
+    with open(LOG_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            clean_line = line.strip()
+            if not clean_line:
+                continue
+            try:
+                text = base64.b64decode(clean_line).decode("utf-8")
+            except Exception:
+                if start is None and min_level <= logging.ERROR:
+                    yield f"[CORRUPTED LINE] {clean_line}"
+                continue
+            try:
+                created = time.mktime(time.strptime(text[:19], "%Y-%m-%d %H:%M:%S"))
+                level_name = text[text.index("[") + 1:text.index("]")]
+                levelno = LEVELS.get(level_name, logging.CRITICAL)
+            except ValueError:
+                created, levelno = None, logging.INFO
+            if levelno < min_level:
+                continue
+            if created is not None and ((start is not None and created < start) or (end is not None and created > end)):
+                continue
+            yield text
+
+def _snapshot_dict():
+    from router import get_snapshot
+    snapshot = get_snapshot()
+    return {
+        "generation": snapshot.generation,
+        "devices": snapshot.devices,
+        "defaults": snapshot.defaults,
+        "default_device": snapshot.default_device,
+        "sessions": {label: {"exe": exe, "pid": pid, "device": snapshot.session_devices.get(label)}
+                     for label, (exe, pid) in snapshot.sessions.items()},
+    }
+
+class DiagnosticExport:
+    """Streams filtered log records into a report (plain, gzip, or a zip bundle).
+
+    run() is meant for a background thread; on_progress(fraction) is called
+    as blocks are processed and cancel() stops the job between blocks.
+    """
+
+    def __init__(self, dest, start=None, end=None, min_level=logging.DEBUG,
+                 compress=False, bundle=False, on_progress=None):
+        if compress and bundle:
+            raise ValueError("choose either a gzip report or a zip bundle, not both")
+        self.dest = dest
+        self.start = start
+        self.end = end
+        self.min_level = min_level
+        self.compress = compress
+        self.bundle = bundle
+        self.on_progress = on_progress
+        self.records = 0
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _progress(self, fraction):
+        if self.on_progress:
+            try:
+                self.on_progress(min(1.0, fraction))
+            except Exception:
+                pass
+
+    def _write_report(self, out):
+        """Writes the filtered log to a binary stream, block by block."""
+        out.write(REPORT_HEADER.encode("utf-8"))
+        for text in _legacy_records(self.start, self.end, self.min_level):
+            out.write((text + "\n").encode("utf-8"))
+            self.records += 1
+        total = max(1, log_store.count_blocks(self.start, self.end))
+        for done, entries in enumerate(log_store.iter_blocks(self.start, self.end), 1):
+            if self._cancel.is_set():
+                raise ExportCancelled()
+            chunk = [text + "\n" for created, levelno, text in entries
+                     if levelno >= self.min_level
+                     and (self.start is None or created >= self.start)
+                     and (self.end is None or created <= self.end)]
+            if chunk:
+                out.write("".join(chunk).encode("utf-8"))
+                self.records += len(chunk)
+            self._progress(done / total)
+
+    def run(self):
+        started = time.perf_counter()
+        tmp = self.dest + ".part"
+        try:
+            if self.bundle:
+                with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+                    with bundle.open("report.txt", "w") as out:
+                        self._write_report(out)
+                    self._add_context(bundle)
+            elif self.compress:
+                with gzip.open(tmp, "wb", compresslevel=6) as out:
+                    self._write_report(out)
+            else:
+                with open(tmp, "wb") as out:
+                    self._write_report(out)
+            os.replace(tmp, self.dest)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self._progress(1.0)
+        elapsed = time.perf_counter() - started
+        logger.info(f"User extracted diagnostic reports ({self.records} records in {elapsed:.1f} s).")
+        return self.dest
+
+    def _add_context(self, bundle):
+        """Device/session snapshot, settings files and log pipeline counters."""
+        meta = {
+            "app": APP_NAME,
+            "exported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "filters": {"start": self.start, "end": self.end, "min_level": logging.getLevelName(self.min_level)},
+            "log_pipeline": log_pipeline_stats(),
+        }
+        bundle.writestr("meta.json", json.dumps(meta, indent=2))
+        try:
+            bundle.writestr("snapshot.json", json.dumps(_snapshot_dict(), indent=2))
+        except Exception as e:
+            bundle.writestr("snapshot.json", json.dumps({"error": str(e)}))
+        from profiles import store
+        from state import store as state_store
+        store.flush()  # Bundle what is in memory, not a write-behind behind it
+        state_store.flush()
+        # From the store rather than the file: the SQLite store has no profiles.json
+        bundle.writestr(os.path.basename(PROFILES_FILE), json.dumps(store.snapshot(), indent=4))
+        for path in (STATE_FILE, RULES_FILE, SYNC_CACHE_FILE):
+            if os.path.exists(path):
+                bundle.write(path, os.path.basename(path))
+
+def default_filename(compress=False, bundle=False):
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if bundle:
+        return f"PebX_Diagnostic_Bundle_{stamp}.zip"
+    return f"PebX_Diagnostic_Report_{stamp}.txt" + (".gz" if compress else "")
+
+def has_logs():
+    return os.path.exists(LOG_FILE) or bool(log_store.segments())
@@ -0,0 +1,126 @@
+# dispatch.py
+import threading
+import time
+from config import HOTKEY_SETTLE_MS, logger
+
+class DispatchJob:
+    """One queued command and, once it has run, its outcome."""
+
+    __slots__ = ("key", "label", "func", "args", "queued_at", "not_before", "generation",
+                 "started_at", "finished_at", "result", "error")
+
+    def __init__(self, key, label, func, args, generation, settle_s=0.0):
+        self.key = key
+        self.label = label
+        self.func = func
+        self.args = args
+        self.queued_at = time.perf_counter()
+        self.not_before = self.queued_at + settle_s
+        self.generation = generation  # per-key submit count; a newer one supersedes this job
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    @property
+    def elapsed_ms(self):
+        if self.finished_at is None:
+            return None
+        return (self.finished_at - self.queued_at) * 1000.0
+
+class CommandDispatcher:
+    """Runs hotkey commands on one worker so the keyboard hook returns at once.
+
+    Jobs sharing a key coalesce. A lone press runs at once; a press within
+    settle_ms of the previous one waits settle_ms for a replacement, and a job
+    replaced before it starts is dropped. A job already running sees its
+    cancel() turn True and stops between commands, so pressing 1 then 2
+    quickly leaves the second profile applied. Listeners get every finished job.
+    """
+
+    def __init__(self, settle_ms=HOTKEY_SETTLE_MS):
+        self.settle_ms = settle_ms
+        self.coalesced = 0
+        self._pending = {}  # key -> newest DispatchJob, oldest key first
+        self._generations = {}  # key -> number of jobs submitted
+        self._last_submit = {}  # key -> perf_counter() of the latest submit
+        self._listeners = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._worker, name="pebx-dispatch", daemon=True)
+        self._thread.start()
+
+    def submit(self, key, func, *args, label=None):
+        """Queues func(*args, cancel=...) under key, replacing a not-yet-started job with the same key.
+
+        cancel() turns True once a newer job with the same key is submitted;
+        long jobs pass it down and stop between commands.
+        """
+        now = time.perf_counter()
+        with self._cond:
+            generation = self._generations[key] = self._generations.get(key, 0) + 1
+            last = self._last_submit.get(key)
+            self._last_submit[key] = now
+            # Only a press that follows another one closely is held back for more
+            burst = last is not None and now - last < self.settle_ms / 1000.0
+            job = DispatchJob(key, label or key, func, args, generation, self.settle_ms / 1000.0 if burst else 0.0)
+            replaced = self._pending.pop(key, None)
+            self._pending[key] = job
+            self._cond.notify()
+        if replaced is not None:
+            self.coalesced += 1
+            logger.debug(f"[DISPATCH] '{replaced.label}' superseded by '{job.label}' before it ran.")
+        return job
+
+    def pending(self):
+        with self._cond:
+            return [job.label for job in self._pending.values()]
+
+    def add_listener(self, callback):
+        """callback(job) runs on the dispatcher thread after each job finishes."""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                key, job = next(iter(self._pending.items()))
+                remaining = job.not_before - time.perf_counter()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                del self._pending[key]
+                return job, list(self._listeners)
+
+    def _superseded(self, job):
+        with self._cond:
+            return self._generations.get(job.key) != job.generation
+
+    def _worker(self):
+        while True:
+            job, listeners = self._next_job()
+            job.started_at = time.perf_counter()
+            try:
+                job.result = job.func(*job.args, cancel=lambda job=job: self._superseded(job))
+            except Exception as e:
+                job.error = e
+                logger.error(f"[DISPATCH] '{job.label}' failed: {e}")
+            job.finished_at = time.perf_counter()
+            for callback in listeners:
+                try:
+                    callback(job)
+                except Exception as e:
+                    logger.debug(f"Dispatch listener error: {e}")
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """Shared process-wide dispatcher (created on first use)."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = CommandDispatcher()
+        return _dispatcher
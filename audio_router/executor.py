@@ -0,0 +1,130 @@
+# executor.py
+import itertools
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import ROUTING_CONCURRENCY, logger
+from metrics import metrics
+from recorder import record
+
+class RouteCommand:
+    """A single backend operation queued for execution.
+
+    Either args (a process to spawn) or action (an in-process callable that
+    returns an exit code, 0 meaning success) must be given.
+    """
+
+    def __init__(self, args=None, label="", priority=0, action=None, op="command"):
+        self.args = list(args) if args is not None else None
+        self.action = action
+        self.op = op  # metrics name: set_default, set_app_default, mute
+        self.label = label or (" ".join(self.args[1:]) if self.args else "")
+        self.priority = priority  # lower runs first (0 = foreground app)
+
+CANCELLED = "cancelled"  # CommandResult.error for commands skipped because their batch was superseded
+
+class CommandResult:
+    def __init__(self, command, returncode, elapsed_ms, error=None):
+        self.command = command
+        self.returncode = returncode
+        self.elapsed_ms = elapsed_ms
+        self.error = error
+
+    @property
+    def cancelled(self):
+        return self.error == CANCELLED
+
+    @property
+    def ok(self):
+        return self.error is None and self.returncode == 0
+
+class RoutingReport:
+    """Per-command outcome and timing for one routing batch."""
+
+    def __init__(self, results, elapsed_ms):
+        self.results = results
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def ok(self):
+        return all(r.ok for r in self.results)
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok and not r.cancelled]
+
+    @property
+    def cancelled(self):
+        return [r for r in self.results if r.cancelled]
+
+    def summary(self):
+        text = f"{len(self.results)} commands in {self.elapsed_ms:.0f} ms ({len(self.failed)} failed"
+        return text + (f", {len(self.cancelled)} cancelled)" if self.cancelled else ")")
+
+def _run_one(command, cancel=None):
+    if cancel is not None and cancel():
+        return CommandResult(command, None, 0.0, error=CANCELLED)
+    start = time.perf_counter()
+    try:
+        if command.action is not None:
+            returncode = command.action()
+        else:
+            returncode = subprocess.run(
+                command.args,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=False
+            ).returncode
+        result = CommandResult(command, returncode, (time.perf_counter() - start) * 1000.0)
+    except Exception as e:
+        result = CommandResult(command, None, (time.perf_counter() - start) * 1000.0, error=str(e))
+    metrics.observe(command.op, result.elapsed_ms, result.ok, result.returncode)
+    record("command", op=command.op, label=command.label, ok=result.ok, ms=round(result.elapsed_ms, 2))
+    return result
+
+class RoutingExecutor:
+    """Bounded worker pool that fans routing commands out concurrently.
+
+    Commands are started in priority order, so the foreground app's routes grab
+    the first free workers and settle before background apps.
+    """
+
+    def __init__(self, max_workers=ROUTING_CONCURRENCY):
+        self.max_workers = max(1, int(max_workers))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pebx-route")
+
+    def run(self, commands, on_result=None, cancel=None):
+        """Runs commands and waits for all of them. on_result(done, total), if
+        given, is called from the worker threads as each one finishes. Once
+        cancel() returns True, commands that have not started are skipped."""
+        commands = sorted(commands, key=lambda c: c.priority)
+        start = time.perf_counter()
+        futures = [self._pool.submit(_run_one, c, cancel) for c in commands]
+        if on_result is not None:
+            done = itertools.count(1)
+            for f in futures:
+                f.add_done_callback(lambda _: on_result(next(done), len(futures)))
+        results = [f.result() for f in futures]
+        report = RoutingReport(results, (time.perf_counter() - start) * 1000.0)
+        for r in report.failed:
+            logger.warning(f"Routing command failed ({r.command.label}): "
+                           f"exit={r.returncode} error={r.error}")
+        return report
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Shared process-wide executor (created on first use)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = RoutingExecutor()
+        return _executor
+
+def run_commands(commands, on_result=None, cancel=None):
+    return get_executor().run(commands, on_result, cancel)
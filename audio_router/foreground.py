@@ -1,17 +1,235 @@
-import win32gui
-import win32process
+import threading
+import time
+from collections import OrderedDict
 import psutil
+try:
+    import win32gui
+    import win32process
+except ImportError:
+    win32gui = win32process = None  # Non-Windows hosts (fake event source only)
 from config import logger
 
+# -------------------- PID METADATA CACHE --------------------
+
+class ProcessInfo:
+    __slots__ = ("pid", "name", "path", "create_time", "title", "timestamp")
+
+    def __init__(self, pid, name, path=None, create_time=None, title=None, timestamp=None):
+        self.pid = pid
+        self.name = name
+        self.path = path
+        self.create_time = create_time
+        self.title = title
+        self.timestamp = timestamp if timestamp is not None else time.perf_counter()
+
+    def with_event(self, title=None, timestamp=None):
+        """Copy stamped for a new focus event (the cached entry stays untouched)."""
+        return ProcessInfo(self.pid, self.name, self.path, self.create_time, title, timestamp)
+
+class ProcessCache:
+    """PID -> (exe name, path, create time), validated by process creation time.
+
+    A recycled PID has a different creation time, so it misses and gets
+    re-resolved; everything else is answered from memory.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, pid):
+        try:
+            proc = psutil.Process(pid)
+            create_time = proc.create_time()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+        with self._lock:
+            cached = self._entries.get(pid)
+            if cached is not None and cached.create_time == create_time:
+                self._entries.move_to_end(pid)
+                self.hits += 1
+                return cached
+        try:
+            name = proc.name()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+        try:
+            path = proc.exe()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            path = None  # Elevated processes hide their path; the name is enough
+        info = ProcessInfo(pid, name, path, create_time)
+        with self._lock:
+            self.misses += 1
+            self._entries[pid] = info
+            self._entries.move_to_end(pid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return info
+
+process_cache = ProcessCache()
+
 def get_foreground_process():
     """Detects the active window and safely handles permission errors."""
     try:
         hwnd = win32gui.GetForegroundWindow()
         if hwnd:
             _, pid = win32process.GetWindowThreadProcessId(hwnd)
-            return psutil.Process(pid).name()
-    except (psutil.NoSuchProcess, psutil.AccessDenied):
-        pass # Expected background OS behavior, ignore safely
+            info = process_cache.lookup(pid)
+            return info.name if info else None
     except Exception as e:
         logger.debug(f"Foreground tracking error: {e}")
-    return None
\ No newline at end of file
+    return None
+
+# -------------------- FOREGROUND EVENT SOURCES --------------------
+
+class ForegroundEventSource:
+    """Pushes a ProcessInfo to the subscriber every time focus moves to a new process."""
+
+    def __init__(self):
+        self._callback = None
+        self._last_pid = None
+
+    def start(self, callback):
+        self._callback = callback
+
+    def stop(self):
+        self._callback = None
+
+    def _publish(self, info):
+        if info is None or info.pid == self._last_pid:
+            return
+        self._last_pid = info.pid
+        callback = self._callback
+        if callback:
+            try:
+                callback(info)
+            except Exception as e:
+                logger.debug(f"Foreground subscriber error: {e}")
+
+class WinEventForegroundSource(ForegroundEventSource):
+    """EVENT_SYSTEM_FOREGROUND hook: Windows calls us the moment focus changes."""
+
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    WINEVENT_SKIPOWNPROCESS = 0x0002
+
+    def __init__(self, cache=process_cache):
+        super().__init__()
+        self.cache = cache
+        self._thread = None
+        self._thread_id = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self, callback):
+        super().start(callback)
+        self._thread = threading.Thread(target=self._run, name="pebx-foreground", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(2.0) or self._error:
+            raise OSError(self._error or "foreground hook did not start")
+
+    def _run(self):
+        try:
+            import ctypes
+            from ctypes import wintypes
+            user32 = ctypes.windll.user32
+            kernel32 = ctypes.windll.kernel32
+        except Exception as e:
+            self._error = str(e)
+            self._ready.set()
+            return
+
+        WinEventProc = ctypes.WINFUNCTYPE(
+            None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+            wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+        def on_event(hook, event, hwnd, id_object, id_child, thread_id, event_time):
+            stamp = time.perf_counter()
+            if not hwnd:
+                return
+            try:
+                _, pid = win32process.GetWindowThreadProcessId(hwnd)
+                info = self.cache.lookup(pid)
+                if info:
+                    self._publish(info.with_event(win32gui.GetWindowText(hwnd), stamp))
+            except Exception as e:
+                logger.debug(f"Foreground hook error: {e}")
+
+        # Keep a reference: a collected callback would crash the hook
+        self._proc = WinEventProc(on_event)
+        hook = user32.SetWinEventHook(
+            self.EVENT_SYSTEM_FOREGROUND, self.EVENT_SYSTEM_FOREGROUND, 0, self._proc, 0, 0,
+            self.WINEVENT_OUTOFCONTEXT | self.WINEVENT_SKIPOWNPROCESS)
+        if not hook:
+            self._error = "SetWinEventHook failed"
+            self._ready.set()
+            return
+        self._thread_id = kernel32.GetCurrentThreadId()
+        self._ready.set()
+
+        # Seed with whatever already has focus
+        on_event(None, self.EVENT_SYSTEM_FOREGROUND, win32gui.GetForegroundWindow(), 0, 0, 0, 0)
+
+        msg = wintypes.MSG()
+        while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+            user32.TranslateMessage(ctypes.byref(msg))
+            user32.DispatchMessageW(ctypes.byref(msg))
+        user32.UnhookWinEvent(hook)
+
+    def stop(self):
+        super().stop()
+        if self._thread_id:
+            import ctypes
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, 0x0012, 0, 0)  # WM_QUIT
+            self._thread_id = None
+
+class PollingForegroundSource(ForegroundEventSource):
+    """Fallback when the hook can't be installed: polls, but only publishes changes."""
+
+    def __init__(self, interval_ms=500, cache=process_cache):
+        super().__init__()
+        self.interval_ms = interval_ms
+        self.cache = cache
+        self._stop = threading.Event()
+
+    def start(self, callback):
+        super().start(callback)
+        self._stop.clear()
+        threading.Thread(target=self._run, name="pebx-foreground-poll", daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_ms / 1000.0):
+            try:
+                hwnd = win32gui.GetForegroundWindow()
+                if hwnd:
+                    _, pid = win32process.GetWindowThreadProcessId(hwnd)
+                    info = self.cache.lookup(pid)
+                    if info:
+                        self._publish(info.with_event(win32gui.GetWindowText(hwnd)))
+            except Exception as e:
+                logger.debug(f"Foreground tracking error: {e}")
+
+    def stop(self):
+        super().stop()
+        self._stop.set()
+
+class FakeForegroundSource(ForegroundEventSource):
+    """Test double: call emit() to simulate the user focusing a process."""
+
+    def emit(self, name, pid=None, path=None, title=None):
+        pid = pid if pid is not None else abs(hash(name)) % 100000
+        self._publish(ProcessInfo(pid, name, path, title=title))
+
+def start_foreground_source(callback):
+    """Starts the WinEvent hook, degrading to polling if it can't be installed."""
+    source = WinEventForegroundSource()
+    try:
+        source.start(callback)
+    except Exception as e:
+        logger.warning(f"Foreground hook unavailable ({e}). Falling back to polling.")
+        source = PollingForegroundSource()
+        source.start(callback)
+    return source
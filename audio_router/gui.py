@@ -4,9 +4,8 @@ import customtkinter as ctk
 import threading
 import time
 import os
-import base64
-import json
 import ctypes
+import re
 import tkinter.filedialog as filedialog
 import tkinter.messagebox as messagebox
 
@@ -16,21 +15,37 @@ WM_DEVICECHANGE = 0x0219
 DBT_DEVNODES_CHANGED = 0x0007
 
 from router import (
-    scan_output_devices, scan_audio_apps, set_default_device,
-    set_app_device, set_app_device_by_pid, toggle_mute, open_windows_audio_settings,
-    get_current_default_device, enable_startup, is_startup_enabled
+    set_default_device,
+    toggle_mute, open_windows_audio_settings, get_current_default_device,
+    enable_startup, is_startup_enabled, get_snapshot, add_session_listener, last_known_snapshot
 )
-from foreground import get_foreground_process
+from foreground import start_foreground_source
+from brain import SmartBrain
+from reconcile import get_controller
 from profiles import (
-    get_profile, save_profile, add_app_to_profile, apply_profile, 
+    save_profile, add_app_to_profile,
     BASE_PROFILES, get_custom_profiles, create_custom_profile, delete_custom_profile
 )
-from config import APP_NAME, LOG_FILE, STATE_FILE, LOGO_APP, logger
+from io_service import IOService
+from storage import Debouncer
+from state import store as state_store
+from dispatch import get_dispatcher
+from metrics import metrics
+from recorder import record
+from diagnostics import DiagnosticExport, TIME_RANGES, default_filename, has_logs, recorded_levels
+from config import (
+    APP_NAME, LOGO_APP, IO_DRAIN_INTERVAL_MS, LIVE_REPORT_LINES,
+    DEVICE_CHANGE_QUIET_MS, DEVICE_CHANGE_MAX_DELAY_MS, STATUS_POLL_INTERVAL_MS, STATUS_MAX_AGE_MS,
+    live_log, read_recent_log, logger
+)
 
 # Theme & colors
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("dark-blue")
 
+# Labels as produced by backends.session_label (state.json before routes were keyed by exe)
+_LEGACY_LABEL = re.compile(r"^(.*) \(PID: (\d+)\)$")
+
 ACCENT = "#00E5FF"
 BG_MAIN = "#14181C"
 BG_PANEL = "#1B2127"
@@ -59,23 +74,49 @@ class PebXGUI(ctk.CTk):
             logger.warning(f"App logo ({LOGO_APP}) missing. Taskbar will use default.")
         self.devices = {}
         self.apps = {}
+        self._apps_rendered = False
+        self._devices_rendered = False
+        self._device_events = 0
+        # Hardware messages arrive in bursts: one devices-only rescan once they stop
+        self._device_change = Debouncer(DEVICE_CHANGE_QUIET_MS, lambda: self.io.post(self._on_devices_changed),
+                                        name="pebx-devchange", max_delay_ms=DEVICE_CHANGE_MAX_DELAY_MS)
         self.current_default_cache = None
         self._pulse_running = False
         self.saved_app_routes = {}
-        self.last_foreground_app = None
+        self._state_restored = False  # save_state() waits until load_state() has run
+        self._starting = True  # the status bar shows startup progress until load_state() finishes
+        self._log_seq = live_log.since(0)[1]  # earlier records come from the file tail
+        self._log_line_count = 0
+        self._log_has_text = False  # the placeholder text goes on the first render
+        self._export_job = None
         self.auto_switch_enabled = ctk.BooleanVar(value=False)
+        self.io = IOService()
+        # Smart Brain is fed by focus-change events, not polling
+        self.brain = SmartBrain(on_route=lambda info, device_id: self.io.post(self._on_brain_route))
+        self.auto_switch_enabled.trace_add("write", lambda *_: self.brain.set_enabled(self.auto_switch_enabled.get()))
+        self.foreground_source = start_foreground_source(self.brain.on_foreground)
+        # Any scan (refresh, drift check, Brain) that changes the session list updates the app lists
+        add_session_listener(self._on_session_delta)
+        # Hotkey profile switches run on the dispatcher; show when they land
+        get_dispatcher().add_listener(lambda job: self.io.post(self._on_dispatch_done, job))
         self.build_ui()
-        self.refresh_all()
+        self.after(IO_DRAIN_INTERVAL_MS, self._drain_io)
+        self._load_log_history()
+        # Paint the last-known snapshot now; revalidate and restore routes in the background
         self.load_state()
+        self.refresh_profiles()
+        self._update_autostart_label()
         self.after(1500, self._periodic_status_update)
-        self.after(2000, self._foreground_watcher_loop)
 
     def start_device_watchdog(self):
         def wndproc(hwnd, msg, wparam, lparam):
             if msg == WM_DEVICECHANGE:
                 if wparam == DBT_DEVNODES_CHANGED:
-                    logger.info("[METABOLISM] Hardware change detected. Triggering auto-sync.")
-                    self.after(1000, self.refresh_all)
+                    if self._device_events == 0:
+                        logger.info("[METABOLISM] Hardware change detected. Auto-sync scheduled.")
+                    self._device_events += 1
+                    record("device_change")
+                    self._device_change.trigger()
             return win32gui.CallWindowProc(self.old_wndproc, hwnd, msg, wparam, lparam)
         hwnd = self.winfo_id()
         self.old_wndproc = win32gui.SetWindowLong(hwnd, win32con.GWL_WNDPROC, wndproc)
@@ -136,7 +177,18 @@ class PebXGUI(ctk.CTk):
         btn_prof_row.pack(pady=(10, 15))
         ctk.CTkButton(btn_prof_row, text="SAVE TO MATRIX", fg_color=ACCENT, text_color="black", hover_color="#00B8CC", command=self.save_to_profile_matrix).pack(side="left", padx=10)
         ctk.CTkButton(btn_prof_row, text="TEST PROFILE NOW", border_color=ACCENT, border_width=1, fg_color="transparent", hover_color=BORDER, command=self.test_profile).pack(side="left", padx=10)
-        ctk.CTkLabel(tab_reports, text="SYSTEM AUDIT LOG (Last 15 Events)", text_color=ACCENT, font=("Segoe UI", 14, "bold")).pack(pady=(10, 5), anchor="w", padx=10)
+        metrics_frame = ctk.CTkFrame(tab_reports, fg_color=BG_PANEL, border_width=1, border_color=BORDER)
+        metrics_frame.pack(side="bottom", fill="x", padx=10, pady=(0, 10))
+        metrics_head = ctk.CTkFrame(metrics_frame, fg_color="transparent")
+        metrics_head.pack(fill="x", padx=10, pady=(8, 0))
+        ctk.CTkLabel(metrics_head, text="ROUTING METRICS", text_color=ACCENT, font=("Segoe UI", 13, "bold")).pack(side="left")
+        ctk.CTkButton(metrics_head, text="EXPORT METRICS", width=130, fg_color=BG_PANEL, hover_color=ACCENT, border_width=1, border_color=BORDER, command=self._export_metrics).pack(side="right")
+        self.metrics_textbox = ctk.CTkTextbox(metrics_frame, height=120, fg_color=BG_PANEL, text_color="#00E5FF", font=("Consolas", 12))
+        self.metrics_textbox.pack(fill="x", padx=10, pady=(5, 10))
+        self.metrics_textbox.insert("1.0", "No routing activity yet.")
+        self.metrics_textbox.configure(state="disabled")
+        self._metrics_text = None
+        ctk.CTkLabel(tab_reports, text=f"SYSTEM AUDIT LOG (Last {LIVE_REPORT_LINES} Events)", text_color=ACCENT, font=("Segoe UI", 14, "bold")).pack(pady=(10, 5), anchor="w", padx=10)
         self.log_textbox = ctk.CTkTextbox(tab_reports, fg_color=BG_PANEL, text_color="#00FF41", font=("Consolas", 12), border_width=1, border_color=BORDER)
         self.log_textbox.pack(fill="both", expand=True, padx=10, pady=(0, 10))
         self.log_textbox.insert("1.0", "Waiting for telemetry...")
@@ -145,7 +197,7 @@ class PebXGUI(ctk.CTk):
         footer.pack(fill="x", padx=20, pady=(0, 20))
         footer.columnconfigure((0, 1, 2, 3, 4), weight=1)
         ctk.CTkButton(footer, text="MUTE", fg_color=BG_PANEL, hover_color=ACCENT, border_width=1, border_color=BORDER, command=self._mute_and_pulse).grid(row=0, column=0, padx=5, pady=15, sticky="ew")
-        ctk.CTkButton(footer, text="WINDOWS MIXER", fg_color=BG_PANEL, hover_color=ACCENT, border_width=1, border_color=BORDER, command=open_windows_audio_settings).grid(row=0, column=1, padx=5, pady=15, sticky="ew")
+        ctk.CTkButton(footer, text="WINDOWS MIXER", fg_color=BG_PANEL, hover_color=ACCENT, border_width=1, border_color=BORDER, command=self._open_windows_mixer).grid(row=0, column=1, padx=5, pady=15, sticky="ew")
         ctk.CTkButton(footer, text="REFRESH", fg_color=BG_PANEL, hover_color=ACCENT, border_width=1, border_color=BORDER, command=self.refresh_all).grid(row=0, column=2, padx=5, pady=15, sticky="ew")
         self.autostart_toggle = ctk.CTkButton(footer, text="Auto-Start: Checking...", fg_color=BG_PANEL, hover_color=ACCENT, border_width=1, border_color=BORDER, command=self._toggle_autostart)
         self.autostart_toggle.grid(row=0, column=3, padx=5, pady=15, sticky="ew")
@@ -156,13 +208,15 @@ class PebXGUI(ctk.CTk):
         dialog = ctk.CTkInputDialog(text="Enter new Profile Name:", title="Create Custom Profile")
         name = dialog.get_input()
         if name:
-            success, msg = create_custom_profile(name)
-            if success:
-                self.refresh_profiles()
-                self.profile_name_entry.set(name)
-                self._update_live_reports()
-            else:
-                messagebox.showwarning("Creation Blocked", msg)
+            def done(result):
+                success, msg = result
+                if success:
+                    self.refresh_profiles()
+                    self.profile_name_entry.set(name.strip())
+                    self._update_live_reports()
+                else:
+                    messagebox.showwarning("Creation Blocked", msg)
+            self.io.submit(create_custom_profile, name, callback=done)
     def gui_delete_profile(self):
         target = self.profile_name_entry.get()
         if target in BASE_PROFILES:
@@ -170,14 +224,18 @@ class PebXGUI(ctk.CTk):
             return
         confirm = messagebox.askyesno("Confirm Deletion", f"Are you sure you want to permanently delete the '{target}' profile?")
         if confirm:
-            success, msg = delete_custom_profile(target)
-            if success:
-                self.refresh_profiles()
-                self._update_live_reports()
-            else:
-                messagebox.showerror("Error", msg)
+            def done(result):
+                success, msg = result
+                if success:
+                    self.refresh_profiles()
+                    self._update_live_reports()
+                else:
+                    messagebox.showerror("Error", msg)
+            self.io.submit(delete_custom_profile, target, callback=done)
     def refresh_profiles(self):
-        all_profiles = BASE_PROFILES + get_custom_profiles()
+        self.io.submit(get_custom_profiles, callback=self._populate_profiles, key="profiles")
+    def _populate_profiles(self, customs):
+        all_profiles = BASE_PROFILES + customs
         self.profile_name_entry.configure(values=all_profiles)
         if self.profile_name_entry.get() not in all_profiles:
             self.profile_name_entry.set(all_profiles[0])
@@ -191,146 +249,273 @@ class PebXGUI(ctk.CTk):
         if app_label in self.apps and device_name in self.devices:
             exe_name, pid = self.apps[app_label]
             device_id = self.devices[device_name]
-            add_app_to_profile(profile_name, exe_name, device_id)
-            messagebox.showinfo("Matrix Updated", f"Assigned '{exe_name}' to '{device_name}' under the '{profile_name}' profile.")
-            self._update_live_reports()
+            def done(_):
+                messagebox.showinfo("Matrix Updated", f"Assigned '{exe_name}' to '{device_name}' under the '{profile_name}' profile.")
+                self._update_live_reports()
+            self.io.submit(add_app_to_profile, profile_name, exe_name, device_id, callback=done)
         else:
             messagebox.showwarning("Invalid Matrix", "Please ensure an active app and valid device are selected.")
 
     def test_profile(self):
         profile_name = self.profile_name_entry.get()
-        apply_profile(profile_name, set_app_device)
+        self.io.submit(get_controller().apply_profile, profile_name, self.brain.last_exe,
+                       callback=lambda _: self._update_live_reports())
         self._pulse_animation()
 
-    # [Keep _foreground_watcher_loop, _save_auto_profile_with_pulse exactly as they are]
-    def _foreground_watcher_loop(self):
-        try:
-            if self.auto_switch_enabled.get():
-                active_exe = get_foreground_process()
-                if active_exe and active_exe != self.last_foreground_app:
-                    self.last_foreground_app = active_exe
-                    target_device_id = get_profile(active_exe)
-                    if target_device_id:
-                        logger.info(f"[BRAIN] Target locked: '{active_exe}'. Applying auto-route.")
-                        set_app_device(target_device_id, active_exe)
-                        self._update_live_reports()
-        except Exception as e:
-            logger.debug(f"Brain loop error: {e}")
-        finally:
-            self.after(2000, self._foreground_watcher_loop) 
+    # [Keep _save_auto_profile_with_pulse exactly as it is]
+    def _on_brain_route(self, _):
+        self._update_live_reports()
+    def _on_dispatch_done(self, job):
+        self._update_live_reports()
+        if job.error is None and self._export_job is None:
+            self.status_label.configure(text=f"● PROFILE {job.label.upper()} APPLIED  •  {job.elapsed_ms:.0f} ms")
+        self._pulse_animation()
     def _save_auto_profile_with_pulse(self):
         app_label = self.app_dropdown.get()
         device_name = self.app_device_dropdown.get()
         if app_label in self.apps and device_name in self.devices:
             exe_name, pid = self.apps[app_label]
             device_id = self.devices[device_name]
-            save_profile(exe_name, device_id)
-            logger.info(f"[BRAIN] Saved Auto-Profile: '{exe_name}' -> '{device_name}'")
-            self._update_live_reports()
-            self.save_state()
+            def done(_):
+                logger.info(f"[BRAIN] Saved Auto-Profile: '{exe_name}' -> '{device_name}'")
+                self.save_state()
+            self.io.submit(save_profile, exe_name, device_id, callback=done)
         self._pulse_animation()
 
     # [Keep state management, reports, updates exactly as they are]
     def load_state(self):
-        if not os.path.exists(STATE_FILE):
-            return
-        try:
-            with open(STATE_FILE, 'r', encoding='utf-8') as f:
-                state = json.load(f)
-            global_dev = state.get("global_device")
-            if global_dev and global_dev in self.devices:
-                self.global_device_dropdown.set(global_dev)
-                set_default_device(self.devices[global_dev])
-                logger.info(f"[MEMORY] Restored Global Device: {global_dev}")
-            routes = state.get("app_routes", {})
-            for app_label, dev_name in routes.items():
-                if app_label in self.apps and dev_name in self.devices:
-                    self.saved_app_routes[app_label] = dev_name
-                    exe_name, pid = self.apps[app_label]
-                    set_app_device_by_pid(self.devices[dev_name], pid)
-                    logger.info(f"[MEMORY] Restored Route: {app_label} -> {dev_name}")
-        except Exception as e:
+        """Startup pipeline (background): cached paint, fresh scan, route restore.
+
+        The window shows the last-known devices and apps straight away; the
+        saved default and app routes then go out as one concurrent batch, and
+        only the ones that drifted cost a SoundVolumeView spawn.
+        """
+        started = time.perf_counter()
+        def progress(text):
+            self.io.post(self._show_startup_progress, text)
+        def run():
+            state = state_store.load()
+            cached = last_known_snapshot()
+            if cached is not None:
+                self.io.post(self._paint_snapshot, cached)
+            progress("SCANNING DEVICES")
+            snapshot = get_snapshot(max_age_ms=0)
+            self.io.post(self._paint_snapshot, snapshot)
+            restored = self._restore_state(state, snapshot)
+            self.io.post(self._on_state_restored, restored)
+            progress("RESTORING ROUTES")
+            return get_controller().reconcile(
+                on_result=lambda done, total: progress(f"RESTORING ROUTES {done}/{total}"))
+        def done(report):
+            self._starting = False
+            elapsed = (time.perf_counter() - started) * 1000.0
+            changed = len(report.results) if report is not None else 0
+            logger.info(f"[MEMORY] Startup complete in {elapsed:.0f} ms ({changed} routing commands).")
+            self.status_label.configure(text=f"● ENGINE ACTIVE  •  READY IN {elapsed:.0f} ms")
+            self._update_live_reports()
+        def failed(e):
+            self._starting = False
+            self._state_restored = True
             logger.error(f"[MEMORY] Failed to load state: {e}")
+        self.io.submit(run, callback=done, errback=failed, key="startup")
+    def _restore_state(self, state, snapshot):
+        """Worker thread: loads saved routes into the controller's desired state."""
+        global_dev = state.get("global_device")
+        controller = get_controller()
+        if global_dev in snapshot.devices:
+            controller.set_default(snapshot.devices[global_dev])
+            logger.info(f"[MEMORY] Restored Global Device: {global_dev}")
+        else:
+            global_dev = None
+        routes = {}
+        for app_key, dev_name in state.get("app_routes", {}).items():
+            if dev_name not in snapshot.devices:
+                continue
+            legacy = _LEGACY_LABEL.match(app_key)
+            if legacy:
+                # Old state keyed by "name (PID: n)": only recoverable while that PID lives
+                if app_key not in snapshot.sessions:
+                    logger.info(f"[MEMORY] Dropped stale route: {app_key} -> {dev_name}")
+                    continue
+                app_key = snapshot.sessions[app_key][0]
+            routes[app_key] = dev_name
+            controller.set_route(app_key, snapshot.devices[dev_name])
+            logger.info(f"[MEMORY] Restored Route: {app_key} -> {dev_name}")
+        sessions = controller.restore_session_routes(state.get("session_routes", {}), snapshot)
+        if sessions:
+            logger.info(f"[MEMORY] Restored {sessions} per-session route(s).")
+        return global_dev, routes
+    def _on_state_restored(self, restored):
+        global_dev, routes = restored
+        if global_dev:
+            self.global_device_dropdown.set(global_dev)
+        self.saved_app_routes.update(routes)
+        self._state_restored = True
+    def _paint_snapshot(self, snapshot):
+        self.refresh_devices(dict(snapshot.devices))
+        self.refresh_apps(dict(snapshot.sessions))
+    def _show_startup_progress(self, text):
+        if self._starting:
+            self.status_label.configure(text=f"● STARTING  •  {text}")
     def save_state(self):
-        state = {"global_device": self.global_device_dropdown.get(), "app_routes": self.saved_app_routes}
-        try:
-            if os.path.exists(STATE_FILE):
-                try: ctypes.windll.kernel32.SetFileAttributesW(STATE_FILE, 0x80)
-                except Exception: pass
-            with open(STATE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(state, f, indent=4)
-            try: ctypes.windll.kernel32.SetFileAttributesW(STATE_FILE, 0x02)
-            except Exception: pass 
-            logger.info("[MEMORY] Application state successfully saved and hidden.")
-            self._update_live_reports()
-        except Exception as e:
-            logger.error(f"[MEMORY] Failed to save state: {e}")
+        """Records the current state in memory; the store writes it (debounced) only if it changed."""
+        if not self._state_restored:
+            return  # Don't let pre-restore dropdown defaults overwrite the saved state
+        state_store.update(global_device=self.global_device_dropdown.get(),
+                           app_routes=dict(self.saved_app_routes),
+                           session_routes=get_controller().session_routes())
     def _update_live_reports(self):
-        if not os.path.exists(LOG_FILE):
-            return
+        """Appends only records logged since the last call (in-memory, no file I/O)."""
+        lines, self._log_seq, missed = live_log.since(self._log_seq)
+        if lines:
+            self._render_live_reports(lines, replace=missed)
+    def _load_log_history(self):
+        """Cold start: seeds the Reports tab from the tail of the on-disk log."""
+        def read():
+            lines = read_recent_log()
+            # Everything up to this sequence number is already in the file tail
+            return lines, live_log.since(0)[1]
+        def done(result):
+            lines, seq = result
+            self._log_seq = max(self._log_seq, seq)
+            if lines:
+                self._render_live_reports(lines, replace=True)
+            self._update_live_reports()
+        self.io.submit(read, callback=done)
+    def _render_live_reports(self, lines, replace=False):
         try:
-            with open(LOG_FILE, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            recent_lines = lines[-15:]
-            display_text = ""
-            for line in recent_lines:
-                clean_line = line.strip()
-                if clean_line:
-                    try:
-                        decoded = base64.b64decode(clean_line).decode('utf-8')
-                        display_text += decoded + "\n"
-                    except Exception:
-                        pass
             self.log_textbox.configure(state="normal")
-            self.log_textbox.delete("1.0", "end")
-            self.log_textbox.insert("1.0", display_text)
+            if replace or not self._log_has_text:
+                self.log_textbox.delete("1.0", "end")
+                self._log_line_count = 0
+            self.log_textbox.insert("end", "".join(line + "\n" for line in lines))
+            self._log_line_count += len(lines)
+            self._log_has_text = True
+            excess = self._log_line_count - LIVE_REPORT_LINES
+            if excess > 0:
+                self.log_textbox.delete("1.0", f"{excess + 1}.0")
+                self._log_line_count -= excess
             self.log_textbox.yview("end")
             self.log_textbox.configure(state="disabled")
         except Exception as e:
             logger.debug(f"Live report update error: {e}")
     def _extract_diagnostic_report(self):
-        if not os.path.exists(LOG_FILE):
+        if not has_logs():
             messagebox.showinfo("No Data", "No diagnostic logs found to collect.")
             return
-        dest = filedialog.asksaveasfilename(defaultextension=".txt", initialfile="PebX_Diagnostic_Report.txt", title="Save Diagnostic Report", filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")])
+        if self._export_job is not None:
+            messagebox.showinfo("Export Running", "A diagnostic export is already in progress.")
+            return
+        dialog = ctk.CTkToplevel(self)
+        dialog.title("Collect Logs")
+        dialog.configure(fg_color=BG_MAIN)
+        dialog.resizable(False, False)
+        dialog.transient(self)
+        range_menu = ctk.CTkOptionMenu(dialog, values=list(TIME_RANGES.keys()), fg_color=BG_PANEL, button_color=ACCENT, button_hover_color="#00B8CC")
+        range_menu.set("Last 24 hours")
+        levels = recorded_levels()
+        level_menu = ctk.CTkOptionMenu(dialog, values=list(levels.keys()), fg_color=BG_PANEL, button_color=ACCENT, button_hover_color="#00B8CC")
+        level_menu.set("INFO" if "INFO" in levels else next(iter(levels)))
+        gzip_var = ctk.BooleanVar(value=False)
+        bundle_var = ctk.BooleanVar(value=True)
+        # A bundle is already a compressed .zip: the two formats are alternatives
+        def gzip_toggled():
+            if gzip_var.get():
+                bundle_var.set(False)
+        def bundle_toggled():
+            if bundle_var.get():
+                gzip_var.set(False)
+        ctk.CTkLabel(dialog, text="Time Range:").grid(row=0, column=0, padx=(20, 5), pady=(20, 5), sticky="w")
+        range_menu.grid(row=0, column=1, padx=(5, 20), pady=(20, 5), sticky="ew")
+        ctk.CTkLabel(dialog, text="Minimum Level:").grid(row=1, column=0, padx=(20, 5), pady=5, sticky="w")
+        level_menu.grid(row=1, column=1, padx=(5, 20), pady=5, sticky="ew")
+        ctk.CTkCheckBox(dialog, text="Compress report (gzip)", variable=gzip_var, command=gzip_toggled).grid(row=2, column=0, columnspan=2, padx=20, pady=5, sticky="w")
+        ctk.CTkCheckBox(dialog, text="Bundle snapshot, state and profiles (.zip)", variable=bundle_var, command=bundle_toggled).grid(row=3, column=0, columnspan=2, padx=20, pady=5, sticky="w")
+        def start():
+            window = TIME_RANGES[range_menu.get()]
+            min_level = levels[level_menu.get()]
+            compress, bundle = gzip_var.get(), bundle_var.get()
+            dialog.destroy()
+            self._start_diagnostic_export(window, min_level, compress, bundle)
+        ctk.CTkButton(dialog, text="EXPORT", fg_color="#FF3B30", hover_color="#CC2E26", text_color="white", command=start).grid(row=4, column=0, columnspan=2, padx=20, pady=(10, 20), sticky="ew")
+        dialog.grab_set()
+    def _start_diagnostic_export(self, window, min_level, compress, bundle):
+        initial = default_filename(compress, bundle)
+        ext = os.path.splitext(initial)[1]
+        dest = filedialog.asksaveasfilename(defaultextension=ext, initialfile=initial, title="Save Diagnostic Report", filetypes=[("Diagnostic Report", f"*{ext}"), ("All Files", "*.*")])
         if not dest: return
-        try:
-            with open(LOG_FILE, 'r') as f_in, open(dest, 'w', encoding='utf-8') as f_out:
-                f_out.write("--- PEBX DIAGNOSTIC REPORT ---\n\n")
-                for line in f_in:
-                    clean_line = line.strip()
-                    if clean_line:
-                        try:
-                            decoded_bytes = base64.b64decode(clean_line)
-                            f_out.write(decoded_bytes.decode('utf-8') + "\n")
-                        except Exception:
-                            f_out.write(f"[CORRUPTED LINE] {clean_line}\n")
+        start = time.time() - window if window else None
+        def progress(fraction):
+            self.io.post(lambda pct: self.status_label.configure(text=f"● EXPORTING LOGS  •  {pct:.0%}"), fraction)
+        job = DiagnosticExport(dest, start=start, min_level=min_level, compress=compress, bundle=bundle, on_progress=progress)
+        self._export_job = job
+        def done(_):
+            self._export_job = None
             messagebox.showinfo("Success", "Diagnostic report generated. You can now analyze this file.")
-            logger.info("User extracted diagnostic reports.")
             self._update_live_reports() 
-        except Exception as e:
+        def failed(e):
+            self._export_job = None
             messagebox.showerror("Error", f"Failed to extract logs: {e}")
+        self.io.submit(job.run, callback=done, errback=failed, key="export")
     def _periodic_status_update(self):
         try:
-            current = get_current_default_device()
-            if current:
-                self.status_label.configure(text=f"● ENGINE ACTIVE  •  DEFAULT: {current}")
-                if self.current_default_cache != current:
-                    logger.info(f"System default device detected as: {current}")
-                    self.current_default_cache = current
-            else:
-                self.status_label.configure(text="● ENGINE ACTIVE  •  DEFAULT: —")
-            self._update_autostart_label()
+            self.io.submit(lambda: (get_current_default_device(STATUS_MAX_AGE_MS), is_startup_enabled()),
+                           callback=self._render_status, key="status")
             self._update_live_reports()
+            self._render_metrics()
         except Exception as e:
             logger.debug(f"Status update cycle error: {e}")
         finally:
-            self.after(2000, self._periodic_status_update)
+            self.after(STATUS_POLL_INTERVAL_MS, self._periodic_status_update)
+    def _render_status(self, result):
+        current, autostart = result
+        self._set_autostart_label(autostart)
+        if self._export_job is not None or self._starting:
+            return  # The status bar is showing export or startup progress
+        if current:
+            self.status_label.configure(text=f"● ENGINE ACTIVE  •  DEFAULT: {current}")
+            if self.current_default_cache != current:
+                logger.info(f"System default device detected as: {current}")
+                self.current_default_cache = current
+        else:
+            self.status_label.configure(text="● ENGINE ACTIVE  •  DEFAULT: —")
+    def _render_metrics(self):
+        """Per-operation calls, failures and latency (in-memory counters, no I/O)."""
+        operations = metrics.snapshot()["operations"]
+        if not operations:
+            return
+        rows = []
+        for op, stats in operations.items():
+            codes = ", ".join(f"{code}×{n}" for code, n in stats["exit_codes"].items() if code != "0")
+            rows.append(f"{op:<22} calls {stats['calls']:>5}  failed {stats['errors']:>3}  "
+                        f"p50 ≤{stats['p50_ms']:>5} ms  p95 ≤{stats['p95_ms']:>5} ms  max {stats['max_ms']:>8.1f} ms"
+                        + (f"  exit {codes}" if codes else ""))
+        text = "\n".join(rows)
+        if text == self._metrics_text:
+            return
+        self._metrics_text = text
+        self.metrics_textbox.configure(state="normal")
+        self.metrics_textbox.delete("1.0", "end")
+        self.metrics_textbox.insert("1.0", text)
+        self.metrics_textbox.configure(state="disabled")
+    def _export_metrics(self):
+        path = filedialog.asksaveasfilename(defaultextension=".prom", initialfile="pebx_metrics.prom", title="Export Routing Metrics", filetypes=[("OpenMetrics Text", "*.prom"), ("JSON", "*.json")])
+        if not path: return
+        self.io.submit(metrics.export, path,
+                       callback=lambda p: logger.info(f"Routing metrics exported to {p}"),
+                       errback=lambda e: messagebox.showerror("Error", f"Failed to export metrics: {e}"))
     def _update_autostart_label(self):
-        if is_startup_enabled():
+        self.io.submit(is_startup_enabled, callback=self._set_autostart_label, key="autostart")
+    def _set_autostart_label(self, enabled):
+        if enabled:
             self.autostart_toggle.configure(text="Auto-Start: ON")
         else:
             self.autostart_toggle.configure(text="Auto-Start: OFF")
+    def _drain_io(self):
+        try:
+            self.io.drain()
+        finally:
+            self.after(IO_DRAIN_INTERVAL_MS, self._drain_io)
     def _pulse_animation(self, cycles=3, interval=120):
         if self._pulse_running: return
         self._pulse_running = True
@@ -353,26 +538,55 @@ class PebXGUI(ctk.CTk):
         self.save_state()
         self._pulse_animation()
     def _mute_and_pulse(self):
-        toggle_mute()
+        self.io.submit(toggle_mute)
         self.save_state()
         self._pulse_animation()
     def _toggle_autostart(self):
-        current = is_startup_enabled()
-        if enable_startup(not current):
-            self._update_autostart_label()
-        self.save_state()
+        def toggle():
+            return enable_startup(not is_startup_enabled())
+        def done(changed):
+            if changed:
+                self._update_autostart_label()
+            self.save_state()
+        self.io.submit(toggle, callback=done, key="autostart-toggle")
+    def _open_windows_mixer(self):
+        self.io.submit(open_windows_audio_settings)
+
+    def refresh_all(self, then=None):
+        """Rescans devices, apps and profiles in the background, then repaints the UI.
 
-    def refresh_all(self):
+        then (optional) runs on the GUI thread once the dropdowns are populated.
+        """
         logger.info("Manual refresh triggered by user.")
-        self.refresh_devices()
-        self.refresh_apps()
-        self.refresh_profiles()
-        self._update_autostart_label()
-        self._update_live_reports()
-        self.save_state()
+        def scan():
+            # One fresh SoundVolumeView pass feeds both device and app lists
+            snapshot = get_snapshot(max_age_ms=0)
+            return dict(snapshot.devices), dict(snapshot.sessions), get_custom_profiles(), is_startup_enabled()
+        def done(result):
+            devices, apps, customs, autostart = result
+            self.refresh_devices(devices)
+            self.refresh_apps(apps)
+            self._populate_profiles(customs)
+            self._set_autostart_label(autostart)
+            self._update_live_reports()
+            self.save_state()
+            if then:
+                then()
+        self.io.submit(scan, callback=done, key="refresh")
+
+    def _on_devices_changed(self):
+        events, self._device_events = self._device_events, 0
+        logger.info(f"[METABOLISM] Re-syncing devices after {events} hardware event(s).")
+        # Devices only: session changes reach the app lists through the session listener
+        self.io.submit(lambda: dict(get_snapshot(max_age_ms=0).devices),
+                       callback=self.refresh_devices, key="devices")
 
-    def refresh_devices(self):
-        self.devices = scan_output_devices()
+    def refresh_devices(self, devices):
+        unchanged = self._devices_rendered and self.devices == devices
+        self.devices = devices
+        self._devices_rendered = True
+        if unchanged:
+            return
         if self.devices:
             names = list(self.devices.keys())
             self.global_device_dropdown.configure(values=names)
@@ -386,8 +600,17 @@ class PebXGUI(ctk.CTk):
             self.app_device_dropdown.configure(values=["No Devices"])
             self.profile_device_dropdown.configure(values=["No Devices"])
 
-    def refresh_apps(self):
-        self.apps = scan_audio_apps()
+    def _on_session_delta(self, delta, snapshot):
+        # Runs on the scanning thread: hand the new session list to the GUI thread
+        if delta.membership_changed:
+            self.io.post(self.refresh_apps, dict(snapshot.sessions))
+
+    def refresh_apps(self, apps):
+        unchanged = self._apps_rendered and self.apps.keys() == apps.keys()
+        self.apps = apps
+        self._apps_rendered = True
+        if unchanged:
+            return  # Same sessions: leave the dropdowns (and the user's selection) alone
         if self.apps:
             # Step 2: Labels now contain PIDs for surgical selection
             labels = list(self.apps.keys())
@@ -404,7 +627,9 @@ class PebXGUI(ctk.CTk):
     def apply_global_device(self):
         selected = self.global_device_dropdown.get()
         if selected in self.devices:
-            set_default_device(self.devices[selected])
+            device_id = self.devices[selected]
+            get_controller().set_default(device_id)
+            self.io.submit(set_default_device, device_id)
 
     # ---------- SURGICAL PER APP ROUTING (STEP 2) ----------
     def apply_app_routing(self):
@@ -413,7 +638,8 @@ class PebXGUI(ctk.CTk):
         if app_label in self.apps and device_name in self.devices:
             exe_name, pid = self.apps[app_label]
             device_id = self.devices[device_name]
-            
-            # Use PID-based routing for exact precision
-            set_app_device_by_pid(device_id, pid)
-            self.saved_app_routes[app_label] = device_name
\ No newline at end of file
+
+            # Surgical: only this instance moves, so Brave/Chrome windows can differ. The
+            # app's later sessions follow it; state.json keeps the pins and that follow rule
+            self.io.submit(get_controller().route_session, pid, exe_name, device_id,
+                           callback=lambda _: self.save_state())
\ No newline at end of file
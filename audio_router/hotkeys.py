@@ -1,15 +1,27 @@
 import keyboard
-from profiles import apply_profile
-from router import set_app_device  
+from reconcile import get_controller
+from foreground import get_foreground_process
+from dispatch import get_dispatcher
+from config import logger
+
+def _run_profile(profile_name, cancel=None):
+    # The focused app's routes are started first so the user hears the switch immediately;
+    # a newer hotkey press cancels whatever of this switch has not started yet
+    return get_controller().apply_profile(profile_name, priority_app=get_foreground_process(), cancel=cancel)
+
+def _apply(profile_name):
+    """Runs inside the keyboard hook: queue the switch and return straight away."""
+    logger.info(f"[HOTKEY] Profile '{profile_name}' requested.")
+    get_dispatcher().submit("profile", _run_profile, profile_name, label=profile_name)
 
 def register_hotkeys():
     """Registers global shortcuts to trigger full profile matrices."""
     
     # Trigger all apps assigned to "Gaming"
-    keyboard.add_hotkey("ctrl+alt+1", lambda: apply_profile("Gaming", set_app_device))
+    keyboard.add_hotkey("ctrl+alt+1", lambda: _apply("Gaming"))
     
     # Trigger all apps assigned to "Work"
-    keyboard.add_hotkey("ctrl+alt+2", lambda: apply_profile("Work", set_app_device))
+    keyboard.add_hotkey("ctrl+alt+2", lambda: _apply("Work"))
     
     # Trigger all apps assigned to "Meeting"
-    keyboard.add_hotkey("ctrl+alt+3", lambda: apply_profile("Meeting", set_app_device))
\ No newline at end of file
+    keyboard.add_hotkey("ctrl+alt+3", lambda: _apply("Meeting"))
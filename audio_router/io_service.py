@@ -0,0 +1,75 @@
+# io_service.py
+import queue
+import threading
+from config import IO_WORKERS, logger
+
+class IOService:
+    """Runs blocking router/profile/file work off the Tk thread.
+
+    Jobs execute on a few daemon workers; their results land on a queue that
+    the GUI drains from its own thread (via after()), so completion callbacks
+    may touch widgets safely.
+    """
+
+    def __init__(self, workers=IO_WORKERS):
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._pending_keys = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(max(1, int(workers))):
+            t = threading.Thread(target=self._worker, name=f"pebx-io-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, func, *args, callback=None, errback=None, key=None):
+        """Queues func(*args). Returns False if a job with the same key is still in flight.
+
+        Keys let periodic work (status polling, log refresh) skip a cycle instead
+        of piling up behind a slow SoundVolumeView call.
+        """
+        if key is not None:
+            with self._lock:
+                if key in self._pending_keys:
+                    return False
+                self._pending_keys.add(key)
+        self._jobs.put((func, args, callback, errback, key))
+        return True
+
+    def post(self, callback, result=None):
+        """Hands a result produced on any thread to the GUI thread's next drain."""
+        self._results.put((callback, None, None, result, None))
+
+    def busy(self, key):
+        with self._lock:
+            return key in self._pending_keys
+
+    def _worker(self):
+        while True:
+            func, args, callback, errback, key = self._jobs.get()
+            try:
+                result, error = func(*args), None
+            except Exception as e:
+                result, error = None, e
+            self._results.put((callback, errback, key, result, error))
+
+    def drain(self, max_items=50):
+        """Delivers finished jobs to their callbacks. Call from the GUI thread only."""
+        for _ in range(max_items):
+            try:
+                callback, errback, key, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if key is not None:
+                with self._lock:
+                    self._pending_keys.discard(key)
+            try:
+                if error is not None:
+                    if errback:
+                        errback(error)
+                    else:
+                        logger.error(f"Background task failed: {error}")
+                elif callback:
+                    callback(result)
+            except Exception as e:
+                logger.debug(f"Background callback error: {e}")
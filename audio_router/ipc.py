@@ -0,0 +1,168 @@
+# ipc.py
+# Single-instance ownership and command forwarding. The first PebX process
+# owns a local endpoint (a named pipe on Windows, a Unix socket elsewhere);
+# later launches and CLI calls send it JSON commands and exit.
+import ctypes
+import getpass
+import json
+import os
+import secrets
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from config import USER_DATA_DIR, IPC_TIMEOUT_MS, ensure_user_data_dir, logger
+
+KEY_FILE = os.path.join(USER_DATA_DIR, "ipc.key")
+_MUTEX_NAME = "Local\\PebXSignalMatrixInstance"
+_ERROR_ALREADY_EXISTS = 183
+
+class NoInstance(Exception):
+    """No running PebX instance is listening."""
+
+class RemoteError(Exception):
+    """The running instance rejected or failed the command."""
+
+def endpoint():
+    """(address, family) of this user's command endpoint."""
+    if os.name == "nt":
+        user = "".join(c for c in getpass.getuser() if c.isalnum()) or "user"
+        return rf"\\.\pipe\PebX-Signal-Matrix-{user}", "AF_PIPE"
+    return os.path.join(USER_DATA_DIR, "ipc.sock"), "AF_UNIX"
+
+def _authkey():
+    """Per-user shared secret: only processes that can read USER_DATA_DIR may connect."""
+    ensure_user_data_dir()
+    try:
+        with open(KEY_FILE, "xb") as f:
+            f.write(secrets.token_bytes(32))
+        try:
+            ctypes.windll.kernel32.SetFileAttributesW(KEY_FILE, 0x02)
+        except Exception:
+            pass
+    except FileExistsError:
+        pass
+    with open(KEY_FILE, "rb") as f:
+        return f.read()
+
+# -------------------- CLIENT --------------------
+
+def send_command(command, args=None, timeout_ms=IPC_TIMEOUT_MS):
+    """Runs command in the running instance and returns its result.
+
+    Raises NoInstance when nobody is listening and RemoteError when the
+    instance reports a failure. Messages are JSON, never pickles.
+    """
+    address, family = endpoint()
+    if family == "AF_UNIX" and not os.path.exists(address):
+        raise NoInstance()
+    try:
+        conn = Client(address, family=family, authkey=_authkey())
+    except (OSError, EOFError, AuthenticationError) as e:
+        raise NoInstance() from e
+    with conn:
+        conn.send_bytes(json.dumps({"command": command, "args": args or {}}).encode("utf-8"))
+        if not conn.poll(timeout_ms / 1000.0):
+            raise RemoteError(f"'{command}' timed out after {timeout_ms} ms")
+        reply = json.loads(conn.recv_bytes().decode("utf-8"))
+    if not reply.get("ok"):
+        raise RemoteError(reply.get("error") or "command failed")
+    return reply.get("result")
+
+# -------------------- SERVER --------------------
+
+class CommandServer:
+    """Owns the endpoint and runs handlers[command](**args) for each connection."""
+
+    def __init__(self, handlers, listener, mutex=None):
+        self.handlers = handlers
+        self._listener = listener
+        self._mutex = mutex
+        self._thread = threading.Thread(target=self._accept_loop, name="pebx-ipc", daemon=True)
+        self._thread.start()
+
+    def register(self, command, handler):
+        """Adds a handler once the object it drives exists (e.g. the window for "show")."""
+        self.handlers[command] = handler
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                return  # closed
+            except Exception as e:
+                logger.debug(f"IPC handshake rejected: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), name="pebx-ipc-conn", daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                request = json.loads(conn.recv_bytes().decode("utf-8"))
+                command = request.get("command")
+                handler = self.handlers.get(command)
+                if handler is None:
+                    reply = {"ok": False, "error": f"unknown command '{command}'"}
+                else:
+                    logger.info(f"[IPC] Forwarded command: {command}")
+                    reply = {"ok": True, "result": handler(**request.get("args", {}))}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            try:
+                conn.send_bytes(json.dumps(reply).encode("utf-8"))
+            except Exception as e:
+                logger.debug(f"IPC reply failed: {e}")
+
+    def close(self):
+        try:
+            self._listener.close()
+        except Exception:
+            pass
+        address, family = endpoint()
+        if family == "AF_UNIX":
+            try:
+                os.remove(address)
+            except OSError:
+                pass
+
+def _claim_windows_mutex():
+    """Named mutex: the reliable "am I first?" test (pipe names can be opened twice)."""
+    try:
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    except (AttributeError, OSError):
+        return True, None
+    kernel32.CreateMutexW.restype = ctypes.c_void_p
+    handle = kernel32.CreateMutexW(None, False, _MUTEX_NAME)
+    if ctypes.get_last_error() == _ERROR_ALREADY_EXISTS:
+        kernel32.CloseHandle(ctypes.c_void_p(handle))
+        return False, None
+    return True, handle  # Held for the life of the process
+
+def serve(handlers):
+    """Becomes the instance owner. Returns a CommandServer, or None if another instance owns it."""
+    address, family = endpoint()
+    mutex = None
+    if family == "AF_PIPE":
+        first, mutex = _claim_windows_mutex()
+        if not first:
+            return None
+    elif os.path.exists(address):
+        try:
+            send_command("ping", timeout_ms=1000)
+            return None  # Someone is alive on the socket
+        except RemoteError:
+            return None  # Alive but busy (slow handshake, timeout): still the owner
+        except NoInstance:
+            try:
+                os.remove(address)  # Nobody accepted: stale socket from a crashed instance
+            except OSError:
+                pass
+    try:
+        listener = Listener(address, family=family, authkey=_authkey())
+    except OSError as e:
+        logger.warning(f"Could not open the command endpoint: {e}")
+        return None
+    handlers = dict(handlers)
+    handlers.setdefault("ping", lambda: os.getpid())
+    logger.info(f"[IPC] Listening for commands on {address}")
+    return CommandServer(handlers, listener, mutex)
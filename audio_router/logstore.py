@@ -0,0 +1,273 @@
+# logstore.py
+# Segmented activity log. Kept free of config imports: config builds the
+# logging pipeline on top of it.
+import base64
+import ctypes
+import logging
+import os
+import threading
+import time
+import zlib
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+
+def _hide(path):
+    try:
+        ctypes.windll.kernel32.SetFileAttributesW(path, 0x02)
+    except Exception:
+        pass
+
+def encode_block(entries):
+    """entries: [(created, levelno, text)] -> one obfuscated line (zlib + Base64)."""
+    payload = "\n".join(f"{created:.3f}\t{levelno}\t{text.replace(chr(10), chr(11))}"
+                        for created, levelno, text in entries)
+    return base64.b64encode(zlib.compress(payload.encode("utf-8"), 6)) + b"\n"
+
+def decode_block(line):
+    payload = zlib.decompress(base64.b64decode(line.strip())).decode("utf-8")
+    entries = []
+    for raw in payload.split("\n"):
+        created, levelno, text = raw.split("\t", 2)
+        # Multi-line messages (tracebacks) are stored with \v in place of \n
+        entries.append((float(created), int(levelno), text.replace(chr(11), "\n")))
+    return entries
+
+class BlockIndexEntry:
+    __slots__ = ("first", "last", "offset", "length", "count")
+
+    def __init__(self, first, last, offset, length, count):
+        self.first = first
+        self.last = last
+        self.offset = offset
+        self.length = length
+        self.count = count
+
+def read_index(index_path):
+    entries = []
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 5:
+                    entries.append(BlockIndexEntry(float(parts[0]), float(parts[1]),
+                                                   int(parts[2]), int(parts[3]), int(parts[4])))
+    except OSError:
+        pass
+    return entries
+
+class LogStore:
+    """Reads segments through their indexes: recent events and time ranges are seeks, not scans."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def segments(self):
+        """Segment paths, oldest first (names embed a sortable timestamp)."""
+        try:
+            names = sorted(n for n in os.listdir(self.directory) if n.endswith(SEGMENT_SUFFIX))
+        except OSError:
+            return []
+        return [os.path.join(self.directory, n) for n in names]
+
+    def _blocks(self, segment, start=None, end=None):
+        index = read_index(segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)
+        return [b for b in index
+                if (start is None or b.last >= start) and (end is None or b.first <= end)]
+
+    def _read_block(self, handle, block):
+        handle.seek(block.offset)
+        try:
+            return decode_block(handle.read(block.length))
+        except Exception:
+            return [(block.first, logging.ERROR, "[CORRUPTED BLOCK]")]
+
+    def count_blocks(self, start=None, end=None):
+        """How many blocks overlap [start, end] (cheap: indexes only)."""
+        return sum(len(self._blocks(segment, start, end)) for segment in self.segments())
+
+    def iter_blocks(self, start=None, end=None):
+        """Yields each overlapping block's decoded [(created, levelno, text)], oldest first."""
+        for segment in self.segments():
+            blocks = self._blocks(segment, start, end)
+            if not blocks:
+                continue
+            try:
+                with open(segment, "rb") as f:
+                    for block in blocks:
+                        yield self._read_block(f, block)
+            except OSError:
+                continue
+
+    def iter_records(self, start=None, end=None, min_level=0):
+        """Yields (created, levelno, text) oldest first, touching only blocks in range."""
+        for entries in self.iter_blocks(start, end):
+            for created, levelno, text in entries:
+                if levelno < min_level:
+                    continue
+                if (start is not None and created < start) or (end is not None and created > end):
+                    continue
+                yield created, levelno, text
+
+    def read_last(self, count, min_level=0):
+        """The newest count records, oldest first, reading backwards block by block."""
+        collected = []
+        for segment in reversed(self.segments()):
+            blocks = self._blocks(segment)
+            try:
+                with open(segment, "rb") as f:
+                    for block in reversed(blocks):
+                        entries = [e for e in self._read_block(f, block) if e[1] >= min_level]
+                        collected = entries + collected
+                        if len(collected) >= count:
+                            return collected[-count:]
+            except OSError:
+                continue
+        return collected[-count:] if count else []
+
+    def total_bytes(self):
+        total = 0
+        for segment in self.segments():
+            for path in (segment, segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX):
+                try:
+                    total += os.path.getsize(path)
+                except OSError:
+                    pass
+        return total
+
+class SegmentedLogHandler(logging.Handler):
+    """Writes each batch as one compressed block into size/time-bounded segments.
+
+    Every block gets an index line (first/last timestamp, byte offset, length,
+    record count); old segments are pruned by count, total size and age.
+    """
+
+    def __init__(self, directory, segment_bytes, segment_seconds, max_segments,
+                 max_total_bytes, retention_days):
+        super().__init__()
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.max_total_bytes = max_total_bytes
+        self.retention_days = retention_days
+        self.store = LogStore(directory)
+        os.makedirs(directory, exist_ok=True)
+        self._segment = None
+        self._index = None
+        self._opened_at = 0.0
+        self._size = 0
+        self._write_lock = threading.Lock()
+        self._resume_latest()
+
+    def _resume_latest(self):
+        segments = self.store.segments()
+        if not segments:
+            return
+        latest = segments[-1]
+        try:
+            size = os.path.getsize(latest)
+        except OSError:
+            return
+        if size < self.segment_bytes:
+            self._open(latest, opened_at=os.path.getmtime(latest))
+
+    def _open(self, path, opened_at=None):
+        self._segment = open(path, "ab")
+        self._index = open(path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, "a", encoding="utf-8")
+        self._size = self._segment.tell()
+        self._opened_at = opened_at or time.time()
+        _hide(path)
+        _hide(self._index.name)
+
+    def _close(self):
+        for handle in (self._segment, self._index):
+            if handle is not None:
+                try:
+                    handle.close()
+                except OSError:
+                    pass
+        self._segment = self._index = None
+
+    def _rotate_if_needed(self):
+        if self._segment is not None and self._size < self.segment_bytes \
+                and time.time() - self._opened_at < self.segment_seconds:
+            return
+        self._close()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        n = 0
+        while True:
+            path = os.path.join(self.directory, f"activity-{stamp}-{n:03d}{SEGMENT_SUFFIX}")
+            if not os.path.exists(path):
+                break
+            n += 1
+        self._open(path)
+        self._prune()
+
+    def _prune(self):
+        segments = self.store.segments()
+        cutoff = time.time() - self.retention_days * 86400
+        sizes = {}
+        for seg in segments:
+            try:
+                sizes[seg] = os.path.getsize(seg) + os.path.getsize(seg[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)
+            except OSError:
+                sizes[seg] = 0
+        total = sum(sizes.values())
+        active = self._segment.name if self._segment else None
+        for seg in segments:
+            if seg == active:
+                break
+            too_many = len(segments) > self.max_segments
+            too_big = total > self.max_total_bytes
+            try:
+                too_old = os.path.getmtime(seg) < cutoff
+            except OSError:
+                too_old = True
+            if not (too_many or too_big or too_old):
+                break
+            for path in (seg, seg[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= sizes[seg]
+            segments = segments[1:]
+
+    def _entries(self, records):
+        entries = []
+        for record in records:
+            if not self.filter(record):
+                continue
+            try:
+                entries.append((record.created, record.levelno, self.format(record)))
+            except Exception:
+                self.handleError(record)
+        return entries
+
+    def emit(self, record):
+        self.emit_batch([record])
+
+    def emit_batch(self, records):
+        entries = self._entries(records)
+        if not entries:
+            return
+        block = encode_block(entries)
+        with self._write_lock:
+            try:
+                self._rotate_if_needed()
+                offset = self._size
+                self._segment.write(block)
+                self._segment.flush()
+                self._size += len(block)
+                first = min(e[0] for e in entries)
+                last = max(e[0] for e in entries)
+                self._index.write(f"{first:.3f} {last:.3f} {offset} {len(block)} {len(entries)}\n")
+                self._index.flush()
+            except Exception:
+                self.handleError(records[-1])
+
+    def close(self):
+        with self._write_lock:
+            self._close()
+        super().close()
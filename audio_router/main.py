@@ -1,48 +1,109 @@
 import sys
 import threading
-import keyboard
-import tkinter.messagebox as messagebox
-from gui import PebXGUI
-from tray import start_tray
-from hotkeys import register_hotkeys
-from config import check_dependencies, logger, APP_NAME
+from config import check_dependencies, setup_logging, logger, APP_NAME
 
 def run_hotkey_listener():
     """Essential background thread for shortcut detection."""
     try:
+        import keyboard
+        from hotkeys import register_hotkeys
         register_hotkeys()
         # Keeps the thread alive to continuously track key presses
         keyboard.wait()
     except Exception as e:
         logger.error(f"Hotkey tracking failed: {e}")
 
-if __name__ == "__main__":
+def _show_window(app):
+    """IPC "show" handler: runs on the connection thread, so it only posts to Tk."""
+    def show():
+        app.deiconify()
+        app.lift()
+        app.focus_force()
+    app.after(0, show)
+    return {"shown": True}
+
+def run_gui():
+    setup_logging()
+    import ipc
+    # A second launch brings the running window forward instead of starting another copy
+    try:
+        ipc.send_command("show")
+        logger.info(f"{APP_NAME} is already running; brought the existing window forward.")
+        return
+    except ipc.NoInstance:
+        pass
+    except ipc.RemoteError as e:
+        logger.warning(f"Running instance did not answer 'show': {e}")
+        return
+
+    # GUI-only dependencies (customtkinter, pystray/PIL, pywin32) load here, not at import
+    import tkinter.messagebox as messagebox
+    from gui import PebXGUI
+    from tray import start_tray
+    from reconcile import get_controller
+    from metrics import start_export as start_metrics_export
+    from sync import get_client as get_sync_client
+    from recorder import start_from_config as start_trace
+
     logger.info(f"Initializing {APP_NAME}...")
-    
+
     # Essential Dependency Validation
     if not check_dependencies():
         messagebox.showerror(
-            "Critical Error", 
+            "Critical Error",
             f"SoundVolumeView.exe is missing from the application folder.\n\nThis is essential for {APP_NAME} to perfectly route audio. Please place it in the root directory."
         )
         sys.exit(1)
-        
+
+    # Own the command endpoint before building the window: PebXGUI starts restoring and
+    # reconciling routes right away, so a launch that loses the race must not get that far
+    from cli import OPERATIONS
+    server = ipc.serve(OPERATIONS)
+    if server is None:
+        logger.info(f"Another {APP_NAME} instance started first; exiting.")
+        return
+
+    start_trace()  # before the first scan, so the trace opens with the starting state
+
     try:
         app = PebXGUI()
         app.title(f"{APP_NAME} — Signal Control")
-        
+        # Later launches are forwarded here and just bring this window forward
+        server.register("show", lambda: _show_window(app))
+
         # --- LEVEL 3: STEP 1 (METABOLISM START) ---
         # This activates the hardware listener so it can auto-refresh
         app.start_device_watchdog()
-        
+
+        # Re-check desired routes periodically so apps that reset their output get corrected
+        get_controller().start()
+
+        # Keep metrics.prom current for fleet monitoring to scrape
+        start_metrics_export()
+
+        # Pull fleet profiles/rules in the background; the profile list refreshes when they land
+        sync_client = get_sync_client()
+        if sync_client is not None:
+            sync_client.add_listener(lambda changed: app.io.post(lambda _: app.refresh_profiles()))
+            sync_client.start()
+
         # Start the hotkey tracker in a daemon thread so it closes with the app
         hk_thread = threading.Thread(target=run_hotkey_listener, daemon=True)
         hk_thread.start()
-        
+
         # Start system tray tracking
         start_tray(app)
-        
+
         logger.info(f"{APP_NAME} UI and Tray started successfully. Live tracking active.")
         app.mainloop()
     except Exception as e:
-        logger.critical(f"Fatal application crash: {e}")
\ No newline at end of file
+        logger.critical(f"Fatal application crash: {e}")
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # "main.py apply Gaming", "main.py scan --json", "main.py daemon": no GUI imports at all
+        from cli import main
+        sys.exit(main())
+    run_gui()
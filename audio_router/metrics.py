@@ -0,0 +1,169 @@
+# metrics.py
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import METRICS_FILE, METRICS_EXPORT_INTERVAL_MS, logger
+from storage import atomic_write_text
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class Histogram:
+    """Fixed-bucket latency histogram: constant memory however many calls are observed."""
+
+    __slots__ = ("buckets", "count", "sum", "min", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, ms):
+        i = 0
+        while i < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        self.sum += ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (max for the +Inf bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max
+        return self.max
+
+class Metrics:
+    """Process-wide counters and latency histograms per operation.
+
+    Operations are short names: scan, set_default, set_app_default, mute,
+    brain_focus_to_route. Exit codes are counted per operation so failing
+    SoundVolumeView calls show up even when nobody reads the log.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._latency = {}     # op -> Histogram
+        self._errors = {}      # op -> failed calls
+        self._exit_codes = {}  # (op, exit code) -> calls
+
+    def observe(self, op, elapsed_ms, ok=True, exit_code=None):
+        with self._lock:
+            hist = self._latency.get(op)
+            if hist is None:
+                hist = self._latency[op] = Histogram()
+            hist.observe(elapsed_ms)
+            if not ok:
+                self._errors[op] = self._errors.get(op, 0) + 1
+            if exit_code is not None:
+                key = (op, exit_code)
+                self._exit_codes[key] = self._exit_codes.get(key, 0) + 1
+
+    @contextmanager
+    def span(self, op):
+        """Times the with-block as one call of op; an exception counts as a failure."""
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.observe(op, (time.perf_counter() - start) * 1000.0, ok)
+
+    def snapshot(self):
+        """Plain-dict view: {"uptime_s", "operations": {op: stats}}."""
+        with self._lock:
+            operations = {}
+            for op, hist in sorted(self._latency.items()):
+                operations[op] = {
+                    "calls": hist.count,
+                    "errors": self._errors.get(op, 0),
+                    "mean_ms": round(hist.sum / hist.count, 3) if hist.count else None,
+                    "p50_ms": hist.quantile(0.5),
+                    "p95_ms": hist.quantile(0.95),
+                    "min_ms": round(hist.min, 3) if hist.min is not None else None,
+                    "max_ms": round(hist.max, 3) if hist.max is not None else None,
+                    "buckets_ms": dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ["+Inf"], hist.buckets)),
+                    "exit_codes": {str(code): n for (o, code), n in self._exit_codes.items() if o == op},
+                }
+        return {"uptime_s": round(time.time() - self.started, 1), "operations": operations}
+
+    def to_openmetrics(self):
+        """OpenMetrics text exposition (durations in seconds, as the format expects)."""
+        with self._lock:
+            latency = {op: (list(h.buckets), h.sum, h.count) for op, h in sorted(self._latency.items())}
+            errors = dict(self._errors)
+            exit_codes = dict(self._exit_codes)
+        lines = ["# TYPE pebx_operation_duration_seconds histogram",
+                 "# UNIT pebx_operation_duration_seconds seconds",
+                 "# HELP pebx_operation_duration_seconds Latency of audio backend operations."]
+        for op, (buckets, total, count) in latency.items():
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS_MS, buckets):
+                cumulative += n
+                lines.append(f'pebx_operation_duration_seconds_bucket{{op="{op}",le="{bound / 1000.0:g}"}} {cumulative}')
+            lines.append(f'pebx_operation_duration_seconds_bucket{{op="{op}",le="+Inf"}} {count}')
+            lines.append(f'pebx_operation_duration_seconds_sum{{op="{op}"}} {total / 1000.0:.6f}')
+            lines.append(f'pebx_operation_duration_seconds_count{{op="{op}"}} {count}')
+        lines += ["# TYPE pebx_operation_errors counter",
+                  "# HELP pebx_operation_errors Failed audio backend operations."]
+        for op in latency:
+            lines.append(f'pebx_operation_errors_total{{op="{op}"}} {errors.get(op, 0)}')
+        lines += ["# TYPE pebx_exit_codes counter",
+                  "# HELP pebx_exit_codes Backend command exit codes."]
+        for (op, code), n in sorted(exit_codes.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            lines.append(f'pebx_exit_codes_total{{op="{op}",code="{code}"}} {n}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path=METRICS_FILE):
+        """Writes JSON for a .json path, OpenMetrics text otherwise (atomic, never hidden)."""
+        if os.path.splitext(path)[1].lower() == ".json":
+            text = json.dumps(self.snapshot(), indent=2)
+        else:
+            text = self.to_openmetrics()
+        atomic_write_text(path, text, hidden=False)
+        return path
+
+metrics = Metrics()
+
+# -------------------- PERIODIC EXPORT --------------------
+
+_export_thread = None
+
+def start_export(path=METRICS_FILE, interval_ms=METRICS_EXPORT_INTERVAL_MS):
+    """Rewrites path every interval_ms for fleet monitoring to scrape (0 disables)."""
+    global _export_thread
+    if interval_ms <= 0 or _export_thread is not None:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval_ms / 1000.0)
+            try:
+                metrics.export(path)
+            except Exception as e:
+                logger.debug(f"Metrics export error: {e}")
+
+    def final():
+        try:
+            metrics.export(path)
+        except Exception:
+            pass
+
+    _export_thread = threading.Thread(target=loop, name="pebx-metrics", daemon=True)
+    _export_thread.start()
+    atexit.register(final)
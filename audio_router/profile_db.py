@@ -0,0 +1,298 @@
+# profile_db.py
+# Optional SQLite profile store (PEBX_PROFILE_STORE=sqlite). Same surface as
+# profiles.ProfileStore, but lookups and single-entry edits are indexed row
+# operations instead of a whole-file parse and rewrite, and it adds device
+# aliases and a route-change history. profiles.json stays the interchange
+# format: it is imported on first open and export_profiles() writes it back.
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import PROFILES_DB_FILE, PROFILES_FILE, ROUTE_HISTORY_MAX_ROWS, logger
+from storage import Debouncer
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profile_apps (
+    profile_id INTEGER NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    exe TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (profile_id, exe)
+);
+CREATE INDEX IF NOT EXISTS profile_apps_by_exe ON profile_apps (exe COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS app_rules (
+    exe TEXT PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS app_rules_by_exe ON app_rules (exe COLLATE NOCASE, position);
+CREATE TABLE IF NOT EXISTS device_aliases (
+    alias TEXT PRIMARY KEY COLLATE NOCASE,
+    device_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS device_aliases_by_device ON device_aliases (device_id);
+CREATE TABLE IF NOT EXISTS route_history (
+    id INTEGER PRIMARY KEY,
+    at REAL NOT NULL,
+    target TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    ok INTEGER NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS route_history_by_target ON route_history (target COLLATE NOCASE, at);
+"""
+
+class SQLiteProfileStore:
+    """profiles.db: grouped profiles, Brain exe -> device rules, aliases and history.
+
+    Grouped profiles (profile_apps rows) and top-level Brain mappings
+    (app_rules rows) live in separate tables, so telling them apart no longer
+    relies on an ".exe" suffix. A shared position column keeps the JSON key
+    order across both for export. One connection is shared under a lock.
+    """
+
+    def __init__(self, path=PROFILES_DB_FILE, json_path=PROFILES_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('schema', ?)", (str(SCHEMA_VERSION),))
+        self.version = 0
+        self._data_version = None
+        self._history = []  # (at, target, device_id, ok, source) awaiting the writer
+        self._history_writer = Debouncer(1000, self._write_history, name="pebx-history-writer")
+        if json_path and self._meta("imported_from") is None:
+            self._import_legacy(json_path)
+
+    # ---------- Plumbing ----------
+    def _meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _transaction(self, func, *args):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(*args)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self.version += 1
+            return result
+
+    def _import_legacy(self, json_path):
+        """First open: adopt profiles.json so switching stores loses nothing."""
+        data = {}
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to import {json_path} into the profile database: {e}")
+            return
+        def run():
+            if isinstance(data, dict) and not self._count():
+                self._insert_all(data)
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('imported_from', ?)", (json_path,))
+        self._transaction(run)
+        if data:
+            logger.info(f"Imported {len(data)} profiles from {json_path} into {self.path}.")
+
+    def _count(self):
+        return (self._db.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+                + self._db.execute("SELECT COUNT(*) FROM app_rules").fetchone()[0])
+
+    def _next_position(self):
+        row = self._db.execute(
+            "SELECT MAX(p) FROM (SELECT MAX(position) AS p FROM profiles UNION ALL SELECT MAX(position) FROM app_rules)"
+        ).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def _position_of(self, name):
+        row = self._db.execute(
+            "SELECT position FROM profiles WHERE name = ? UNION ALL SELECT position FROM app_rules WHERE exe = ?",
+            (name, name)).fetchone()
+        return row[0] if row else None
+
+    def _remove(self, name):
+        removed = self._db.execute("DELETE FROM profiles WHERE name = ?", (name,)).rowcount
+        removed += self._db.execute("DELETE FROM app_rules WHERE exe = ?", (name,)).rowcount
+        return removed > 0
+
+    def _put(self, name, value, position=None):
+        if position is None:
+            position = self._position_of(name)
+        self._remove(name)
+        if position is None:
+            position = self._next_position()
+        if isinstance(value, dict):
+            profile_id = self._db.execute("INSERT INTO profiles (name, position) VALUES (?, ?)",
+                                          (name, position)).lastrowid
+            self._db.executemany("INSERT INTO profile_apps VALUES (?, ?, ?, ?)",
+                                 [(profile_id, exe, device_id, i) for i, (exe, device_id) in enumerate(value.items())])
+        else:
+            self._db.execute("INSERT INTO app_rules VALUES (?, ?, ?)", (name, str(value), position))
+
+    def _insert_all(self, profiles):
+        for position, (name, value) in enumerate(profiles.items()):
+            self._put(name, value, position)
+
+    def _apps(self, profile_id):
+        return dict(self._db.execute(
+            "SELECT exe, device_id FROM profile_apps WHERE profile_id = ? ORDER BY position", (profile_id,)))
+
+    # ---------- ProfileStore surface ----------
+    def snapshot(self):
+        """Every profile as the profiles.json dict, in its original key order."""
+        with self._lock:
+            entries = []
+            for profile_id, name, position in self._db.execute("SELECT id, name, position FROM profiles"):
+                entries.append((position, name, self._apps(profile_id)))
+            for exe, device_id, position in self._db.execute("SELECT exe, device_id, position FROM app_rules"):
+                entries.append((position, exe, device_id))
+            return {name: value for _, name, value in sorted(entries, key=lambda e: e[0])}
+
+    def get(self, name, default=None):
+        with self._lock:
+            row = self._db.execute("SELECT id FROM profiles WHERE name = ?", (name,)).fetchone()
+            if row:
+                return self._apps(row[0])
+            row = self._db.execute("SELECT device_id FROM app_rules WHERE exe = ?", (name,)).fetchone()
+            return row[0] if row else default
+
+    def current_version(self):
+        """Bumps on our own edits and on commits by other processes (PRAGMA data_version)."""
+        with self._lock:
+            data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                if self._data_version is not None:
+                    self.version += 1
+                self._data_version = data_version
+            return self.version
+
+    def keys(self):
+        with self._lock:
+            return [name for name, in self._db.execute(
+                "SELECT name FROM (SELECT name, position FROM profiles "
+                "UNION ALL SELECT exe, position FROM app_rules) ORDER BY position")]
+
+    def profile_names(self):
+        """Grouped profiles only (no Brain exe mappings)."""
+        with self._lock:
+            return [name for name, in self._db.execute("SELECT name FROM profiles ORDER BY position")]
+
+    def app_rule(self, exe):
+        """Brain mapping for exe (any case), or None."""
+        with self._lock:
+            row = self._db.execute("SELECT device_id FROM app_rules WHERE exe = ? COLLATE NOCASE "
+                                   "ORDER BY position LIMIT 1", (exe,)).fetchone()
+            return row[0] if row else None
+
+    def set_entry(self, name, value):
+        self._transaction(self._put, name, value)
+
+    def delete_entry(self, name):
+        return self._transaction(self._remove, name)
+
+    def set_app(self, profile_name, app_name, device_id):
+        def run():
+            row = self._db.execute("SELECT id FROM profiles WHERE name = ?", (profile_name,)).fetchone()
+            if row is None:
+                self._put(profile_name, {})
+                row = self._db.execute("SELECT id FROM profiles WHERE name = ?", (profile_name,)).fetchone()
+            self._db.execute(
+                "INSERT INTO profile_apps VALUES (?, ?, ?, "
+                "(SELECT COALESCE(MAX(position), -1) + 1 FROM profile_apps WHERE profile_id = ?)) "
+                "ON CONFLICT (profile_id, exe) DO UPDATE SET device_id = excluded.device_id",
+                (row[0], app_name, device_id, row[0]))
+        self._transaction(run)
+
+    def mutate(self, func):
+        """Applies func(profiles) to a copy and writes back only the entries it changed."""
+        with self._lock:
+            before = self.snapshot()
+            after = {k: dict(v) if isinstance(v, dict) else v for k, v in before.items()}
+            result = func(after)
+            def run():
+                for name in before.keys() - after.keys():
+                    self._remove(name)
+                for name, value in after.items():
+                    if before.get(name) != value:
+                        self._put(name, value)
+            self._transaction(run)
+            return result
+
+    def replace(self, profiles):
+        def run():
+            self._db.execute("DELETE FROM profiles")
+            self._db.execute("DELETE FROM app_rules")
+            self._insert_all(profiles)
+        self._transaction(run)
+
+    def flush(self):
+        self._history_writer.flush()
+
+    # ---------- Aliases ----------
+    def aliases(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT alias, device_id FROM device_aliases"))
+
+    def set_alias(self, alias, device_id):
+        self._transaction(lambda: self._db.execute(
+            "INSERT OR REPLACE INTO device_aliases VALUES (?, ?)", (alias, device_id)))
+        return True
+
+    def remove_alias(self, alias):
+        return self._transaction(lambda: self._db.execute(
+            "DELETE FROM device_aliases WHERE alias = ?", (alias,)).rowcount > 0)
+
+    # ---------- Route history ----------
+    def record_routes(self, routes, ok, source=None):
+        """Queues (device_id, target) pairs for the history table (written in the background)."""
+        now = time.time()
+        with self._lock:
+            self._history.extend((now, str(target), device_id, int(bool(ok)), source) for device_id, target in routes)
+        self._history_writer.trigger()
+
+    def _write_history(self):
+        with self._lock:
+            rows, self._history = self._history, []
+            if not rows:
+                return
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany(
+                    "INSERT INTO route_history (at, target, device_id, ok, source) VALUES (?, ?, ?, ?, ?)", rows)
+                self._db.execute("DELETE FROM route_history WHERE id <= (SELECT MAX(id) FROM route_history) - ?",
+                                 (ROUTE_HISTORY_MAX_ROWS,))
+                self._db.execute("COMMIT")
+            except sqlite3.Error as e:
+                self._db.execute("ROLLBACK")
+                logger.error(f"Failed to write route history: {e}")
+
+    def history(self, target=None, limit=100):
+        """Newest-first route changes, optionally for one exe/PID."""
+        self.flush()
+        query = "SELECT at, target, device_id, ok, source FROM route_history"
+        args = ()
+        if target is not None:
+            query += " WHERE target = ? COLLATE NOCASE"
+            args = (str(target),)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY at DESC, id DESC LIMIT ?", args + (limit,)).fetchall()
+        return [{"at": at, "target": t, "device_id": d, "ok": bool(ok), "source": s} for at, t, d, ok, s in rows]
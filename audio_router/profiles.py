@@ -1,46 +1,202 @@
 # profiles.py
 import json
-import os
-import ctypes
-from config import PROFILES_FILE, logger
+import atexit
+import threading
+from config import PROFILES_FILE, PROFILE_STORE, PROFILES_WRITE_DELAY_MS, logger
+from storage import Debouncer, atomic_write_json, file_stamp
 
 BASE_PROFILES = ["Gaming", "Work", "Meeting"]
 MAX_CUSTOM_PROFILES = 2
 
+# --- The Profile Store (In-Memory Matrix) ---
+
+def _copy_profiles(profiles):
+    return {k: dict(v) if isinstance(v, dict) else v for k, v in profiles.items()}
+
+class ProfileStore:
+    """Keeps profiles.json parsed in memory for every thread in the process.
+
+    Reads reload only when the file's mtime/size changes on disk. Writes go
+    through mutate() under one lock (no lost read-modify-write updates between
+    the GUI, hotkey and tray threads) and are persisted by a debounced atomic
+    temp-file-and-rename.
+    """
+
+    def __init__(self, path=PROFILES_FILE, write_delay_ms=PROFILES_WRITE_DELAY_MS):
+        self.path = path
+        self._lock = threading.RLock()
+        self._data = {}
+        self._stamp = False  # False = never loaded; None = file absent
+        self._dirty = False
+        self.version = 0     # bumps on every reload or edit (lets caches invalidate cheaply)
+        self._app_index = None  # (version, {exe lower: device id}) for app_rule()
+        self._writer = Debouncer(write_delay_ms, self._persist, name="pebx-profiles-writer")
+
+    def _refresh(self):
+        stamp = file_stamp(self.path)
+        if stamp == self._stamp or self._dirty:
+            return  # Unchanged on disk, or our pending edits are newer
+        self._stamp = stamp
+        self.version += 1
+        if stamp is None:
+            self._data = {}
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load profiles: {e}")
+            self._data = {}
+
+    def snapshot(self):
+        """A private copy of every profile, safe to modify."""
+        with self._lock:
+            self._refresh()
+            return _copy_profiles(self._data)
+
+    def get(self, name, default=None):
+        """Single-entry lookup without copying the whole store (Smart Brain hot path)."""
+        with self._lock:
+            self._refresh()
+            value = self._data.get(name, default)
+            return dict(value) if isinstance(value, dict) else value
+
+    def current_version(self):
+        with self._lock:
+            self._refresh()
+            return self.version
+
+    def keys(self):
+        with self._lock:
+            self._refresh()
+            return list(self._data.keys())
+
+    def profile_names(self):
+        """Grouped profiles only (no Brain exe mappings)."""
+        with self._lock:
+            self._refresh()
+            return [name for name, value in self._data.items() if isinstance(value, dict)]
+
+    def app_rule(self, exe):
+        """Brain mapping for exe (any case), or None."""
+        with self._lock:
+            self._refresh()
+            if self._app_index is None or self._app_index[0] != self.version:
+                index = {}
+                for name, value in self._data.items():
+                    if isinstance(value, str):
+                        index.setdefault(name.lower(), value)
+                self._app_index = (self.version, index)
+            return self._app_index[1].get(exe.lower())
+
+    def set_entry(self, name, value):
+        self.mutate(lambda data: data.__setitem__(name, value))
+
+    def delete_entry(self, name):
+        return self.mutate(lambda data: data.pop(name, None) is not None)
+
+    def set_app(self, profile_name, app_name, device_id):
+        def add(profiles):
+            if not isinstance(profiles.get(profile_name), dict):
+                profiles[profile_name] = {}
+            profiles[profile_name][app_name] = device_id
+        self.mutate(add)
+
+    # Device aliases and route history need the SQLite store
+    def aliases(self):
+        return {}
+
+    def set_alias(self, alias, device_id):
+        return False  # Not stored
+
+    def remove_alias(self, alias):
+        return False
+
+    def record_routes(self, routes, ok, source=None):
+        pass
+
+    def history(self, target=None, limit=100):
+        return []
+
+    def mutate(self, func):
+        """Applies func(profiles) atomically and schedules a write. Returns func's result."""
+        with self._lock:
+            self._refresh()
+            result = func(self._data)
+            self._dirty = True
+            self.version += 1
+        self._writer.trigger()
+        return result
+
+    def replace(self, profiles):
+        self.mutate(lambda data: (data.clear(), data.update(_copy_profiles(profiles))))
+
+    def flush(self):
+        """Writes pending edits now (called on exit)."""
+        self._writer.flush()
+
+    def _persist(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = _copy_profiles(self._data)
+            try:
+                atomic_write_json(self.path, data)
+                self._stamp = file_stamp(self.path)
+                self._dirty = False
+            except Exception as e:
+                logger.error(f"Failed to save profiles: {e}")
+
+def create_store(kind=PROFILE_STORE):
+    """The configured profile store, falling back to profiles.json if SQLite can't open."""
+    if (kind or "").lower() == "sqlite":
+        try:
+            from profile_db import SQLiteProfileStore
+            return SQLiteProfileStore()
+        except Exception as e:
+            logger.warning(f"SQLite profile store unavailable ({e}). Using profiles.json.")
+    return ProfileStore()
+
+store = create_store()
+atexit.register(store.flush)
+
 def load_profiles():
     """Tracks and loads saved routing states."""
-    if not os.path.exists(PROFILES_FILE):
-        return {}
-    try:
-        with open(PROFILES_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Failed to load profiles: {e}")
-        return {}
+    return store.snapshot()
 
 def save_profiles(profiles):
     """Safely writes profile data while maintaining stealth attributes."""
-    try:
-        if os.path.exists(PROFILES_FILE):
-            try: ctypes.windll.kernel32.SetFileAttributesW(PROFILES_FILE, 0x80)
-            except Exception: pass
-            
-        with open(PROFILES_FILE, "w", encoding="utf-8") as f:
-            json.dump(profiles, f, indent=4)
-            
-        try: ctypes.windll.kernel32.SetFileAttributesW(PROFILES_FILE, 0x02)
-        except Exception: pass
-    except Exception as e:
-        logger.error(f"Failed to save profiles: {e}")
+    store.replace(profiles)
+
+def export_profiles(path):
+    """Writes every profile in profiles.json format (works with either store)."""
+    atomic_write_json(path, store.snapshot(), hidden=False)
+    return path
+
+def import_profiles(path):
+    """Replaces all profiles with a profiles.json-format file. Returns the entry count."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} is not a profiles.json object")
+    store.replace(data)
+    logger.info(f"Imported {len(data)} profiles from {path}.")
+    return len(data)
+
+def set_limits(base_profiles=None, max_custom=None):
+    """Fleet-managed base profile names and custom profile limit (None keeps the current value)."""
+    global MAX_CUSTOM_PROFILES
+    if base_profiles is not None:
+        BASE_PROFILES[:] = base_profiles  # in place: other modules hold this list
+    if max_custom is not None:
+        MAX_CUSTOM_PROFILES = int(max_custom)
 
 # --- Custom Profile Management (The Acids & Validation) ---
 
 def get_custom_profiles():
     """Tracks the current active custom profiles."""
-    profiles = load_profiles()
-    # Filter out base profiles and direct 1:1 auto-switch mappings (usually ending in .exe)
-    customs = [p for p in profiles.keys() if p not in BASE_PROFILES and not p.lower().endswith(".exe")]
-    return customs
+    # Grouped profiles only: direct 1:1 auto-switch mappings are not listed
+    return [p for p in store.profile_names() if p not in BASE_PROFILES]
 
 def create_custom_profile(name):
     """Safely constructs a new profile if limits allow."""
@@ -48,29 +204,27 @@ def create_custom_profile(name):
         return False, "Profile name cannot be empty."
         
     name = name.strip()
-    profiles = load_profiles()
-    
-    if name in BASE_PROFILES or name in profiles:
-        return False, "Profile already exists."
-        
-    customs = get_custom_profiles()
-    if len(customs) >= MAX_CUSTOM_PROFILES:
-        return False, f"Maximum of {MAX_CUSTOM_PROFILES} custom profiles reached."
-        
-    profiles[name] = {}
-    save_profiles(profiles)
-    logger.info(f"Created new custom profile matrix: {name}")
-    return True, "Profile created successfully."
+
+    def create(profiles):
+        if name in BASE_PROFILES or name in profiles:
+            return False, "Profile already exists."
+        customs = [p for p, value in profiles.items() if p not in BASE_PROFILES and isinstance(value, dict)]
+        if len(customs) >= MAX_CUSTOM_PROFILES:
+            return False, f"Maximum of {MAX_CUSTOM_PROFILES} custom profiles reached."
+        profiles[name] = {}
+        return True, "Profile created successfully."
+
+    success, msg = store.mutate(create)
+    if success:
+        logger.info(f"Created new custom profile matrix: {name}")
+    return success, msg
 
 def delete_custom_profile(name):
     """Removes a custom profile, shielding base profiles from deletion."""
     if name in BASE_PROFILES:
         return False, "Core base profiles cannot be deleted."
         
-    profiles = load_profiles()
-    if name in profiles:
-        del profiles[name]
-        save_profiles(profiles)
+    if store.delete_entry(name):
         logger.info(f"Deleted custom profile matrix: {name}")
         return True, "Profile deleted successfully."
         
@@ -79,13 +233,10 @@ def delete_custom_profile(name):
 # --- The Smart Brain Functions (Direct 1:1 Mapping) ---
 
 def save_profile(name, device_id):
-    profiles = load_profiles()
-    profiles[name] = device_id
-    save_profiles(profiles)
+    store.set_entry(name, device_id)
 
 def get_profile(name):
-    profiles = load_profiles()
-    data = profiles.get(name)
+    data = store.get(name)
     if isinstance(data, str):
         return data
     return None
@@ -93,22 +244,31 @@ def get_profile(name):
 # --- The Matrix Builder Functions (Grouped Mapping) ---
 
 def add_app_to_profile(profile_name, app_name, device_id):
-    profiles = load_profiles()
-    if profile_name not in profiles or not isinstance(profiles[profile_name], dict):
-        profiles[profile_name] = {}
-    profiles[profile_name][app_name] = device_id
-    save_profiles(profiles)
+    store.set_app(profile_name, app_name, device_id)
     logger.info(f"Assigned {app_name} to {profile_name} matrix.")
 
-def apply_profile(profile_name, routing_function):
-    profiles = load_profiles()
-    if profile_name in profiles:
-        target_data = profiles[profile_name]
-        if isinstance(target_data, dict):
-            for app_name, device_id in target_data.items():
-                routing_function(device_id, app_name)
-            logger.info(f"Successfully applied profile matrix: {profile_name}")
-        elif isinstance(target_data, str):
-            routing_function(target_data, profile_name)
+def apply_profile(profile_name, routing_function=None, priority_app=None):
+    """Routes every app in a profile.
+
+    routing_function(device_id, app_name) is called once per app, as it always
+    was. Without one, the whole profile goes out as one concurrent batch
+    (router.set_app_devices), with priority_app started first; its report is returned.
+    """
+    target_data = store.get(profile_name)
+    if target_data is None:
+        logger.warning(f"Profile '{profile_name}' lacks essential tracking data in JSON.")
+        return None
+    if isinstance(target_data, str):
+        target_data = {profile_name: target_data}
+    if not isinstance(target_data, dict):
+        return None
+    if routing_function is None:
+        from router import set_app_devices
+        report = set_app_devices([(device_id, app_name) for app_name, device_id in target_data.items()],
+                                 priority_app)
     else:
-        logger.warning(f"Profile '{profile_name}' lacks essential tracking data in JSON.")
\ No newline at end of file
+        report = None
+        for app_name, device_id in target_data.items():
+            routing_function(device_id, app_name)
+    logger.info(f"Successfully applied profile matrix: {profile_name}")
+    return report
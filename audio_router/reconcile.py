@@ -0,0 +1,349 @@
+# reconcile.py
+import threading
+import time
+from router import (
+    get_backend, get_snapshot, latest_scan, set_app_devices,
+    add_session_listener, remove_session_listener
+)
+from profiles import store as profile_store
+from config import DRIFT_CHECK_INTERVAL_MS, SESSION_WATCH_INTERVAL_MS, logger
+
+# -------------------- DRIFT DETECTION --------------------
+
+def _is_pid(target):
+    return str(target).isdigit()
+
+def plan_routes(desired, snapshot, absent=()):
+    """Returns the (device_id, target) pairs whose live sessions are off-target.
+
+    desired maps an exe name or PID to a device id. A session whose endpoint is
+    unknown counts as off-target. Exe names with no live session are skipped
+    unless listed (lowercase) in absent: an exe-level route then sets the app's
+    default before it starts. PIDs without a session are always skipped.
+    Sessions with their own PID route are left out of their exe's route.
+    """
+    pinned = {str(target) for target in desired if _is_pid(target)}
+    plan = []
+    for target, device_id in desired.items():
+        if _is_pid(target):
+            if snapshot.has_pid(target) and snapshot.device_for_pid(target) != device_id:
+                plan.append((device_id, target))
+            continue
+        sessions = snapshot.sessions_for_exe(target)
+        free = {pid: actual for pid, actual in sessions.items() if pid not in pinned}
+        if not sessions:
+            if target.lower() in absent:
+                plan.append((device_id, target))
+        elif len(free) == len(sessions):
+            if set(sessions.values()) != {device_id}:
+                plan.append((device_id, target))
+        else:
+            # An exe-level command would move the pinned instances too: route the rest one by one
+            plan.extend((device_id, pid) for pid, actual in free.items() if actual != device_id)
+    return plan
+
+def pending_routes(desired, snapshot):
+    """The part of desired no command can reach yet, as {target: device_id}.
+
+    That is PIDs with no session and, on backends that cannot store a per-app
+    default, exe names with no live session.
+    """
+    persists = get_backend().persists_app_routes
+    return {target: device_id for target, device_id in desired.items()
+            if not (snapshot.has_pid(target) if _is_pid(target)
+                    else persists or snapshot.devices_for_exe(target))}
+
+def default_needs_switch(device_id, snapshot):
+    """True when any of the three default roles is not on device_id."""
+    names = {name for name, dev_id in snapshot.devices.items() if dev_id == device_id}
+    if not names:
+        return False  # Unknown device: never fire blind commands at it
+    return any(snapshot.defaults.get(role) not in names for role in ("0", "1", "2"))
+
+# -------------------- CONTROLLER --------------------
+
+class ReconcileController:
+    """Holds the desired app -> device mapping and issues commands only for drift."""
+
+    def __init__(self, snapshot_max_age_ms=250):
+        self.snapshot_max_age_ms = snapshot_max_age_ms
+        self._desired = {}          # exe name (lower) or PID -> (target as given, device id)
+        self._pinned = {}           # PID -> exe name (lower) for routes set on one session
+        self._follow = {}           # exe name (lower) -> device id its new sessions get
+        self._transient = {}        # exe name (lower) -> device id of one-off (Brain) routes (None: failed)
+        self._desired_default = None
+        self._profile_keys = set()  # keys owned by the most recently applied profile
+        self._profile_name = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()  # set when a new session matches a desired route
+        self._thread = None
+
+    def desired(self):
+        """Snapshot of the desired mapping as {target: device_id}."""
+        with self._lock:
+            return dict(self._desired.values())
+
+    def set_route(self, target, device_id):
+        with self._lock:
+            key = self._key(target)
+            self._desired[key] = (str(target), device_id)
+            self._profile_keys.discard(key)
+            if not _is_pid(key):
+                self._unpin(key)
+                self._transient.pop(key, None)
+
+    def _unpin(self, exe_key):
+        """Drops exe_key's per-session routes: an exe-wide route now covers them (lock held)."""
+        for pid in [pid for pid, exe in self._pinned.items() if exe == exe_key]:
+            del self._pinned[pid]
+            self._desired.pop(pid, None)
+        self._follow.pop(exe_key, None)
+
+    def forget_route(self, target):
+        with self._lock:
+            self._desired.pop(self._key(target), None)
+
+    def active_profile(self):
+        """Name of the most recently applied profile, or None."""
+        with self._lock:
+            return self._profile_name
+
+    def set_default(self, device_id):
+        with self._lock:
+            self._desired_default = device_id
+
+    def load_profile(self, profile_name):
+        """Swaps the previous profile's routes for profile_name's in the desired state."""
+        data = profile_store.get(profile_name)
+        if isinstance(data, str):
+            data = {profile_name: data}
+        if not isinstance(data, dict):
+            logger.warning(f"Profile '{profile_name}' lacks essential tracking data in JSON.")
+            return False
+        with self._lock:
+            for key in self._profile_keys:
+                self._desired.pop(key, None)
+            self._profile_keys = set()
+            self._profile_name = profile_name
+            for app_name, device_id in data.items():
+                key = self._key(app_name)
+                self._desired[key] = (app_name, device_id)
+                self._profile_keys.add(key)
+                self._unpin(key)
+                self._transient.pop(key, None)
+        return True
+
+    def apply_profile(self, profile_name, priority_app=None, cancel=None):
+        if self.load_profile(profile_name):
+            with self._lock:
+                keys = set(self._profile_keys)
+            report = self.reconcile(priority_app=priority_app, absent=keys, cancel=cancel)
+            logger.info(f"Successfully applied profile matrix: {profile_name}")
+            return report
+
+    def route(self, target, device_id, priority_app=None):
+        self.set_route(target, device_id)
+        return self.reconcile(priority_app=priority_app, absent={self._key(target)})
+
+    def route_transient(self, exe_name, device_id, priority_app=None):
+        """One-off route for a Brain decision: never scans and never joins the desired state.
+
+        Skipped when the latest scan shows it in place (unless the app was routed
+        since), otherwise issued. Drift checks then leave the app alone (no fighting
+        a hand move) until an explicit route or profile apply covers it again.
+        Sessions with their own PID route stay put.
+        """
+        key = self._key(exe_name)
+        with self._lock:
+            issued = self._transient.get(key)  # device the last one-off route put it on, if it worked
+            self._transient[key] = None
+            pins = {pid: device for pid, (_, device) in self._desired.items() if self._pinned.get(pid) == key}
+        snapshot, routed = latest_scan()
+        sessions = snapshot.sessions_for_exe(exe_name) if snapshot is not None else {}
+        if key in routed and issued == device_id and not pins:
+            plan = []  # Routed since the scan, but by this very route, and nothing explicit since
+        elif snapshot is not None and key not in routed and not routed.intersection(sessions):
+            plan = [(d, t) for d, t in plan_routes(dict(pins, **{exe_name: device_id}), snapshot, {key})
+                    if t not in pins]
+        elif pins:
+            # An exe-level command would move the pinned sessions too: route the rest one by one
+            plan = [(device_id, pid) for pid in sessions if pid not in pins]
+        else:
+            plan = [(device_id, exe_name)]  # No trustworthy view of this app: route it unchecked
+        report = set_app_devices(plan, priority_app) if plan else None
+        if not plan or (report is not None and report.ok):
+            with self._lock:
+                if key in self._transient:  # not superseded by an explicit route meanwhile
+                    self._transient[key] = device_id
+        if not plan:
+            logger.debug(f"[RECONCILE] '{exe_name}' already on its Brain route.")
+        return report
+
+    def route_session(self, pid, exe_name, device_id, priority_app=None):
+        """Routes one session by PID, leaving the app's other live sessions where they are.
+
+        Sessions of exe_name that start later follow it (each gets its own PID route).
+        """
+        pid, exe_key = str(pid), exe_name.lower()
+        with self._lock:
+            self._desired[pid] = (pid, device_id)
+            self._profile_keys.discard(pid)
+            self._pinned[pid] = exe_key
+            self._follow[exe_key] = device_id
+        return self.reconcile(priority_app=priority_app)
+
+    def session_routes(self):
+        """Per-session routes for state.json: {exe: {"follow": device id, "pids": {pid: device id}}}."""
+        with self._lock:
+            routes = {exe: {"follow": device, "pids": {}} for exe, device in self._follow.items()}
+            for pid, exe in self._pinned.items():
+                if pid in self._desired:
+                    routes.setdefault(exe, {"follow": None, "pids": {}})["pids"][pid] = self._desired[pid][1]
+            return routes
+
+    def restore_session_routes(self, routes, snapshot):
+        """Reloads session_routes() saved by an earlier run, through the same pins and follow rules.
+
+        Saved PIDs still running their exe keep their routes and the app's other
+        live sessions stay put, as before. If none survived, the app restarted
+        meanwhile: its sessions are all new, so they follow. Routes to devices that
+        are gone are dropped. Returns the count restored.
+        """
+        known = set(snapshot.devices.values())
+        restored = 0
+        with self._lock:
+            for exe_key, entry in routes.items():
+                exe_key = exe_key.lower()
+                follow = entry.get("follow") if entry.get("follow") in known else None
+                live = snapshot.sessions_for_exe(exe_key)
+                pins = {pid: device for pid, device in entry.get("pids", {}).items()
+                        if pid in live and device in known}
+                if not pins and follow:
+                    pins = dict.fromkeys(live, follow)
+                for pid, device in pins.items():
+                    self._desired[pid] = (pid, device)
+                    self._pinned[pid] = exe_key
+                if follow:
+                    self._follow[exe_key] = follow
+                restored += len(pins) + bool(follow)
+        return restored
+
+    def reconcile(self, priority_app=None, on_result=None, absent=(), cancel=None):
+        """Compares desired vs. live state and issues the minimal command set.
+
+        A drifted default and every drifted route go out as one concurrent
+        batch; on_result(done, total) reports progress as commands finish.
+        absent (lowercase exe names; explicit applies) are routed even with no
+        session yet, on backends that keep that as the app's default. Once
+        cancel() is True (a newer request superseded this one) nothing more starts.
+        """
+        snapshot = get_snapshot(self.snapshot_max_age_ms)
+        with self._lock:
+            # PID routes die with their process
+            for key in [k for k in self._desired if _is_pid(k)]:
+                if not snapshot.has_pid(key):
+                    del self._desired[key]
+                    self._pinned.pop(key, None)
+            # One-off (Brain) routes are not drift-corrected, and nothing is fought over them
+            desired = dict(value for key, value in self._desired.items() if key not in self._transient)
+            desired_default = self._desired_default
+
+        default_id = None
+        if desired_default and default_needs_switch(desired_default, snapshot):
+            logger.info(f"[RECONCILE] Global default drifted. Restoring {desired_default}.")
+            default_id = desired_default
+
+        if cancel is not None and cancel():
+            return None
+        plan = plan_routes(desired, snapshot, absent if get_backend().persists_app_routes else ())
+        if not plan and default_id is None:
+            logger.debug(f"[RECONCILE] {len(desired)} routes already in place.")
+            return None
+        if plan:
+            logger.info(f"[RECONCILE] Correcting {len(plan)} of {len(desired)} routes.")
+        report = set_app_devices(plan, priority_app, default_device=default_id, on_result=on_result,
+                                 cancel=cancel)
+        if report is not None:
+            # History is buffered by the store and written in the background
+            profile_store.record_routes(plan + ([(default_id, "default")] if default_id else []),
+                                       report.ok, source="reconcile")
+        return report
+
+    # ---------- New sessions ----------
+    def on_sessions(self, delta, snapshot):
+        """Session listener: wakes the drift thread when a new session has a saved route.
+
+        Routes are keyed by exe name, so a restarted app (new PID) gets its
+        route back as soon as its session shows up in any snapshot. A new
+        session of an app routed session by session gets a PID route of its own.
+        """
+        if delta.initial or not delta.appeared:
+            return
+        hits = []
+        with self._lock:
+            for label, (exe, pid) in delta.appeared.items():
+                exe_key = exe.lower()
+                if exe_key in self._follow and pid not in self._desired:
+                    self._desired[pid] = (pid, self._follow[exe_key])
+                    self._pinned[pid] = exe_key
+                    hits.append(label)
+                elif exe_key in self._desired:
+                    hits.append(label)
+        if hits:
+            logger.info(f"[RECONCILE] New session(s) with a saved route: {', '.join(hits)}")
+            self._wake.set()
+
+    # ---------- Scheduled drift correction ----------
+    def start(self, interval_ms=DRIFT_CHECK_INTERVAL_MS, watch_ms=SESSION_WATCH_INTERVAL_MS):
+        """Runs reconcile() on a daemon thread every interval_ms and whenever a new
+        session matches a route. Between drift checks the session list is polled
+        every watch_ms (a cached snapshot counts) to spot new sessions.
+        """
+        if interval_ms <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        add_session_listener(self.on_sessions)
+        tick = (min(interval_ms, watch_ms) if watch_ms > 0 else interval_ms) / 1000.0
+
+        def loop():
+            next_check = time.monotonic() + interval_ms / 1000.0
+            while not self._stop.is_set():
+                woke = self._wake.wait(tick)
+                if self._stop.is_set():
+                    break
+                self._wake.clear()
+                try:
+                    if woke or time.monotonic() >= next_check:
+                        self.reconcile()
+                        next_check = time.monotonic() + interval_ms / 1000.0
+                    elif watch_ms > 0 and self._desired:
+                        # Reuses any snapshot taken within the last watch interval
+                        get_snapshot(watch_ms)
+                except Exception as e:
+                    logger.debug(f"Drift check error: {e}")
+
+        self._thread = threading.Thread(target=loop, name="pebx-reconcile", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        remove_session_listener(self.on_sessions)
+        self._thread = None
+
+    @staticmethod
+    def _key(target):
+        target = str(target)
+        return target if _is_pid(target) else target.lower()
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_controller():
+    """Shared process-wide controller (created on first use)."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = ReconcileController()
+        return _controller
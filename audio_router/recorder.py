@@ -0,0 +1,108 @@
+# recorder.py
+# Session trace recorder. While on, foreground changes, hardware (device
+# change) messages, scan results and every routing command are appended to a
+# JSON Lines file with a monotonic timestamp, so a "the Brain switched too
+# late" report can be replayed on any OS (benchmarks/replay_trace.py).
+#
+#   {"t": 0.0, "kind": "meta", "version": 1, "profiles": {...}, "rules": [...]}
+#   {"t": 1.52, "kind": "foreground", "pid": "4242", "name": "Discord.exe", "path": "...", "title": "..."}
+#   {"t": 1.61, "kind": "command", "op": "set_app_default", "label": "...", "ok": true, "ms": 41.2}
+#   {"t": 1.70, "kind": "snapshot", "devices": {...}, "defaults": {...}, "sessions": {...}}
+#   {"t": 9.03, "kind": "device_change"}
+import atexit
+import json
+import os
+import threading
+import time
+from config import APP_NAME, TRACE, TRACE_DIR, logger
+
+TRACE_VERSION = 1
+
+class TraceRecorder:
+    """Appends events to path; thread-safe, line-buffered, cheap enough to leave on."""
+
+    def __init__(self, path):
+        self.path = path
+        self.events = 0
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._last_snapshot = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def write(self, kind, fields):
+        line = json.dumps({"t": round(time.perf_counter() - self._started, 4), "kind": kind, **fields})
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.events += 1
+
+    def write_snapshot(self, snapshot):
+        """Records a scan only when devices, defaults or sessions differ from the last one recorded."""
+        state = {
+            "devices": snapshot.devices,
+            "defaults": snapshot.defaults,
+            "sessions": {label: [exe, pid, snapshot.session_devices.get(label)]
+                         for label, (exe, pid) in snapshot.sessions.items()},
+        }
+        with self._lock:
+            if state == self._last_snapshot:
+                return
+            self._last_snapshot = state
+        self.write("snapshot", state)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+_recorder = None
+
+def start_recording(path=None):
+    """Starts a trace (default: TRACE_DIR/trace-<time>.jsonl) and returns its path."""
+    global _recorder
+    if _recorder is not None:
+        return _recorder.path
+    path = path or os.path.join(TRACE_DIR, time.strftime("trace-%Y%m%d-%H%M%S.jsonl"))
+    recorder = TraceRecorder(path)
+    # What the Brain decides with: replay loads these instead of the replaying machine's
+    from profiles import store
+    from rules import load_rule_file, rulebook
+    rules = [{"name": r.name, "path": r.path, "title": r.title, "device": r.device, "priority": r.priority}
+             for r in load_rule_file()] + rulebook.fleet_rules()
+    recorder.write("meta", {"version": TRACE_VERSION, "app": APP_NAME, "started": time.time(),
+                            "profiles": store.snapshot(), "rules": rules})
+    _recorder = recorder
+    atexit.register(stop_recording)
+    logger.info(f"[TRACE] Recording session trace to {path}")
+    return path
+
+def start_from_config():
+    """Honours PEBX_TRACE: "1" records to TRACE_DIR, anything else is the file path."""
+    if TRACE:
+        return start_recording(None if TRACE == "1" else TRACE)
+    return None
+
+def stop_recording():
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+        logger.info(f"[TRACE] Trace closed ({recorder.events} events): {recorder.path}")
+
+def recording():
+    return _recorder is not None
+
+# Hooks: no-ops unless a trace is running
+
+def record(kind, **fields):
+    recorder = _recorder
+    if recorder is not None:
+        recorder.write(kind, fields)
+
+def record_snapshot(snapshot):
+    recorder = _recorder
+    if recorder is not None:
+        recorder.write_snapshot(snapshot)
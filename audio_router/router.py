@@ -1,101 +1,160 @@
 # router.py
-import subprocess
-import csv
 import os
 import sys
-import winreg
-from config import SOUND_VOLUME_VIEW, DEVICES_FILE, logger
+import threading
+try:
+    import winreg
+except ImportError:
+    winreg = None  # Non-Windows hosts (fake backend tests and benchmarks)
+from config import AUDIO_BACKEND, SNAPSHOT_TTL_MS, logger
+from executor import run_commands
+from metrics import metrics
+from backends import AudioSnapshot, ROLES, create_backend, diff_sessions
+from state import snapshot_cache
+from recorder import record_snapshot
 
-# -------------------- DEVICE SCAN --------------------
+# -------------------- BACKEND --------------------
 
-def _generate_csv():
-    """Run SoundVolumeView to regenerate devices.csv (silent)."""
-    try:
-        subprocess.run(
-            [SOUND_VOLUME_VIEW, "/scomma", DEVICES_FILE],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=False
-        )
-    except Exception as e:
-        logger.error(f"Failed to generate CSV: {e}")
+_backend_lock = threading.Lock()
+_backend = None
 
-def scan_output_devices():
-    devices = {}
-    _generate_csv()
-    try:
-        # UNIVERSAL FIX: utf-8-sig handles the BOM and prevents decoding crashes
-        with open(DEVICES_FILE, newline="", encoding="utf-8-sig") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if row.get("Type") == "Device" and row.get("Direction") == "Render":
-                    friendly_name = row.get("Device Name") or row.get("Name")
-                    device_id = row.get("Item ID")
-                    if friendly_name and device_id:
-                        devices[friendly_name] = device_id
-        logger.info(f"Successfully scanned {len(devices)} output devices.")
-    except Exception as e:
-        logger.error(f"Device scan error: {e}")
-    return devices
+def get_backend():
+    """The active audio backend (AUDIO_BACKEND, created on first use)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(AUDIO_BACKEND)
+            logger.info(f"Audio backend: {_backend.name}")
+        return _backend
+
+def set_backend(backend):
+    """Swaps the audio backend (tests, benchmarks, or a runtime switch)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+    invalidate_snapshot()
+
+# -------------------- SNAPSHOT CACHE --------------------
+
+_snapshot_lock = threading.Lock()
+_snapshot = None
+_snapshot_generation = 0
+_last_scan = None  # survives invalidate_snapshot(): the baseline for session deltas
+_routed_since_scan = set()  # exe names (lower) and PIDs routed after the latest scan started
+_routed_lock = threading.Lock()
+_last_counts = None  # (devices, sessions) of the last scan, for INFO-level logging
+_session_listeners = []
+
+def add_session_listener(callback):
+    """callback(delta, snapshot) runs after every scan whose sessions differ from the last one.
+
+    Listeners run on the scanning thread, after the snapshot lock is released;
+    keep them short (hand real work to another thread or the GUI queue).
+    """
+    with _snapshot_lock:
+        _session_listeners.append(callback)
+
+def remove_session_listener(callback):
+    with _snapshot_lock:
+        if callback in _session_listeners:
+            _session_listeners.remove(callback)
+
+def get_snapshot(max_age_ms=None):
+    """Returns a snapshot no older than max_age_ms (defaults to SNAPSHOT_TTL_MS).
+
+    Concurrent callers share a single backend scan: whoever takes the lock
+    first refreshes, everyone queued behind it reuses that result.
+    """
+    global _snapshot, _snapshot_generation, _last_scan, _last_counts
+    limit = SNAPSHOT_TTL_MS if max_age_ms is None else max_age_ms
+    backend = get_backend()
+    with _snapshot_lock:
+        if _snapshot is not None and _snapshot.age_ms() <= limit:
+            return _snapshot
+        _snapshot_generation += 1
+        with _routed_lock:
+            _routed_since_scan.clear()  # before scanning: routes racing the scan stay marked
+        with metrics.span("scan"):
+            snapshot = _snapshot = backend.scan(_snapshot_generation)
+        delta = diff_sessions(_last_scan, snapshot)
+        _last_scan = snapshot
+        listeners = list(_session_listeners) if delta else ()
+        counts = (len(snapshot.devices), len(snapshot.sessions))
+        # INFO only when the picture changes; routine polls and reconciles stay at DEBUG
+        log = logger.info if counts != _last_counts else logger.debug
+        _last_counts = counts
+        log(f"Snapshot #{snapshot.generation}: {counts[0]} output devices, {counts[1]} audio instances.")
+    if delta and not delta.initial:
+        logger.debug(f"Session delta: {delta}")
+    snapshot_cache.update(**snapshot.to_dict())  # written (debounced) only when it differs
+    record_snapshot(snapshot)
+    for callback in listeners:
+        try:
+            callback(delta, snapshot)
+        except Exception as e:
+            logger.debug(f"Session listener error: {e}")
+    return snapshot
+
+def latest_scan():
+    """(most recent scan of this run or None, targets routed since it), without scanning.
+
+    The scan may be old; its view of any exe name or PID in the second item is stale.
+    """
+    with _routed_lock:
+        return _last_scan, frozenset(_routed_since_scan)
+
+def last_known_snapshot():
+    """The most recent scan from any earlier run (no backend call), or None.
+
+    Good for painting; its age is infinite, so get_snapshot() never serves it.
+    """
+    data = snapshot_cache.load()
+    if not data.get("devices"):
+        return None
+    return AudioSnapshot.from_dict(data)
+
+def invalidate_snapshot():
+    """Forces the next reader to take a fresh snapshot (call after any routing change)."""
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
+
+def scan_output_devices(max_age_ms=None):
+    return dict(get_snapshot(max_age_ms).devices)
 
 # -------------------- CURRENT DEFAULT --------------------
 
-def get_current_default_device():
-    _generate_csv()
-    try:
-        # UPDATED: Using utf-8-sig for stable default device tracking
-        with open(DEVICES_FILE, newline="", encoding="utf-8-sig") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if row.get("Type") == "Device" and row.get("Direction") == "Render":
-                    if row.get("Default") == "Render" \
-                       or row.get("Default Multimedia") == "Render" \
-                       or row.get("Default Communications") == "Render":
-                        return row.get("Device Name") or row.get("Name")
-    except Exception as e:
-        logger.warning(f"Could not read current default device: {e}")
-    return None
+def get_current_default_device(max_age_ms=None):
+    return get_snapshot(max_age_ms).default_device
 
 # -------------------- APP SCAN (STEP 2: PID EXTRACTION) --------------------
 
-def scan_audio_apps():
-    apps = {}
-    _generate_csv()
-    try:
-        # UPDATED: Using utf-8-sig and unique PID mapping
-        with open(DEVICES_FILE, newline="", encoding="utf-8-sig") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if row.get("Type") == "Application":
-                    friendly_name = row.get("Name")
-                    process_id = row.get("Process ID")
-                    
-                    if friendly_name and process_id and process_id != "0":
-                        # Unique label to separate multiple instances (like Brave tabs)
-                        display_label = f"{friendly_name} (PID: {process_id})"
-                        
-                        process_path = row.get("Process Path")
-                        exe_name = os.path.basename(process_path) if process_path else friendly_name
-                        
-                        apps[display_label] = (exe_name, process_id)
-                        
-        logger.info(f"Metabolism: Identified {len(apps)} unique audio instances.")
-    except Exception as e:
-        logger.error(f"Surgical scan error: {e}")
-    return apps
+def scan_audio_apps(max_age_ms=None):
+    return dict(get_snapshot(max_age_ms).sessions)
+
+# -------------------- ROLE FAN-OUT --------------------
+
+def _role_commands(device_id, target=None, priority=0):
+    """One backend command per role (console / multimedia / comms).
+
+    Without a target the commands switch the global default device.
+    """
+    backend = get_backend()
+    if target is None:
+        return [backend.set_default_command(device_id, role, priority) for role in ROLES]
+    return [backend.set_app_command(device_id, role, target, priority) for role in ROLES]
 
 # -------------------- GLOBAL SWITCH --------------------
 
 def set_default_device(device_id):
     try:
-        for role in ["0", "1", "2"]:
-            subprocess.run(
-                [SOUND_VOLUME_VIEW, "/SetDefault", device_id, role],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                check=False
-            )
-        logger.info(f"Global default device successfully set to ID: {device_id}")
+        report = run_commands(_role_commands(device_id))
+        invalidate_snapshot()
+        if report.ok:
+            logger.info(f"Global default device successfully set to ID: {device_id} ({report.summary()})")
+        else:
+            logger.error(f"Failed to set global default device {device_id}: {report.summary()}")
+        return report
     except Exception as e:
         logger.error(f"Failed to set global default device {device_id}: {e}")
 
@@ -104,38 +163,70 @@ def set_default_device(device_id):
 def set_app_device(device_id, app_exe):
     """Standard routing by EXE name (Legacy)."""
     try:
-        for role in ["0", "1", "2"]:
-            subprocess.run(
-                [SOUND_VOLUME_VIEW, "/SetAppDefault", device_id, role, app_exe],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                check=False
-            )
-        logger.info(f"Successfully routed '{app_exe}' to device ID: {device_id}")
+        report = run_commands(_role_commands(device_id, app_exe))
+        invalidate_snapshot()
+        if report.ok:
+            logger.info(f"Successfully routed '{app_exe}' to device ID: {device_id} ({report.summary()})")
+        else:
+            logger.error(f"Failed to route '{app_exe}': {report.summary()}")
+        return report
     except Exception as e:
         logger.error(f"Failed to route '{app_exe}': {e}")
 
 def set_app_device_by_pid(device_id, pid):
     """Surgical routing by Process ID (Step 2)."""
     try:
-        for role in ["0", "1", "2"]:
-            subprocess.run(
-                [SOUND_VOLUME_VIEW, "/SetAppDefault", device_id, role, str(pid)],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                check=False
-            )
-        logger.info(f"Surgically routed PID {pid} to device ID: {device_id}")
+        report = run_commands(_role_commands(device_id, pid))
+        invalidate_snapshot()
+        if report.ok:
+            logger.info(f"Surgically routed PID {pid} to device ID: {device_id} ({report.summary()})")
+        else:
+            logger.error(f"Failed to surgically route PID {pid}: {report.summary()}")
+        return report
     except Exception as e:
         logger.error(f"Failed to surgically route PID {pid}: {e}")
 
+def set_app_devices(routes, priority_app=None, default_device=None, on_result=None, cancel=None):
+    """Routes many apps at once: routes is a list of (device_id, app_exe or pid).
+
+    Every app/role pair runs concurrently on the routing executor; commands for
+    priority_app (usually the foreground exe) are started first. default_device,
+    when given, switches the global default in the same batch. on_result(done,
+    total) is called as each command finishes; once cancel() is True the
+    commands not yet started are skipped.
+    """
+    commands = _role_commands(default_device) if default_device else []
+    with _routed_lock:
+        _routed_since_scan.update(str(target).lower() for _, target in routes)
+    for device_id, target in routes:
+        is_priority = priority_app is not None and str(target).lower() == str(priority_app).lower()
+        commands.extend(_role_commands(device_id, target, priority=0 if is_priority else 1))
+    if not commands:
+        return None
+    try:
+        report = run_commands(commands, on_result=on_result, cancel=cancel)
+        invalidate_snapshot()
+        if report.cancelled:
+            logger.info(f"Batch routing superseded for {len(routes)} apps ({report.summary()})")
+        elif report.ok:
+            if default_device:
+                logger.info(f"Global default device successfully set to ID: {default_device}")
+            logger.info(f"Routed {len(routes)} apps concurrently ({report.summary()})")
+        else:
+            logger.error(f"Batch routing incomplete for {len(routes)} apps ({report.summary()})")
+        return report
+    except Exception as e:
+        logger.error(f"Batch routing failed: {e}")
+
 # -------------------- MUTE / WINDOWS --------------------
 
 def toggle_mute():
     try:
-        subprocess.run([SOUND_VOLUME_VIEW, "/Mute", "Toggle"],
-                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
-        logger.info("System mute toggled.")
+        report = run_commands([get_backend().mute_command()])
+        if report.ok:
+            logger.info("System mute toggled.")
+        else:
+            logger.error(f"Mute toggle failed: {report.summary()}")
     except Exception as e:
         logger.error(f"Mute toggle error: {e}")
 
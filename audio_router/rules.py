@@ -0,0 +1,220 @@
+# rules.py
+import fnmatch
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from config import RULES_FILE, RULES_CHECK_INTERVAL_MS, logger
+from profiles import store as profile_store
+from storage import file_stamp
+
+# rules.json:
+# {"version": 1, "rules": [
+#     {"name": "discord*.exe", "device": "{0.0.0.00000000}.{...}", "priority": 10},
+#     {"path": "C:\\Games\\", "device": "..."},
+#     {"name": "chrome.exe", "title": "(?i)meet|zoom", "device": "...", "priority": 20}
+# ]}
+# Every condition given on a rule must match. Higher priority wins; ties go to
+# the more specific rule (exact name > path > glob > title-only), then file order.
+
+_GLOB_CHARS = set("*?[")
+
+class Rule:
+    __slots__ = ("name", "path", "title", "device", "priority", "order",
+                 "rank", "_name_re", "_title_re", "exact")
+
+    def __init__(self, device, name=None, path=None, title=None, priority=0, order=0):
+        if not (name or path or title):
+            raise ValueError("rule needs at least one of name, path or title")
+        self.device = device
+        self.name = name.lower() if name else None
+        self.path = _norm_path(path) if path else None
+        self.title = title
+        self.priority = int(priority)
+        self.order = order
+        self.exact = bool(self.name) and not (_GLOB_CHARS & set(self.name))
+        self._name_re = re.compile(fnmatch.translate(self.name)) if self.name and not self.exact else None
+        self._title_re = re.compile(title) if title else None
+        specificity = 3 if self.exact else 2 if self.path else 1 if self.name else 0
+        # Smaller rank sorts first = wins
+        self.rank = (-self.priority, -specificity, order)
+
+    def matches(self, name, path, title):
+        if self.name:
+            if self.exact:
+                if name != self.name:
+                    return False
+            elif not self._name_re.match(name):
+                return False
+        if self.path and not (path and path.startswith(self.path)):
+            return False
+        if self._title_re and not (title and self._title_re.search(title)):
+            return False
+        return True
+
+    def __repr__(self):
+        return f"Rule(name={self.name!r}, path={self.path!r}, title={self.title!r}, priority={self.priority})"
+
+def _norm_path(path):
+    return path.replace("/", "\\").lower()
+
+class _TrieNode:
+    __slots__ = ("children", "rules")
+
+    def __init__(self):
+        self.children = {}
+        self.rules = []
+
+class RuleEngine:
+    """Rules compiled into indexes so a focus change never scans the whole list.
+
+    Exact names live in a hash, path prefixes in a character trie, and the
+    remaining glob/title rules in rank order so scanning stops as soon as no
+    later rule can beat the best candidate. Recent decisions sit in an LRU,
+    keyed by window title only when some rule looks at titles.
+    """
+
+    def __init__(self, rules, cache_size=512):
+        self.rules = sorted(rules, key=lambda r: r.rank)
+        self._exact = {}
+        self._trie = _TrieNode()
+        self._scan = []
+        for rule in self.rules:
+            if rule.exact:
+                self._exact.setdefault(rule.name, []).append(rule)
+            elif rule.path:
+                node = self._trie
+                for ch in rule.path:
+                    node = node.children.setdefault(ch, _TrieNode())
+                node.rules.append(rule)
+            else:
+                self._scan.append(rule)
+        self._uses_title = any(rule.title for rule in self.rules)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def match(self, name, path=None, title=None):
+        """Best rule for a process (exe name, full path, window title) or None."""
+        name = (name or "").lower()
+        path = _norm_path(path) if path else None
+        key = (name, path, title if self._uses_title else None)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        best = None
+        for rule in self._exact.get(name, ()):
+            if rule.matches(name, path, title):
+                best = rule
+                break  # Bucket is already in rank order
+        if path:
+            node = self._trie
+            for ch in path:
+                node = node.children.get(ch)
+                if node is None:
+                    break
+                for rule in node.rules:
+                    if (best is None or rule.rank < best.rank) and rule.matches(name, path, title):
+                        best = rule
+        for rule in self._scan:
+            if best is not None and rule.rank > best.rank:
+                break
+            if rule.matches(name, path, title):
+                best = rule
+                break
+
+        with self._lock:
+            self._cache[key] = best
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return best
+
+# -------------------- LOADING --------------------
+
+def load_rule_file(path=RULES_FILE):
+    """Parses rules.json into Rule objects, skipping (and logging) invalid entries."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        logger.error(f"Failed to load routing rules: {e}")
+        return []
+    return parse_rules(data.get("rules", []) if isinstance(data, dict) else [])
+
+def parse_rules(entries, start_order=0):
+    """Rule objects for rules.json-style dicts, skipping (and logging) invalid entries."""
+    rules = []
+    for i, entry in enumerate(entries):
+        try:
+            rules.append(Rule(entry["device"], entry.get("name"), entry.get("path"),
+                              entry.get("title"), entry.get("priority", 0), order=start_order + i))
+        except Exception as e:
+            logger.warning(f"Skipping invalid routing rule #{i}: {e}")
+    return rules
+
+class RuleBook:
+    """Recompiles the engine only when rules.json or the fleet rules change.
+
+    Local rules.json entries come first, so on equal priority and specificity
+    a workstation's own rule beats the fleet's. Top-level "exe -> device"
+    Smart Brain mappings are not compiled in: each lookup asks the profile
+    store for the one exe (an index hit) and ranks it as an exact-name rule
+    placed after every file rule, so large mapping sets never load at once.
+    """
+
+    def __init__(self, path=RULES_FILE, store=profile_store, check_interval_ms=RULES_CHECK_INTERVAL_MS):
+        self.path = path
+        self.store = store
+        self.check_interval_ms = check_interval_ms
+        self._next_check = 0.0  # monotonic time of the next rules.json stat
+        self._fleet = []        # rules.json-style dicts pushed by fleet sync
+        self._fleet_version = 0
+        self._key = None
+        self._engine = RuleEngine([])
+        self._lock = threading.Lock()
+
+    def set_fleet_rules(self, entries):
+        """Replaces the fleet rule set; returns False (no recompile) if it is unchanged."""
+        entries = list(entries)
+        with self._lock:
+            if entries == self._fleet:
+                return False
+            self._fleet = entries
+            self._fleet_version += 1
+        return True
+
+    def fleet_rules(self):
+        with self._lock:
+            return list(self._fleet)
+
+    def engine(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._key is not None and self._key[1] == self._fleet_version and now < self._next_check:
+                return self._engine
+            self._next_check = now + self.check_interval_ms / 1000.0
+        key = (file_stamp(self.path), self._fleet_version)
+        with self._lock:
+            if key != self._key:
+                rules = load_rule_file(self.path)
+                self._engine = RuleEngine(rules + parse_rules(self._fleet, len(rules)))
+                self._key = key
+                logger.info(f"[BRAIN] Compiled {len(self._engine.rules)} routing rules.")
+            return self._engine
+
+    def lookup(self, info):
+        """Device id for a foreground ProcessInfo, or None."""
+        engine = self.engine()
+        rule = engine.match(info.name, info.path, info.title)
+        device = self.store.app_rule(info.name) if info.name else None
+        # The mapping ranks as a priority-0 exact-name rule placed after every compiled one
+        if device is not None and (rule is None or (0, -3, len(engine.rules)) < rule.rank):
+            return device
+        return rule.device if rule else None
+
+rulebook = RuleBook()
@@ -0,0 +1,99 @@
+# state.py
+import atexit
+import json
+import threading
+from config import STATE_FILE, SNAPSHOT_CACHE_FILE, STATE_WRITE_DELAY_MS, logger
+from storage import Debouncer, atomic_write_text
+
+class StateStore:
+    """state.json (global device, saved app routes) held in memory.
+
+    update() marks the state dirty only when a value really changes; a
+    debounced atomic writer persists it, and skips the write entirely when the
+    serialized text matches what is already on disk.
+    """
+
+    def __init__(self, path=STATE_FILE, write_delay_ms=STATE_WRITE_DELAY_MS, label="Application state"):
+        self.path = path
+        self.label = label  # for log lines
+        self._lock = threading.RLock()
+        self._data = {}
+        self._loaded = False
+        self._dirty = False
+        self._on_disk = None  # serialized text last read from or written to path
+        self.writes = 0
+        self.skipped = 0
+        self._writer = Debouncer(write_delay_ms, self._persist, name="pebx-state-writer")
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                text = f.read()
+            data = json.loads(text)
+            if isinstance(data, dict):
+                self._data = data
+                self._on_disk = json.dumps(data, indent=4)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"[MEMORY] Failed to load {self.label.lower()}: {e}")
+
+    def load(self):
+        """A private copy of the whole state (reads the file on first use)."""
+        with self._lock:
+            self._ensure_loaded()
+            return json.loads(json.dumps(self._data))
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._ensure_loaded()
+            return self._data.get(key, default)
+
+    def update(self, **values):
+        """Sets the given keys; schedules a write only if something changed. Returns True if it did."""
+        with self._lock:
+            self._ensure_loaded()
+            changed = {k: v for k, v in values.items() if self._data.get(k) != v}
+            if not changed:
+                return False
+            self._data.update(changed)
+            self._dirty = True
+        self._writer.trigger()
+        return True
+
+    def dirty(self):
+        with self._lock:
+            return self._dirty
+
+    def flush(self):
+        """Writes pending changes now (called on exit)."""
+        self._writer.flush()
+
+    def _persist(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            text = json.dumps(self._data, indent=4)
+            self._dirty = False
+            if text == self._on_disk:
+                self.skipped += 1
+                logger.debug(f"[MEMORY] {self.label} unchanged on disk; write skipped.")
+                return
+            try:
+                atomic_write_text(self.path, text)
+                self._on_disk = text
+                self.writes += 1
+                logger.debug(f"[MEMORY] {self.label} successfully saved and hidden.")
+            except Exception as e:
+                self._dirty = True
+                logger.error(f"[MEMORY] Failed to save {self.label.lower()}: {e}")
+
+store = StateStore()
+atexit.register(store.flush)
+
+# Last scan's devices and sessions: lets the window paint before the first scan finishes
+snapshot_cache = StateStore(SNAPSHOT_CACHE_FILE, label="Snapshot cache")
+atexit.register(snapshot_cache.flush)
@@ -0,0 +1,113 @@
+# storage.py
+import ctypes
+import json
+import os
+import tempfile
+import threading
+import time
+
+FILE_ATTRIBUTE_HIDDEN = 0x02
+FILE_ATTRIBUTE_NORMAL = 0x80
+
+def _set_attributes(path, attributes):
+    try:
+        ctypes.windll.kernel32.SetFileAttributesW(path, attributes)
+    except Exception:
+        pass  # Not on Windows
+
+def atomic_write_text(path, text, hidden=True):
+    """Writes text to a temp file beside path, then swaps it in with one rename.
+
+    Readers see either the old file or the new one, never a half-written file,
+    even if the process dies mid-write.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            # Windows refuses to replace hidden files
+            _set_attributes(path, FILE_ATTRIBUTE_NORMAL)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if hidden:
+        _set_attributes(path, FILE_ATTRIBUTE_HIDDEN)
+
+def atomic_write_json(path, data, hidden=True, indent=4):
+    atomic_write_text(path, json.dumps(data, indent=indent), hidden=hidden)
+
+def file_stamp(path):
+    """(mtime_ns, size) of path, or None if it doesn't exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+class Debouncer:
+    """Runs func once things go quiet for delay_ms after the last trigger().
+
+    With max_delay_ms, a steady stream of triggers still fires func at most
+    max_delay_ms after the first one of the burst.
+    """
+
+    def __init__(self, delay_ms, func, name="pebx-debounce", max_delay_ms=None):
+        self.delay_ms = delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.func = func
+        self.name = name
+        self._timer = None
+        self._burst_started = None
+        self._lock = threading.Lock()
+
+    def trigger(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+            else:
+                self._burst_started = now
+            delay = self.delay_ms / 1000.0
+            if self.max_delay_ms is not None:
+                delay = max(0.0, min(delay, self._burst_started + self.max_delay_ms / 1000.0 - now))
+            timer = threading.Timer(delay, self._fire)
+            timer.args = (timer,)  # lets a timer that lost a cancel() race see it was replaced
+            timer.name = self.name
+            timer.daemon = True
+            self._timer = timer
+            timer.start()
+
+    def pending(self):
+        with self._lock:
+            return self._timer is not None
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def flush(self):
+        """Runs func now if a call is pending (e.g. on shutdown)."""
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+        self.func()
+
+    def _fire(self, timer=None):
+        with self._lock:
+            if timer is not None and timer is not self._timer:
+                return
+            self._timer = None
+        self.func()
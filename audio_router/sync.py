@@ -0,0 +1,270 @@
+# sync.py
+# Fleet profile distribution. One bundle of profiles and rules is published on
+# a file share or a local HTTP endpoint; each workstation pulls it in the
+# background, validates it, caches it and applies only the entries that changed.
+#
+# Bundle (schema 1):
+# {"schema": 1, "version": "2026.10.3",
+#  "base_profiles": ["Gaming", "Work", "Meeting"], "max_custom_profiles": 2,
+#  "profiles": {"Gaming": {"discord.exe": "{0.0.0.00000000}.{...}"}, "chrome.exe": "{...}"},
+#  "rules": [{"name": "teams.exe", "device": "{...}", "priority": 10}]}
+# Every key but schema and version is optional.
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from config import SYNC_SOURCE, SYNC_CACHE_FILE, SYNC_INTERVAL_MS, SYNC_TIMEOUT_MS, logger
+from metrics import metrics
+from profiles import store as profile_store, set_limits
+from rules import Rule, rulebook as shared_rulebook
+from storage import atomic_write_json, file_stamp
+
+SCHEMA_VERSIONS = (1,)
+
+class BundleError(ValueError):
+    """The bundle does not match a supported schema."""
+
+# -------------------- VALIDATION --------------------
+
+def validate_bundle(data):
+    """Returns data if it is a valid bundle; raises BundleError naming the first problem."""
+    if not isinstance(data, dict):
+        raise BundleError("bundle must be a JSON object")
+    schema = data.get("schema")
+    if schema not in SCHEMA_VERSIONS:
+        raise BundleError(f"unsupported schema {schema!r} (supported: {', '.join(map(str, SCHEMA_VERSIONS))})")
+    version = data.get("version")
+    if isinstance(version, bool) or not isinstance(version, (str, int)) or version == "":
+        raise BundleError("version must be a non-empty string or an integer")
+    profiles = data.get("profiles", {})
+    if not isinstance(profiles, dict):
+        raise BundleError("profiles must be an object")
+    for name, value in profiles.items():
+        if isinstance(value, str):
+            continue  # Smart Brain "exe -> device" mapping
+        if not isinstance(value, dict) or not all(isinstance(k, str) and isinstance(v, str) for k, v in value.items()):
+            raise BundleError(f"profiles.{name}: expected a device id or an {{app: device id}} object")
+    rules = data.get("rules", [])
+    if not isinstance(rules, list):
+        raise BundleError("rules must be a list")
+    for i, entry in enumerate(rules):
+        try:
+            Rule(entry["device"], entry.get("name"), entry.get("path"), entry.get("title"), entry.get("priority", 0))
+        except Exception as e:
+            raise BundleError(f"rules[{i}]: {e}")
+    base = data.get("base_profiles")
+    if base is not None and not (isinstance(base, list) and base and all(isinstance(n, str) and n for n in base)):
+        raise BundleError("base_profiles must be a non-empty list of names")
+    limit = data.get("max_custom_profiles")
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 0):
+        raise BundleError("max_custom_profiles must be a non-negative integer")
+    return data
+
+# -------------------- SOURCES --------------------
+
+def _is_url(source):
+    return source.lower().startswith(("http://", "https://"))
+
+def fetch(source, etag=None, timeout_ms=SYNC_TIMEOUT_MS):
+    """(body bytes, etag) from source, or None when it still matches etag.
+
+    Files use their mtime/size as the tag; HTTP sources get If-None-Match.
+    """
+    if _is_url(source):
+        request = urllib.request.Request(source, headers={"Accept": "application/json"})
+        if etag:
+            request.add_header("If-None-Match", etag)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout_ms / 1000.0) as response:
+                return response.read(), response.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+    stamp = file_stamp(source)
+    if stamp is None:
+        raise FileNotFoundError(f"{source} not found")
+    tag = f"{stamp[0]}-{stamp[1]}"
+    if tag == etag:
+        return None
+    with open(source, "rb") as f:
+        return f.read(), tag
+
+# -------------------- CLIENT --------------------
+
+class SyncClient:
+    """Pulls the fleet bundle on a background thread and merges it into this process.
+
+    The last good bundle is cached on disk with its ETag and version, so an
+    offline start still gets the fleet's rules and limits. Only profiles whose
+    content differs are written, and the active profile is re-reconciled if
+    it was among them; routing never waits on the network.
+    """
+
+    def __init__(self, source=SYNC_SOURCE, cache_path=SYNC_CACHE_FILE, store=profile_store,
+                 rulebook=shared_rulebook, timeout_ms=SYNC_TIMEOUT_MS):
+        self.source = source
+        self.cache_path = cache_path
+        self.store = store
+        self.rulebook = rulebook
+        self.timeout_ms = timeout_ms
+        self._lock = threading.Lock()  # one sync at a time
+        self._cache = None             # {"etag", "version", "fetched_at", "bundle"}
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_error = None
+
+    def add_listener(self, callback):
+        """callback(changed_profile_names) runs on the sync thread after a bundle changes something."""
+        self._listeners.append(callback)
+
+    @property
+    def version(self):
+        return (self._cache or {}).get("version")
+
+    def _load_cache(self):
+        if self._cache is None:
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    cache = json.load(f)
+                self._cache = {**cache, "bundle": validate_bundle(cache.get("bundle"))}
+            except FileNotFoundError:
+                self._cache = {}
+            except Exception as e:
+                logger.warning(f"[SYNC] Ignoring unreadable fleet cache: {e}")
+                self._cache = {}
+        return self._cache
+
+    def apply_cached(self):
+        """Applies the cached bundle (offline start). Returns the changed profile names."""
+        with self._lock:
+            bundle = self._load_cache().get("bundle")
+            if not bundle:
+                return []
+            logger.info(f"[SYNC] Using cached fleet bundle {bundle['version']}.")
+            return self._apply(bundle, bundle)
+
+    def sync_now(self):
+        """One pull-validate-apply pass. Returns a summary dict; never raises for network trouble."""
+        with self._lock:
+            started = time.perf_counter()
+            cache = self._load_cache()
+            previous = cache.get("bundle")
+            status, changed = "unchanged", []
+            try:
+                fetched = fetch(self.source, cache.get("etag"), self.timeout_ms)
+                if fetched is not None:
+                    body, etag = fetched
+                    try:
+                        data = json.loads(body.decode("utf-8-sig"))
+                    except ValueError as e:
+                        raise BundleError(f"not valid JSON: {e}")
+                    bundle = validate_bundle(data)
+                    if previous == bundle:
+                        logger.debug(f"[SYNC] Fleet bundle {bundle['version']} unchanged.")
+                    else:
+                        changed = self._apply(bundle, previous)
+                        status = "updated"
+                    self._cache = {"etag": etag, "version": bundle["version"], "fetched_at": time.time(), "bundle": bundle}
+                    atomic_write_json(self.cache_path, self._cache)
+                self.last_error = None
+                ok = True
+            except BundleError as e:
+                status, ok, self.last_error = "rejected", False, str(e)
+                logger.error(f"[SYNC] Rejected fleet bundle from {self.source}: {e}")
+            except Exception as e:
+                status, ok, self.last_error = "offline", False, str(e)
+                logger.warning(f"[SYNC] {self.source} unreachable; keeping fleet bundle {self.version}: {e}")
+            metrics.observe("fleet_sync", (time.perf_counter() - started) * 1000.0, ok)
+            return {"status": status, "version": self.version, "changed": changed, "error": self.last_error}
+
+    def _apply(self, bundle, previous):
+        """Merges bundle into the running process; previous is the last applied bundle (or None)."""
+        new = bundle.get("profiles", {})
+        old = (previous or {}).get("profiles", {})
+        # Only entries the fleet changed since the last applied bundle, and only where the
+        # local copy still holds the old fleet value, so local edits survive restarts and
+        # new versions. The first bundle has no old values and seeds whatever differs.
+        updates = {}
+        for name, value in new.items():
+            current = self.store.get(name)
+            if current == value:
+                continue
+            if previous is None or (value != old.get(name) and current == old.get(name)):
+                updates[name] = value
+        # Profiles dropped from the fleet go too, unless edited locally since
+        removals = [name for name, value in old.items() if name not in new and self.store.get(name) == value]
+        # Entry-by-entry: with the SQLite store each one is an indexed row operation
+        for name, value in updates.items():
+            self.store.set_entry(name, dict(value) if isinstance(value, dict) else value)
+        for name in removals:
+            self.store.delete_entry(name)
+        changed = sorted(updates) + sorted(removals)
+        rules_changed = self.rulebook.set_fleet_rules(bundle.get("rules", []))
+        set_limits(bundle.get("base_profiles"), bundle.get("max_custom_profiles"))
+        if changed or rules_changed:
+            logger.info(f"[SYNC] Applied fleet bundle {bundle['version']}: "
+                        f"{len(updates)} profiles updated, {len(removals)} removed"
+                        f"{', rules updated' if rules_changed else ''}.")
+            self._reapply_active(changed)
+            for callback in list(self._listeners):
+                try:
+                    callback(changed)
+                except Exception as e:
+                    logger.debug(f"Sync listener error: {e}")
+        return changed
+
+    def _reapply_active(self, changed):
+        from reconcile import get_controller
+        controller = get_controller()
+        active = controller.active_profile()
+        if active in changed and controller.load_profile(active):
+            logger.info(f"[SYNC] Active profile '{active}' changed; reconciling.")
+            controller.reconcile()
+
+    # ---------- Background loop ----------
+    def start(self, interval_ms=SYNC_INTERVAL_MS):
+        """Applies the cache, then syncs now and every interval_ms on a daemon thread."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            try:
+                self.apply_cached()
+            except Exception as e:
+                logger.warning(f"[SYNC] Cached fleet bundle not applied: {e}")
+            while True:
+                try:
+                    self.sync_now()
+                except Exception as e:
+                    logger.debug(f"Sync error: {e}")
+                if interval_ms <= 0 or self._stop.wait(interval_ms / 1000.0):
+                    return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="pebx-sync", daemon=True)
+        self._thread.start()
+        logger.info(f"[SYNC] Fleet sync from {self.source} every {interval_ms // 1000} s.")
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Shared client for SYNC_SOURCE, or None when fleet sync is not configured."""
+    global _client
+    with _client_lock:
+        if _client is None and SYNC_SOURCE:
+            _client = SyncClient()
+        return _client
+
+def start_sync():
+    client = get_client()
+    if client is not None:
+        client.start()
+    return client
@@ -5,6 +5,7 @@ import os
 from PIL import Image, ImageDraw
 import pystray
 from router import is_startup_enabled, enable_startup
+from dispatch import get_dispatcher
 from config import LOGO_TRAY, APP_NAME, logger
 
 ICON_SIZE = 64
@@ -66,6 +67,16 @@ def _tray_worker(app):
         image = _make_icon()
 
     icon = pystray.Icon("pebx", image, APP_NAME, menu)
+
+    def on_dispatch_done(job):
+        # Hover text shows the last hotkey profile switch
+        state = "failed" if job.error is not None else "active"
+        try:
+            icon.title = f"{APP_NAME} — {job.label} {state}"
+        except Exception:
+            pass
+
+    get_dispatcher().add_listener(on_dispatch_done)
     icon.run()
 
 def start_tray(app):
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# fake_svv.py
+# Stand-in for SoundVolumeView.exe on Linux. Keeps a synthetic audio stack in a
+# JSON state file and answers the subset of the command line PebX uses:
+#
+#   fake_svv.py --init STATE [--devices N] [--sessions M]
+#   fake_svv.py /scomma ""          CSV export to stdout
+#   fake_svv.py /scomma FILE        CSV export to FILE
+#   fake_svv.py /SetDefault ID ROLE
+#   fake_svv.py /SetAppDefault ID ROLE TARGET   (TARGET: PID, exe name or full path)
+#   fake_svv.py /Mute Toggle
+#
+# FAKE_SVV_STATE names the state file; FAKE_SVV_LATENCY_MS adds a per-call
+# delay on top of the interpreter start-up to mimic the real tool.
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: concurrent mutations are not serialized
+
+STATE_ENV = "FAKE_SVV_STATE"
+LATENCY_ENV = "FAKE_SVV_LATENCY_MS"
+
+# Same column order as a real SoundVolumeView /scomma export
+COLUMNS = [
+    "Name", "Type", "Direction", "Device Name", "Default", "Default Multimedia",
+    "Default Communications", "Device State", "Muted", "Volume dB", "Volume Percent",
+    "Min Volume dB", "Max Volume dB", "Volume Step", "Channels Count", "Channels dB",
+    "Channels Percent", "Item ID", "Command-Line Friendly ID", "Process Path", "Process ID",
+    "Window Title", "Registry Key", "Speakers Config",
+]
+
+ROLE_COLUMNS = {"0": "Default", "1": "Default Multimedia", "2": "Default Communications"}
+
+def device_id(i):
+    return f"{{0.0.0.00000000}}.{{fake-{i:04d}}}"
+
+def init_state(path, devices, sessions):
+    state = {
+        "devices": [{"name": f"Fake Output {i}", "id": device_id(i)} for i in range(1, devices + 1)],
+        "defaults": {role: device_id(1) for role in ROLE_COLUMNS},
+        "sessions": [{"pid": str(1000 + i), "exe": f"app{i + 1}.exe",
+                      "path": f"C:\\Fake Apps\\app{i + 1}.exe", "device": device_id(1)}
+                     for i in range(sessions)],
+        "muted": False,
+        "calls": 0,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    return state
+
+class StateFile:
+    """Loads the state under an exclusive lock and writes it back on exit if changed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.state = None
+        self.changed = False
+        self._lock = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._lock = open(self.path + ".lock", "w")
+            fcntl.flock(self._lock, fcntl.LOCK_EX)
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.state = json.load(f)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if self.changed:
+                self.state["calls"] += 1
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self.state, f)
+                os.replace(tmp, self.path)
+        finally:
+            if self._lock is not None:
+                fcntl.flock(self._lock, fcntl.LOCK_UN)
+                self._lock.close()
+        return False
+
+def export_csv(state):
+    names = {d["id"]: d["name"] for d in state["devices"]}
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\r\n")
+    writer.writerow(COLUMNS)
+
+    def row(**values):
+        writer.writerow([values.get(column, "") for column in COLUMNS])
+
+    for d in state["devices"]:
+        roles = {ROLE_COLUMNS[r]: "Render" for r, dev in state["defaults"].items() if dev == d["id"]}
+        row(Name="Speakers", Type="Device", Direction="Render", **{"Device Name": d["name"]},
+            **{"Device State": "Active", "Muted": "Yes" if state["muted"] else "No",
+               "Volume dB": "-10.00", "Volume Percent": "50.0%", "Channels Count": "2",
+               "Item ID": d["id"], "Command-Line Friendly ID": f"{d['name']}\\Device\\Speakers\\Render"},
+            **roles)
+    # One capture device, like any real machine: the parser must skip it
+    row(Name="Microphone", Type="Device", Direction="Capture", **{"Device Name": "Fake Input",
+        "Device State": "Active", "Item ID": "{0.0.1.00000000}.{fake-mic}"})
+    for s in state["sessions"]:
+        row(Name=os.path.splitext(s["exe"])[0], Type="Application", Direction="Render",
+            **{"Device Name": names.get(s["device"], ""), "Device State": "Active",
+               "Muted": "No", "Volume Percent": "100.0%",
+               "Item ID": f"{s['device']}|{s['path']}%b{{00000000-0000-0000-0000-{int(s['pid']):012d}}}",
+               "Process Path": s["path"], "Process ID": s["pid"],
+               "Window Title": f"{s['exe']} window"})
+    return out.getvalue()
+
+def matches(session, target):
+    target = target.lower()
+    return target in (session["pid"], session["exe"].lower(), session["path"].lower())
+
+def main(argv):
+    if argv and argv[0] == "--init":
+        parser = argparse.ArgumentParser(prog="fake_svv.py --init")
+        parser.add_argument("state")
+        parser.add_argument("--devices", type=int, default=3)
+        parser.add_argument("--sessions", type=int, default=6)
+        args = parser.parse_args(argv[1:])
+        init_state(args.state, args.devices, args.sessions)
+        return 0
+
+    path = os.environ.get(STATE_ENV)
+    if not path or not argv:
+        sys.stderr.write("usage: FAKE_SVV_STATE=state.json fake_svv.py /command ...\n")
+        return 2
+    latency = float(os.environ.get(LATENCY_ENV, "0") or 0)
+    if latency:
+        time.sleep(latency / 1000.0)
+
+    command, args = argv[0].lower(), argv[1:]
+    with StateFile(path) as store:
+        state = store.state
+        if command == "/scomma":
+            text = export_csv(state)
+            if not args or args[0] == "":
+                # The real tool writes the UTF-8 export with a BOM
+                sys.stdout.buffer.write(("\ufeff" + text).encode("utf-8"))
+            else:
+                with open(args[0], "w", encoding="utf-8-sig", newline="") as f:
+                    f.write(text)
+            return 0
+        if command == "/setdefault" and len(args) >= 2:
+            dev, role = args[0], args[1]
+            if dev not in {d["id"] for d in state["devices"]}:
+                return 1
+            for r in (ROLE_COLUMNS if role.lower() == "all" else [role]):
+                state["defaults"][r] = dev
+            store.changed = True
+            return 0
+        if command == "/setappdefault" and len(args) >= 3:
+            dev, role, target = args[0], args[1], args[2]
+            if dev not in {d["id"] for d in state["devices"]}:
+                return 1
+            hits = [s for s in state["sessions"] if matches(s, target)]
+            for s in hits:
+                s["device"] = dev
+            if target.isdigit():
+                store.changed = bool(hits)
+                return 0 if hits else 1  # no such process
+            # Like Windows, the tool keeps an exe's default even while nothing of it is playing
+            state.setdefault("app_defaults", {})[f"{target.lower()}|{role}"] = dev
+            store.changed = True
+            return 0
+        if command == "/mute":
+            state["muted"] = not state["muted"]
+            store.changed = True
+            return 0
+    sys.stderr.write(f"fake_svv: unsupported command {argv!r}\n")
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# replay_trace.py
+# Replays a session trace (recorded with PEBX_TRACE=1 or "daemon --trace", see
+# audio_router/recorder.py) on any OS against the in-process FakeBackend, at
+# accelerated speed. It drives what PebXGUI wires together, minus Tk:
+# SmartBrain on foreground events, a debounced devices-only rescan on hardware
+# messages and the reconcile drift loop. Reports per-event decision latency and
+# the commands that changed nothing.
+#
+#   python benchmarks/replay_trace.py trace-20261018-101500.jsonl --speed 20
+#   python benchmarks/replay_trace.py --synthetic 300 --latency-ms 25 --output replay.json
+#
+# --speed compresses the gaps between events (and the app's debounce/drift
+# timers with them); backend latency (--latency-ms) stays real time, since
+# that is what the scheduling under test has to absorb.
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.join(os.path.dirname(HERE), "audio_router")
+
+from run_benchmarks import summarize
+
+# -------------------- TRACES --------------------
+
+def load_trace(path):
+    """(meta, events) from a JSON Lines trace; events sorted by time."""
+    meta, events = {}, []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            if event.get("kind") == "meta":
+                meta = event
+            else:
+                events.append(event)
+    events.sort(key=lambda e: e["t"])
+    return meta, events
+
+def synthesize_trace(count, seed=1, devices=3, apps=8):
+    """A plausible workload: alt-tab storms, dwell periods, app restarts, device-change bursts."""
+    rng = random.Random(seed)
+    device_ids = {f"Fake Output {i + 1}": f"{{0.0.0.00000000}}.{{fake-{i + 1:04d}}}" for i in range(devices)}
+    ids = list(device_ids.values())
+    exes = [f"app{i + 1}.exe" for i in range(apps)]
+    # Most apps have a Brain mapping; a few are left unmapped on purpose
+    profiles = {exe: ids[(i % (devices - 1)) + 1] for i, exe in enumerate(exes) if i % 4 != 3}
+    pids = {exe: 1000 + i for i, exe in enumerate(exes)}
+
+    def snapshot(t):
+        return {"t": t, "kind": "snapshot", "devices": device_ids,
+                "defaults": {role: "Fake Output 1" for role in ("0", "1", "2")},
+                "sessions": {f"{exe[:-4]} (PID: {pid})": [exe, str(pid), ids[0]] for exe, pid in pids.items()}}
+
+    t = 0.0
+    events = [snapshot(t)]
+    while len(events) < count:
+        roll = rng.random()
+        if roll < 0.15:
+            # Alt-tab storm: several focus changes a few tens of ms apart
+            for _ in range(rng.randint(3, 7)):
+                t += rng.uniform(0.02, 0.08)
+                exe = rng.choice(exes)
+                events.append({"t": round(t, 4), "kind": "foreground", "pid": str(pids[exe]), "name": exe,
+                               "path": None, "title": None})
+        elif roll < 0.22:
+            # Dock/undock: one burst of hardware messages
+            for _ in range(rng.randint(3, 6)):
+                t += rng.uniform(0.005, 0.05)
+                events.append({"t": round(t, 4), "kind": "device_change"})
+        elif roll < 0.27:
+            # An app restarts: new PID, session back on the default device
+            exe = rng.choice(exes)
+            pids[exe] += 100
+            t += rng.uniform(0.1, 1.0)
+            events.append(snapshot(round(t, 4)))
+        else:
+            t += rng.uniform(0.3, 4.0)
+            exe = rng.choice(exes)
+            events.append({"t": round(t, 4), "kind": "foreground", "pid": str(pids[exe]), "name": exe,
+                           "path": None, "title": None})
+    return {"kind": "meta", "version": 1, "profiles": profiles, "rules": []}, events[:count]
+
+# -------------------- REPLAY --------------------
+
+def replay(meta, events, speed, latency_ms):
+    import config
+    import router
+    from backends import FakeBackend
+    from brain import SmartBrain
+    from foreground import ProcessInfo
+    from reconcile import ReconcileController
+    from storage import Debouncer, atomic_write_json
+
+    # The recorded machine's profiles and rules, not whatever is on this one
+    atomic_write_json(config.PROFILES_FILE, meta.get("profiles", {}), hidden=False)
+    atomic_write_json(config.RULES_FILE, {"version": 1, "rules": meta.get("rules", [])}, hidden=False)
+
+    backend = FakeBackend(0, 0, latency_ms)
+    first = next((e for e in events if e["kind"] == "snapshot"), None)
+    if first is not None:
+        backend.sync_world(first["devices"], first["defaults"], first["sessions"], initial=True)
+    else:
+        backend = FakeBackend(3, 6, latency_ms)
+    router.set_backend(backend)
+
+    records = {}  # id(ProcessInfo) -> per-event record
+    lock = threading.Lock()
+    last_activity = [time.perf_counter()]
+
+    def on_decision(info, outcome, device_id, latency):
+        with lock:
+            record = records.get(id(info))
+            if record is not None:
+                record.update(outcome=outcome, device=device_id, latency_ms=round(latency, 3))
+            last_activity[0] = time.perf_counter()
+
+    controller = ReconcileController()
+    brain = SmartBrain(controller=controller, on_decision=on_decision)
+    brain.set_enabled(True)
+    controller.start(interval_ms=config.DRIFT_CHECK_INTERVAL_MS / speed,
+                     watch_ms=config.SESSION_WATCH_INTERVAL_MS / speed)
+    rescans = [0]
+
+    def rescan():
+        rescans[0] += 1
+        router.get_snapshot(max_age_ms=0)
+
+    device_change = Debouncer(config.DEVICE_CHANGE_QUIET_MS / speed, rescan, name="replay-devchange",
+                              max_delay_ms=config.DEVICE_CHANGE_MAX_DELAY_MS / speed)
+
+    recorded_commands = 0
+    per_event = []
+    infos = []  # keep every ProcessInfo alive so id() stays unique
+    started = time.perf_counter()
+    for event in events:
+        delay = started + event["t"] / speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        kind = event["kind"]
+        if kind == "foreground":
+            info = ProcessInfo(event.get("pid"), event["name"], event.get("path"), title=event.get("title"))
+            record = {"t": event["t"], "name": event["name"], "outcome": "superseded",
+                      "device": None, "latency_ms": None}
+            with lock:
+                records[id(info)] = record
+                last_activity[0] = time.perf_counter()
+            infos.append(info)
+            per_event.append(record)
+            brain.on_foreground(info)
+        elif kind == "device_change":
+            device_change.trigger()
+        elif kind == "snapshot":
+            backend.sync_world(event["devices"], event["defaults"], event["sessions"])
+        elif kind == "command":
+            recorded_commands += 1
+
+    # Let the Brain and any pending rescan finish before counting
+    device_change.flush()
+    while time.perf_counter() - last_activity[0] < 0.5:
+        time.sleep(0.05)
+    controller.stop()
+    brain.set_enabled(False)
+    wall_s = time.perf_counter() - started
+
+    commands = [c for c in backend.calls if c[0] != "scan"]
+    decided = [r["latency_ms"] for r in per_event if r["latency_ms"] is not None]
+    routed = [r["latency_ms"] for r in per_event if r["outcome"] == "routed"]
+    outcomes = {}
+    for r in per_event:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    summary = {
+        "events": len(events),
+        "foreground_events": len(per_event),
+        "outcomes": outcomes,
+        "decision_latency": summarize(decided) if decided else None,
+        "route_latency": summarize(routed) if routed else None,
+        "commands": len(commands),
+        "redundant_commands": backend.redundant,
+        "recorded_commands": recorded_commands,
+        "scans": len(backend.calls) - len(commands),
+        "device_rescans": rescans[0],
+        "trace_s": round(events[-1]["t"], 3) if events else 0.0,
+        "wall_s": round(wall_s, 3),
+    }
+    return summary, per_event
+
+# -------------------- REPORT --------------------
+
+def print_summary(summary):
+    print(f"{summary['events']} events ({summary['trace_s']} s of trace) replayed in {summary['wall_s']} s")
+    print("foreground events: " + ", ".join(f"{n} {k}" for k, n in sorted(summary["outcomes"].items())))
+    for name in ("decision_latency", "route_latency"):
+        stats = summary[name]
+        if stats:
+            print(f"{name:<18} median {stats['median_ms']:>8.2f} ms   p95 {stats['p95_ms']:>8.2f} ms   "
+                  f"max {stats['max_ms']:>8.2f} ms   n {stats['n']}")
+    print(f"routing commands   {summary['commands']} issued, {summary['redundant_commands']} redundant"
+          + (f" (trace recorded {summary['recorded_commands']})" if summary["recorded_commands"] else ""))
+    print(f"scans              {summary['scans']} ({summary['device_rescans']} device-change rescans)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a PebX session trace against the fake backend.")
+    parser.add_argument("trace", nargs="?", help="JSON Lines trace from the recorder")
+    parser.add_argument("--synthetic", type=int, metavar="EVENTS", help="replay a generated workload instead")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-trace", help="write the generated workload here (JSON Lines)")
+    parser.add_argument("--speed", type=float, default=10.0, help="time compression factor (default 10)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay per backend call (real time)")
+    parser.add_argument("--output", help="write the summary and per-event results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's console logging")
+    args = parser.parse_args()
+    if not args.trace and not args.synthetic:
+        parser.error("give a trace file or --synthetic EVENTS")
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    if args.trace:
+        meta, events = load_trace(args.trace)
+    else:
+        meta, events = synthesize_trace(args.synthetic, args.seed)
+        if args.save_trace:
+            with open(args.save_trace, "w", encoding="utf-8") as f:
+                for line in [meta] + events:
+                    f.write(json.dumps(line) + "\n")
+
+    workdir = tempfile.mkdtemp(prefix="pebx-replay-")
+    os.environ["APPDATA"] = workdir
+    os.environ["PEBX_AUDIO_BACKEND"] = "fake"
+    os.environ["PEBX_PROFILE_STORE"] = "json"
+    os.environ.pop("PEBX_TRACE", None)
+    os.environ.pop("PEBX_SYNC_SOURCE", None)
+    sys.path.insert(0, PACKAGE_DIR)
+    import config
+    config.setup_logging(console=args.verbose)
+
+    summary, per_event = replay(meta, events, args.speed, args.latency_ms)
+    summary.update(speed=args.speed, latency_ms=args.latency_ms, source=args.trace or f"synthetic:{args.seed}")
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "events": per_event}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# run_benchmarks.py
+# Times the hot paths of PebX on any OS against a stand-in SoundVolumeView
+# (fake_svv.py, spawned per command exactly like the real tool) or the
+# in-process FakeBackend, and writes the results as JSON.
+#
+#   python benchmarks/run_benchmarks.py --devices 4 --sessions 20 --latency-ms 15
+#   python benchmarks/run_benchmarks.py --output new.json --compare old.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.join(os.path.dirname(HERE), "audio_router")
+FAKE_SVV = os.path.join(HERE, "fake_svv.py")
+
+# -------------------- HELPERS --------------------
+
+def summarize(samples, **extra):
+    ordered = sorted(samples)
+    result = {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "min_ms": round(ordered[0], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+    result.update(extra)
+    return result
+
+def timed(func, repeat):
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return samples
+
+def make_fake_svv(workdir, devices, sessions, latency_ms):
+    """Initializes the fake's state and returns an executable path that runs it."""
+    state = os.path.join(workdir, "fake_svv_state.json")
+    os.environ["FAKE_SVV_STATE"] = state
+    os.environ["FAKE_SVV_LATENCY_MS"] = str(latency_ms)
+    sys.path.insert(0, HERE)
+    import fake_svv
+    fake_svv.init_state(state, devices, sessions)
+    if os.name == "nt":
+        launcher = os.path.join(workdir, "SoundVolumeView.cmd")
+        with open(launcher, "w") as f:
+            f.write(f'@"{sys.executable}" "{FAKE_SVV}" %*\n')
+    else:
+        launcher = os.path.join(workdir, "SoundVolumeView")
+        with open(launcher, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_SVV}" "$@"\n')
+        os.chmod(launcher, 0o755)
+    return launcher
+
+# -------------------- BENCHMARKS --------------------
+
+def bench_scans(router, repeat):
+    results = {}
+    results["scan_output_devices"] = summarize(timed(lambda i: router.scan_output_devices(max_age_ms=0), repeat))
+    results["scan_audio_apps"] = summarize(timed(lambda i: router.scan_audio_apps(max_age_ms=0), repeat))
+    return results
+
+def bench_apply_profile(router, repeat):
+    from reconcile import ReconcileController
+    from profiles import store
+    snapshot = router.get_snapshot(max_age_ms=0)
+    device_ids = list(snapshot.devices.values())
+    exes = sorted({exe for exe, _ in snapshot.sessions.values()})
+    if len(device_ids) < 2 or not exes:
+        return {}
+    store.replace({
+        "BenchA": {exe: device_ids[0] for exe in exes},
+        "BenchB": {exe: device_ids[1] for exe in exes},
+    })
+    controller = ReconcileController()
+    commands = []
+
+    def switch(i):
+        report = controller.apply_profile("BenchB" if i % 2 == 0 else "BenchA")
+        commands.append(len(report.results) if report else 0)
+
+    controller.apply_profile("BenchA")
+    switching = timed(switch, repeat)
+    # Re-applying the active profile: reconcile should find nothing to do
+    no_op = timed(lambda i: controller.apply_profile("BenchA" if repeat % 2 == 0 else "BenchB"), repeat)
+    return {
+        "apply_profile": summarize(switching, apps=len(exes), commands_mean=round(statistics.fmean(commands), 1)),
+        "apply_profile_unchanged": summarize(no_op, apps=len(exes)),
+    }
+
+def bench_brain(router, repeat):
+    from brain import SmartBrain
+    from foreground import ProcessInfo
+    from reconcile import ReconcileController
+    snapshot = router.get_snapshot(max_age_ms=0)
+    device_ids = list(snapshot.devices.values())
+    if len(device_ids) < 2 or not snapshot.sessions:
+        return {}
+    exe, pid = next(iter(snapshot.sessions.values()))
+    target = {"device": device_ids[1]}
+    routed = threading.Event()
+    brain = SmartBrain(controller=ReconcileController(), lookup=lambda info: target["device"],
+                       on_route=lambda info, device_id: routed.set())
+    brain.set_enabled(True)
+    latencies = []
+    for i in range(repeat):
+        # Alternate devices so every focus change has real work to do
+        target["device"] = device_ids[(i + 1) % 2]
+        routed.clear()
+        brain.on_foreground(ProcessInfo(int(pid), exe), force=True)
+        if routed.wait(30.0):
+            latencies.append(brain.last_latency_ms)
+    brain.set_enabled(False)
+    if not latencies:
+        return {}
+    return {"brain_focus_to_route": summarize(latencies)}
+
+def bench_live_log(repeat):
+    import config
+    from config import live_log, read_recent_log, LIVE_REPORT_LINES, LOG_FLUSH_INTERVAL_MS
+    bench_logger = config.logger
+    seq = live_log.since(0)[1]
+    updates = []
+    for i in range(repeat):
+        for n in range(LIVE_REPORT_LINES):
+            bench_logger.info(f"[BENCH] live report line {i}:{n}")
+        started = time.perf_counter()
+        # What PebXGUI._update_live_reports/_render_live_reports do, minus Tk itself
+        lines, seq, missed = live_log.since(seq)
+        text = "".join(line + "\n" for line in lines[-LIVE_REPORT_LINES:])
+        updates.append((time.perf_counter() - started) * 1000.0)
+    time.sleep(2 * LOG_FLUSH_INTERVAL_MS / 1000.0)  # let the batching writer reach the segments
+    history = timed(lambda i: read_recent_log(), repeat)
+    emit = timed(lambda i: bench_logger.debug(f"[BENCH] emit {i}"), repeat * 20)
+    return {
+        "live_log_update": summarize(updates, lines=LIVE_REPORT_LINES, chars=len(text)),
+        "live_log_history": summarize(history),
+        "log_emit": summarize(emit),
+    }
+
+# -------------------- REPORT --------------------
+
+def print_table(results, baseline=None):
+    print(f"{'benchmark':<26}{'median ms':>12}{'p95 ms':>12}{'n':>6}" + ("   vs baseline" if baseline else ""))
+    for name, stats in results.items():
+        line = f"{name:<26}{stats['median_ms']:>12.3f}{stats['p95_ms']:>12.3f}{stats['n']:>6}"
+        old = (baseline or {}).get(name)
+        if old and old.get("median_ms"):
+            change = (stats["median_ms"] - old["median_ms"]) / old["median_ms"] * 100.0
+            line += f"   {change:+.1f}%"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="PebX performance benchmarks (no Windows audio stack needed).")
+    parser.add_argument("--backend", choices=("svv", "fake"), default="svv",
+                        help="svv spawns fake_svv.py per command; fake runs the in-process FakeBackend")
+    parser.add_argument("--devices", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="extra delay per backend call")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to diff medians against")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's console logging")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pebx-bench-")
+    # config.py keeps profiles, state and logs under %APPDATA%: point it at the scratch dir
+    os.environ["APPDATA"] = workdir
+    os.environ["PEBX_AUDIO_BACKEND"] = "fake"
+    sys.path.insert(0, PACKAGE_DIR)
+    import config
+    import router
+    from backends import FakeBackend, SoundVolumeViewBackend
+    from metrics import metrics
+
+    config.setup_logging(console=args.verbose)
+
+    if args.backend == "svv":
+        launcher = make_fake_svv(workdir, args.devices, args.sessions, args.latency_ms)
+        router.set_backend(SoundVolumeViewBackend(exe_path=launcher, csv_path=os.path.join(workdir, "devices.csv")))
+    else:
+        router.set_backend(FakeBackend(args.devices, args.sessions, args.latency_ms))
+
+    results = {}
+    started = time.perf_counter()
+    results.update(bench_scans(router, args.repeat))
+    results.update(bench_apply_profile(router, args.repeat))
+    results.update(bench_brain(router, args.repeat))
+    results.update(bench_live_log(args.repeat))
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "devices": args.devices,
+            "sessions": args.sessions,
+            "latency_ms": args.latency_ms,
+            "repeat": args.repeat,
+            "wall_s": round(time.perf_counter() - started, 2),
+        },
+        "benchmarks": results,
+        "metrics": metrics.snapshot(),  # in-app counters/histograms gathered during the run
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("benchmarks", {})
+    print_table(results, baseline)
+    print(f"\nResults written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
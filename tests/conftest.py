@@ -0,0 +1,26 @@
+# conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# config.py picks its data directory at import time: keep test runs out of the real AppData
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="pebx-tests-")
+# The app uses flat imports (from config import ...), as when run from its own folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "audio_router"))
+
+@pytest.fixture
+def backend():
+    """A FakeBackend with three devices and no sessions, installed as the router's backend."""
+    import router
+    from backends import FakeBackend
+    previous = router._backend
+    fake = FakeBackend(device_count=3, session_count=0)
+    router.set_backend(fake)
+    yield fake
+    router.set_backend(previous)
+
+@pytest.fixture
+def device_ids(backend):
+    return list(backend.devices.values())
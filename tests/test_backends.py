@@ -0,0 +1,75 @@
+# test_backends.py
+from backends import AudioSnapshot, diff_sessions, parse_svv_csv
+
+SPEAKERS = "{0.0.0.00000000}.{aaaa}"
+HEADSET = "{0.0.0.00000000}.{bbbb}"
+
+# Columns in SoundVolumeView's order, plus ones the parser must skip
+CSV = "\r\n".join([
+    "Name,Type,Direction,Device Name,Default,Default Multimedia,Default Communications,"
+    "Device State,Item ID,Process ID,Process Path",
+    f"Speakers,Device,Render,Realtek Speakers,Render,Render,,Active,{SPEAKERS},,",
+    f"Headset,Device,Render,USB Headset,,,Render,Active,{HEADSET},,",
+    "Microphone,Device,Capture,USB Mic,Capture,Capture,Capture,Active,{0.0.0.00000000}.{cccc},,",
+    f"Discord,Application,Render,USB Headset,,,,Active,{HEADSET}|C:\\Apps\\Discord.exe%b{{1}},4242,"
+    "C:\\Apps\\Discord.exe",
+    "Brave,Application,Render,Realtek Speakers,,,,Active,,77,",
+    "System Sounds,Application,Render,Realtek Speakers,,,,Active,x|y,0,",
+    "",
+])
+
+def test_parse_render_devices_and_roles():
+    devices, _ = parse_svv_csv(CSV)
+    assert [(d.name, d.device_id, d.roles) for d in devices] == [
+        ("Realtek Speakers", SPEAKERS, ("0", "1")),
+        ("USB Headset", HEADSET, ("2",)),
+    ]
+
+def test_parse_sessions():
+    _, sessions = parse_svv_csv(CSV)
+    discord, brave = sessions
+    assert (discord.label, discord.exe, discord.pid) == ("Discord (PID: 4242)", "Discord.exe", "4242")
+    assert discord.device_id == HEADSET  # endpoint half of the session Item ID
+    assert discord.path == "C:\\Apps\\Discord.exe"
+    # No path and no Item ID: exe falls back to the name, device to the Device Name column
+    assert (brave.exe, brave.device_id, brave.path) == ("Brave", SPEAKERS, None)
+
+def test_parse_empty_and_header_only():
+    assert parse_svv_csv("") == ([], [])
+    assert parse_svv_csv(CSV.split("\r\n")[0]) == ([], [])
+
+def test_snapshot_from_parsed_records():
+    snap = AudioSnapshot.from_records(*parse_svv_csv(CSV), generation=1)
+    assert snap.devices == {"Realtek Speakers": SPEAKERS, "USB Headset": HEADSET}
+    assert snap.defaults == {"0": "Realtek Speakers", "1": "Realtek Speakers", "2": "USB Headset"}
+    assert snap.default_device == "Realtek Speakers"
+    assert snap.sessions_for_exe("discord.exe") == {"4242": HEADSET}
+
+# -------------------- SESSION DELTAS --------------------
+
+def make_snapshot(sessions, generation):
+    """sessions: pid -> (exe name, device id)."""
+    labels = {f"{exe} (PID: {pid})": (exe, pid, dev) for pid, (exe, dev) in sessions.items()}
+    return AudioSnapshot({}, {}, None, {label: (exe, pid) for label, (exe, pid, _) in labels.items()},
+                         {label: dev for label, (_, _, dev) in labels.items()}, generation)
+
+def test_diff_from_nothing_is_initial():
+    new = make_snapshot({"1": ("a.exe", SPEAKERS)}, 1)
+    delta = diff_sessions(None, new)
+    assert delta.initial
+    assert delta.appeared == {"a.exe (PID: 1)": ("a.exe", "1")}
+
+def test_diff_reports_appeared_disappeared_and_moved():
+    old = make_snapshot({"1": ("a.exe", SPEAKERS), "2": ("b.exe", SPEAKERS)}, 1)
+    new = make_snapshot({"2": ("b.exe", HEADSET), "3": ("c.exe", SPEAKERS)}, 2)
+    delta = diff_sessions(old, new)
+    assert not delta.initial and delta.generation == 2
+    assert delta.appeared == {"c.exe (PID: 3)": ("c.exe", "3")}
+    assert delta.disappeared == {"a.exe (PID: 1)": ("a.exe", "1")}
+    assert delta.changed == {"b.exe (PID: 2)": (SPEAKERS, HEADSET)}
+    assert delta.membership_changed
+
+def test_diff_of_identical_snapshots_is_empty():
+    old = make_snapshot({"1": ("a.exe", SPEAKERS)}, 1)
+    delta = diff_sessions(old, make_snapshot({"1": ("a.exe", SPEAKERS)}, 2))
+    assert not delta and not delta.membership_changed
@@ -0,0 +1,69 @@
+# test_brain.py
+import queue
+
+import pytest
+
+from brain import SmartBrain
+from foreground import FakeForegroundSource
+from reconcile import ReconcileController
+from router import get_snapshot
+
+@pytest.fixture
+def brain(backend, device_ids):
+    """A Brain fed by a FakeForegroundSource; yields (source, brain, decision queue)."""
+    decisions = queue.Queue()
+    mappings = {"game.exe": device_ids[2], "discord.exe": device_ids[1]}
+    smart = SmartBrain(ReconcileController(snapshot_max_age_ms=0),
+                       lookup=lambda info: mappings.get(info.name),
+                       on_decision=lambda info, outcome, device_id, latency_ms: decisions.put((info.name, outcome)))
+    source = FakeForegroundSource()
+    source.start(smart.on_foreground)
+    smart.set_enabled(True)
+    yield source, smart, decisions
+    smart.set_enabled(False)
+    source.stop()
+
+def test_focus_routes_the_app(backend, device_ids, brain):
+    source, smart, decisions = brain
+    backend.add_session("game.exe", 1, device_ids[0])
+    get_snapshot(max_age_ms=0)
+    source.emit("game.exe", pid=1)
+    assert decisions.get(timeout=2) == ("game.exe", "routed")
+    assert backend.sessions["1"][1] == device_ids[2]
+    assert smart.controller.desired() == {}  # a one-off route, not desired state
+
+def test_focus_path_never_scans(backend, device_ids, brain):
+    source, _, decisions = brain
+    backend.add_session("game.exe", 1, device_ids[0])
+    get_snapshot(max_age_ms=0)
+    scans = backend.calls.count(("scan",))
+    source.emit("game.exe", pid=1)
+    source.emit("discord.exe", pid=2)
+    source.emit("notepad.exe", pid=3)
+    # A burst collapses to the latest focus, so earlier events may never reach a decision
+    name, outcome = decisions.get(timeout=2)
+    while name != "notepad.exe":
+        name, outcome = decisions.get(timeout=2)
+    assert outcome == "no_rule"
+    assert backend.calls.count(("scan",)) == scans
+
+def test_refocusing_the_same_app_does_nothing(backend, device_ids, brain):
+    source, _, decisions = brain
+    backend.add_session("game.exe", 1, device_ids[0])
+    get_snapshot(max_age_ms=0)
+    source.emit("game.exe", pid=1)
+    assert decisions.get(timeout=2) == ("game.exe", "routed")
+    commands = len(backend.calls)
+    source.emit("game.exe", pid=11)  # another window of the same app
+    assert decisions.get(timeout=2) == ("game.exe", "unchanged")
+    assert len(backend.calls) == commands
+
+def test_disabled_brain_ignores_focus(backend, device_ids, brain):
+    source, smart, decisions = brain
+    smart.set_enabled(False)
+    backend.add_session("game.exe", 1, device_ids[0])
+    source.emit("game.exe", pid=1)
+    with pytest.raises(queue.Empty):
+        decisions.get(timeout=0.2)
+    assert smart.last_exe == "game.exe"
+    assert backend.sessions["1"][1] == device_ids[0]
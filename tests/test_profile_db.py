@@ -0,0 +1,64 @@
+# test_profile_db.py
+import json
+
+import pytest
+
+from profile_db import SQLiteProfileStore
+
+PROFILES = {
+    "Gaming": {"discord.exe": "headset", "game.exe": "speakers"},
+    "chrome.exe": "speakers",
+    "Work": {"teams.exe": "headset"},
+}
+
+@pytest.fixture
+def store(tmp_path):
+    legacy = tmp_path / "profiles.json"
+    legacy.write_text(json.dumps(PROFILES))
+    return SQLiteProfileStore(str(tmp_path / "profiles.db"), str(legacy))
+
+@pytest.fixture
+def writes(store, monkeypatch):
+    """Names mutate() wrote (put) or deleted (remove), in order."""
+    log = []
+    put, remove = store._put, store._remove
+    monkeypatch.setattr(store, "_put", lambda name, *args: (log.append(("put", name)), put(name, *args))[1])
+    monkeypatch.setattr(store, "_remove", lambda name: (log.append(("remove", name)), remove(name))[1])
+    return log
+
+def test_legacy_json_is_imported_in_order(store):
+    assert store.snapshot() == PROFILES
+    assert list(store.snapshot()) == list(PROFILES)
+    assert store.profile_names() == ["Gaming", "Work"]
+    assert store.app_rule("CHROME.EXE") == "speakers"
+
+def test_mutate_writes_only_changed_entries(store, writes):
+    def edit(profiles):
+        profiles["Gaming"]["discord.exe"] = "speakers"
+        return "result"
+    assert store.mutate(edit) == "result"
+    assert [w for w in writes if w[0] == "put"] == [("put", "Gaming")]
+    assert store.get("Gaming") == {"discord.exe": "speakers", "game.exe": "speakers"}
+    assert list(store.snapshot()) == list(PROFILES)  # edited entry keeps its position
+
+def test_mutate_removes_and_adds(store, writes):
+    def edit(profiles):
+        del profiles["chrome.exe"]
+        profiles["Meeting"] = {"zoom.exe": "headset"}
+    store.mutate(edit)
+    assert writes[0] == ("remove", "chrome.exe")
+    assert [w for w in writes if w[0] == "put"] == [("put", "Meeting")]
+    assert list(store.snapshot()) == ["Gaming", "Work", "Meeting"]
+
+def test_mutate_without_changes_writes_nothing(store, writes):
+    store.mutate(lambda profiles: None)
+    assert writes == []
+    assert store.snapshot() == PROFILES
+
+def test_failed_mutate_leaves_the_store_untouched(store):
+    def edit(profiles):
+        profiles["Gaming"]["discord.exe"] = "speakers"
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        store.mutate(edit)
+    assert store.snapshot() == PROFILES
@@ -0,0 +1,115 @@
+# test_reconcile.py
+import pytest
+
+from reconcile import ReconcileController, plan_routes
+from router import get_snapshot
+
+def snapshot():
+    return get_snapshot(max_age_ms=0)
+
+# -------------------- PLANNER --------------------
+
+def test_plan_skips_routes_already_in_place(backend, device_ids):
+    backend.add_session("discord.exe", 1, device_ids[1])
+    backend.add_session("discord.exe", 2, device_ids[1])
+    assert plan_routes({"discord.exe": device_ids[1]}, snapshot()) == []
+
+def test_plan_routes_exe_when_any_session_drifted(backend, device_ids):
+    backend.add_session("discord.exe", 1, device_ids[1])
+    backend.add_session("discord.exe", 2, device_ids[0])
+    assert plan_routes({"discord.exe": device_ids[1]}, snapshot()) == [(device_ids[1], "discord.exe")]
+
+def test_plan_matches_exe_names_case_insensitively(backend, device_ids):
+    backend.add_session("Discord.exe", 1, device_ids[0])
+    assert plan_routes({"discord.exe": device_ids[1]}, snapshot()) == [(device_ids[1], "discord.exe")]
+
+def test_plan_skips_absent_exe_unless_listed(backend, device_ids):
+    desired = {"game.exe": device_ids[2]}
+    assert plan_routes(desired, snapshot()) == []
+    assert plan_routes(desired, snapshot(), absent={"game.exe"}) == [(device_ids[2], "game.exe")]
+
+def test_plan_skips_pid_without_session(backend, device_ids):
+    backend.add_session("brave.exe", 1, device_ids[0])
+    assert plan_routes({"99": device_ids[1]}, snapshot(), absent={"99"}) == []
+    assert plan_routes({"1": device_ids[1]}, snapshot()) == [(device_ids[1], "1")]
+
+def test_plan_routes_free_sessions_one_by_one_beside_a_pin(backend, device_ids):
+    for pid in (1, 2, 3):
+        backend.add_session("brave.exe", pid, device_ids[0])
+    desired = {"brave.exe": device_ids[1], "2": device_ids[2]}
+    assert sorted(plan_routes(desired, snapshot())) == sorted(
+        [(device_ids[1], "1"), (device_ids[1], "3"), (device_ids[2], "2")])
+
+# -------------------- CONTROLLER --------------------
+
+@pytest.fixture
+def controller():
+    return ReconcileController(snapshot_max_age_ms=0)
+
+def test_reconcile_issues_nothing_without_drift(backend, device_ids, controller):
+    backend.add_session("discord.exe", 1, device_ids[1])
+    controller.set_route("discord.exe", device_ids[1])
+    assert controller.reconcile() is None
+    assert not [call for call in backend.calls if call[0] == "set_app"]
+
+def test_reconcile_corrects_drift(backend, device_ids, controller):
+    backend.add_session("discord.exe", 1, device_ids[0])
+    controller.set_route("discord.exe", device_ids[1])
+    report = controller.reconcile()
+    assert report.ok
+    assert backend.sessions["1"][1] == device_ids[1]
+    assert controller.reconcile() is None
+
+def test_route_session_leaves_other_instances(backend, device_ids, controller):
+    backend.add_session("brave.exe", 1, device_ids[0])
+    backend.add_session("brave.exe", 2, device_ids[0])
+    controller.route_session(1, "brave.exe", device_ids[1])
+    assert backend.sessions["1"][1] == device_ids[1]
+    assert backend.sessions["2"][1] == device_ids[0]
+
+def test_session_routes_restore_the_same_pins(backend, device_ids, controller):
+    backend.add_session("brave.exe", 1, device_ids[0])
+    backend.add_session("brave.exe", 2, device_ids[0])
+    controller.route_session(1, "brave.exe", device_ids[1])
+    saved = controller.session_routes()
+    assert saved == {"brave.exe": {"follow": device_ids[1], "pids": {"1": device_ids[1]}}}
+
+    backend.sessions["1"][1] = device_ids[0]  # drifted while nothing was running
+    restored = ReconcileController(snapshot_max_age_ms=0)
+    assert restored.restore_session_routes(saved, snapshot()) == 2
+    restored.reconcile()
+    assert backend.sessions["1"][1] == device_ids[1]
+    assert backend.sessions["2"][1] == device_ids[0]
+
+def test_session_routes_follow_a_restarted_app(backend, device_ids, controller):
+    saved = {"brave.exe": {"follow": device_ids[1], "pids": {"1": device_ids[1]}}}
+    backend.add_session("brave.exe", 7, device_ids[0])
+    backend.add_session("brave.exe", 8, device_ids[0])
+    controller.restore_session_routes(saved, snapshot())
+    controller.reconcile()
+    assert backend.sessions["7"][1] == backend.sessions["8"][1] == device_ids[1]
+
+def test_set_route_drops_pins(backend, device_ids, controller):
+    backend.add_session("brave.exe", 1, device_ids[0])
+    controller.route_session(1, "brave.exe", device_ids[1])
+    controller.set_route("brave.exe", device_ids[2])
+    assert controller.session_routes() == {}
+    assert controller.desired() == {"brave.exe": device_ids[2]}
+
+def test_route_transient_stays_out_of_desired_state(backend, device_ids, controller):
+    backend.add_session("game.exe", 1, device_ids[0])
+    snapshot()  # the Brain works from the latest scan
+    report = controller.route_transient("game.exe", device_ids[2])
+    assert report.ok
+    assert backend.sessions["1"][1] == device_ids[2]
+    assert controller.desired() == {}
+    # A later hand move is not fought by drift correction
+    backend.sessions["1"][1] = device_ids[0]
+    assert controller.reconcile() is None
+
+def test_route_transient_skips_a_route_already_in_place(backend, device_ids, controller):
+    backend.add_session("game.exe", 1, device_ids[2])
+    snapshot()
+    scans = backend.calls.count(("scan",))
+    assert controller.route_transient("game.exe", device_ids[2]) is None
+    assert backend.calls.count(("scan",)) == scans
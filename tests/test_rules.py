@@ -0,0 +1,111 @@
+# test_rules.py
+import json
+
+import pytest
+
+from foreground import ProcessInfo
+from rules import Rule, RuleBook, RuleEngine, parse_rules
+
+def engine(*entries):
+    return RuleEngine(parse_rules(entries))
+
+# -------------------- MATCHING --------------------
+
+def test_exact_name_is_case_insensitive():
+    rules = engine({"name": "Discord.exe", "device": "headset"})
+    assert rules.match("DISCORD.EXE").device == "headset"
+    assert rules.match("discord2.exe") is None
+
+def test_glob_name():
+    rules = engine({"name": "discord*.exe", "device": "headset"})
+    assert rules.match("DiscordCanary.exe").device == "headset"
+    assert rules.match("slack.exe") is None
+
+def test_path_prefix_normalises_separators_and_case():
+    rules = engine({"path": "C:/Games/", "device": "speakers"})
+    assert rules.match("game.exe", "c:\\games\\doom\\game.exe").device == "speakers"
+    assert rules.match("game.exe", "D:\\Games\\game.exe") is None
+    assert rules.match("game.exe") is None
+
+def test_every_condition_must_match():
+    rules = engine({"name": "chrome.exe", "title": "(?i)meet|zoom", "device": "headset"})
+    assert rules.match("chrome.exe", title="Weekly sync - Google Meet").device == "headset"
+    assert rules.match("chrome.exe", title="News") is None
+    assert rules.match("chrome.exe") is None
+
+def test_specificity_breaks_priority_ties():
+    rules = engine(
+        {"title": "Game", "device": "title"},
+        {"name": "*.exe", "device": "glob"},
+        {"path": "C:\\Games\\", "device": "path"},
+        {"name": "doom.exe", "device": "exact"},
+    )
+    assert rules.match("doom.exe", "C:\\Games\\doom.exe", "Game").device == "exact"
+    assert rules.match("quake.exe", "C:\\Games\\quake.exe", "Game").device == "path"
+    assert rules.match("quake.exe", "D:\\quake.exe", "Game").device == "glob"
+    assert rules.match("quake", title="Game").device == "title"
+
+def test_priority_beats_specificity_and_file_order_breaks_ties():
+    rules = engine(
+        {"name": "doom.exe", "device": "exact"},
+        {"name": "*.exe", "device": "first glob", "priority": 5},
+        {"name": "d*.exe", "device": "second glob", "priority": 5},
+    )
+    assert rules.match("doom.exe").device == "first glob"
+
+def test_nested_path_rules_rank_by_priority_then_file_order():
+    rules = engine({"path": "C:\\Games\\", "device": "games"},
+                   {"path": "C:\\Games\\Steam\\", "device": "steam"})
+    assert rules.match("x.exe", "C:\\Games\\Steam\\x.exe").device == "games"  # file order
+    rules = engine({"path": "C:\\Games\\", "device": "games"},
+                   {"path": "C:\\Games\\Steam\\", "device": "steam", "priority": 1})
+    assert rules.match("x.exe", "C:\\Games\\Steam\\x.exe").device == "steam"
+
+def test_title_is_left_out_of_the_cache_key_when_no_rule_reads_it():
+    rules = engine({"name": "chrome.exe", "device": "headset"})
+    for i in range(50):
+        rules.match("chrome.exe", title=f"Tab {i}")
+    assert len(rules._cache) == 1
+
+def test_invalid_rules_are_skipped():
+    rules = parse_rules([{"device": "x"}, {"name": "ok.exe", "device": "y"}, {"name": "bad.exe"}])
+    assert [(r.name, r.order) for r in rules] == [("ok.exe", 1)]
+    with pytest.raises(ValueError):
+        Rule("x")
+
+# -------------------- RULE BOOK --------------------
+
+class MappingStore:
+    """Stands in for the profile store's Brain "exe -> device" mappings."""
+
+    def __init__(self, mappings):
+        self.mappings = {exe.lower(): device for exe, device in mappings.items()}
+
+    def app_rule(self, exe):
+        return self.mappings.get(exe.lower())
+
+def test_rulebook_ranks_mappings_after_rules_files(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"version": 1, "rules": [
+        {"name": "discord.exe", "device": "rule"},
+        {"name": "*.exe", "device": "glob"},
+    ]}))
+    book = RuleBook(str(path), MappingStore({"discord.exe": "mapping", "slack.exe": "mapping"}))
+    assert book.lookup(ProcessInfo(1, "discord.exe")) == "rule"   # same rank, earlier in order
+    assert book.lookup(ProcessInfo(2, "slack.exe")) == "mapping"  # exact beats glob
+    assert book.lookup(ProcessInfo(3, "other.exe")) == "glob"
+
+def test_rulebook_fleet_rules_follow_local_ones(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [{"name": "teams.exe", "device": "local"}]}))
+    book = RuleBook(str(path), MappingStore({}))
+    assert book.set_fleet_rules([{"name": "teams.exe", "device": "fleet"}])
+    assert not book.set_fleet_rules([{"name": "teams.exe", "device": "fleet"}])
+    assert book.lookup(ProcessInfo(1, "teams.exe")) == "local"
+
+def test_rulebook_rechecks_the_file_after_the_interval(tmp_path):
+    path = tmp_path / "rules.json"
+    book = RuleBook(str(path), MappingStore({}), check_interval_ms=0)
+    assert book.lookup(ProcessInfo(1, "teams.exe")) is None
+    path.write_text(json.dumps({"rules": [{"name": "teams.exe", "device": "headset"}]}))
+    assert book.lookup(ProcessInfo(1, "teams.exe")) == "headset"
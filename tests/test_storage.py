@@ -0,0 +1,53 @@
+# test_storage.py
+import threading
+import time
+
+from storage import Debouncer
+
+def counter():
+    fired = []
+    done = threading.Event()
+    def func():
+        fired.append(time.monotonic())
+        done.set()
+    return fired, done, func
+
+def test_burst_fires_once_after_it_goes_quiet():
+    fired, done, func = counter()
+    debouncer = Debouncer(50, func)
+    for _ in range(5):
+        debouncer.trigger()
+        time.sleep(0.01)
+    assert debouncer.pending()
+    assert done.wait(1)
+    time.sleep(0.1)
+    assert len(fired) == 1
+    assert not debouncer.pending()
+
+def test_max_delay_caps_a_steady_stream():
+    fired, done, func = counter()
+    debouncer = Debouncer(100, func, max_delay_ms=150)
+    started = time.monotonic()
+    while not done.is_set() and time.monotonic() - started < 1:
+        debouncer.trigger()
+        time.sleep(0.02)
+    assert done.is_set()
+    assert fired[0] - started < 0.5
+    debouncer.cancel()
+
+def test_flush_runs_a_pending_call_now():
+    fired, _, func = counter()
+    debouncer = Debouncer(10000, func)
+    debouncer.flush()
+    assert fired == []  # nothing pending
+    debouncer.trigger()
+    debouncer.flush()
+    assert len(fired) == 1 and not debouncer.pending()
+
+def test_cancel_drops_a_pending_call():
+    fired, done, func = counter()
+    debouncer = Debouncer(30, func)
+    debouncer.trigger()
+    debouncer.cancel()
+    assert not done.wait(0.1)
+    assert fired == []
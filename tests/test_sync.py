@@ -0,0 +1,37 @@
+# test_sync.py
+import re
+
+import pytest
+
+from sync import BundleError, validate_bundle
+
+DEVICE = "{0.0.0.00000000}.{aaaa}"
+
+def test_full_bundle_is_returned_unchanged():
+    bundle = {"schema": 1, "version": "2026.10.3", "base_profiles": ["Gaming", "Work"],
+              "max_custom_profiles": 2,
+              "profiles": {"Gaming": {"discord.exe": DEVICE}, "chrome.exe": DEVICE},
+              "rules": [{"name": "teams.exe", "device": DEVICE, "priority": 10}]}
+    assert validate_bundle(bundle) is bundle
+
+def test_schema_and_version_are_all_that_is_required():
+    validate_bundle({"schema": 1, "version": 7})
+
+@pytest.mark.parametrize("bundle, problem", [
+    ([], "JSON object"),
+    ({"schema": 2, "version": "1"}, "unsupported schema"),
+    ({"schema": 1}, "version"),
+    ({"schema": 1, "version": ""}, "version"),
+    ({"schema": 1, "version": True}, "version"),
+    ({"schema": 1, "version": "1", "profiles": []}, "profiles must be"),
+    ({"schema": 1, "version": "1", "profiles": {"Gaming": {"discord.exe": 3}}}, "profiles.Gaming"),
+    ({"schema": 1, "version": "1", "rules": {}}, "rules must be"),
+    ({"schema": 1, "version": "1", "rules": [{"device": DEVICE}]}, "rules[0]"),
+    ({"schema": 1, "version": "1", "rules": [{"name": "a.exe", "device": DEVICE, "title": "("}]}, "rules[0]"),
+    ({"schema": 1, "version": "1", "base_profiles": []}, "base_profiles"),
+    ({"schema": 1, "version": "1", "max_custom_profiles": -1}, "max_custom_profiles"),
+    ({"schema": 1, "version": "1", "max_custom_profiles": False}, "max_custom_profiles"),
+])
+def test_invalid_bundles_name_the_problem(bundle, problem):
+    with pytest.raises(BundleError, match=re.escape(problem)):
+        validate_bundle(bundle)